@@ -4,8 +4,9 @@ from sqlalchemy.ext.declarative import declarative_base
 Base = declarative_base()
 
 # Importa qui tutti i modelli per il rilevamento da parte degli strumenti di migrazione
-from app.models.user import User, UserSettings, UserRooms, UserAiSettings
+from app.models.user import User, UserSettings, UserRooms, UserAISettings, RefreshToken
 from app.models.emotional_state import EmotionalState, EmotionalStateCheckin
 from app.models.room import Room, RoomCheckin
-from app.models.ai import AIPreset, AIEngine, AIUsageLog
+from app.models.ai import AIPreset, AIEngine, AIUsageLog, AIUsageDailySummary, AIUsageUserMonthly
 from app.models.subscription import Subscription
+from app.models.catalog import CatalogVersion
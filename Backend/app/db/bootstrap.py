@@ -0,0 +1,84 @@
+import logging
+import os
+from typing import Optional
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "alembic.ini")
+
+# Revisione che corrisponde allo schema creato in passato da create_all
+BASELINE_REVISION = "0001_initial_schema"
+
+# Chiave dell'advisory lock Postgres che serializza le migrazioni tra worker
+MIGRATION_LOCK_KEY = 7_715_301
+
+
+def _alembic_config(connection: Optional[Connection] = None):
+    from alembic.config import Config
+
+    config = Config(ALEMBIC_INI)
+    config.attributes["connection"] = connection
+    return config
+
+
+def get_head_revision() -> str:
+    """Ultima revisione disponibile negli script di migrazione."""
+    from alembic.script import ScriptDirectory
+
+    return ScriptDirectory.from_config(_alembic_config()).get_current_head()
+
+
+def get_current_revision(connection: Connection) -> Optional[str]:
+    """
+    Legge lo stamp di versione dello schema.
+    :return: La revisione corrente, None se il database non è versionato.
+    """
+    if not inspect(connection).has_table("alembic_version"):
+        return None
+    return connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
+
+
+def _upgrade(connection: Connection):
+    from alembic import command
+
+    config = _alembic_config(connection)
+    # Database creato con create_all prima di Alembic: si marca la baseline senza DDL
+    if get_current_revision(connection) is None and inspect(connection).has_table("users"):
+        logger.info("Schema esistente senza stamp: stamp a %s", BASELINE_REVISION)
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, "head")
+
+
+def bootstrap_schema(engine: Engine, mode: str = "migrate") -> Optional[str]:
+    """
+    Verifica lo stamp di versione dello schema e applica le migrazioni solo se necessario.
+    :param mode: "migrate" (aggiorna se indietro), "check" (errore se indietro) o "skip".
+    :return: La revisione dello schema dopo il bootstrap.
+    :raises RuntimeError: In modalità "check", se lo schema non è aggiornato.
+    """
+    if mode == "skip":
+        return None
+
+    head = get_head_revision()
+    with engine.connect() as connection:
+        current = get_current_revision(connection)
+        if current == head:
+            return current
+        if mode == "check":
+            raise RuntimeError(f"Schema del database non aggiornato: {current} (atteso {head}).")
+
+        is_postgres = connection.dialect.name == "postgresql"
+        if is_postgres:
+            # Un solo worker esegue le migrazioni, gli altri attendono e ritrovano lo schema aggiornato
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            # Le transazioni sono gestite da Alembic (una per migrazione)
+            if get_current_revision(connection) != head:
+                logger.info("Migrazione dello schema da %s a %s", current, head)
+                _upgrade(connection)
+        finally:
+            if is_postgres:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    return head
@@ -0,0 +1,69 @@
+import re
+from datetime import date
+from typing import List
+from sqlalchemy import text
+
+# Partizioni mensili: <tabella>_pYYYYMM, più una partizione di default per le righe fuori range
+PARTITION_SUFFIX = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month.year:04d}{month.month:02d}"
+
+
+def partition_month(table: str, name: str):
+    """Mese coperto da una partizione mensile, None per le altre partizioni."""
+    match = PARTITION_SUFFIX.search(name)
+    if not match or not name.startswith(table):
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def create_monthly_partition(db, table: str, month: date) -> str:
+    """
+    Crea (se assente) la partizione Postgres di `table` per il mese indicato.
+    Funziona sia con una Session sia con una Connection.
+    """
+    name = partition_name(table, month)
+    db.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+    return name
+
+
+def ensure_monthly_partitions(db, table: str, first_month: date, last_month: date) -> List[str]:
+    """
+    Crea in anticipo le partizioni mensili da first_month a last_month inclusi.
+    :return: I nomi delle partizioni coperte.
+    """
+    names = []
+    month = month_start(first_month)
+    while month <= last_month:
+        names.append(create_monthly_partition(db, table, month))
+        month = add_months(month, 1)
+    return names
+
+
+def list_monthly_partitions(db, table: str) -> List[tuple]:
+    """
+    Partizioni mensili attaccate a `table`, ordinate per mese.
+    :return: Coppie (nome, mese).
+    """
+    rows = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table"
+    ), {"table": table}).scalars()
+    partitions = [(name, partition_month(table, name)) for name in rows]
+    return sorted((p for p in partitions if p[1] is not None), key=lambda p: p[1])
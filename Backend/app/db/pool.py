@@ -0,0 +1,125 @@
+import threading
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+    """
+    Contatori thread-safe sull'utilizzo del pool di connessioni.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.total_wait_ms = 0.0
+            self.max_wait_ms = 0.0
+
+    def record_checkout(self, wait_ms: float):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 3),
+            }
+
+
+# Metriche globali del pool principale
+pool_metrics = PoolMetrics()
+
+
+class MeteredQueuePool(QueuePool):
+    """
+    QueuePool che misura il tempo di attesa per ottenere una connessione
+    e conta i timeout dovuti all'esaurimento del pool.
+    """
+
+    metrics = pool_metrics
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record_checkout((time.perf_counter() - start) * 1000)
+        return connection
+
+
+def enable_idle_pre_ping(engine: Engine, idle_seconds: int):
+    """
+    Pre-ping solo per le connessioni rimaste inattive più di idle_seconds.
+    Le connessioni usate di recente vengono restituite senza round trip aggiuntivi.
+    """
+
+    @event.listens_for(engine, "checkin")
+    def _mark_checkin(dbapi_connection, connection_record):
+        connection_record.info["last_checkin"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+        last_checkin = connection_record.info.get("last_checkin")
+        if last_checkin is None or time.monotonic() - last_checkin < idle_seconds:
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        except Exception:
+            # Il pool scarta la connessione e ne apre una nuova
+            raise exc.DisconnectionError()
+        finally:
+            cursor.close()
+
+
+def warm_up_pool(engine: Engine, connections: int) -> int:
+    """
+    Apre in anticipo fino a `connections` connessioni e le restituisce al pool,
+    così le prime richieste non pagano il costo di connessione.
+    :return: Numero di connessioni aperte.
+    """
+    opened = []
+    try:
+        for _ in range(connections):
+            opened.append(engine.connect())
+    finally:
+        for connection in opened:
+            connection.close()
+    return len(opened)
+
+
+def get_pool_stats(engine: Engine) -> dict:
+    """
+    Restituisce lo stato corrente del pool e le metriche cumulative.
+    """
+    pool = engine.pool
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            # overflow() parte da -pool_size finché il pool non è pieno
+            overflow=max(pool.overflow(), 0),
+        )
+    else:
+        stats["status"] = pool.status()
+    stats.update(pool_metrics.snapshot())
+    return stats
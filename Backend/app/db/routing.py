@@ -0,0 +1,85 @@
+import itertools
+import threading
+import time
+from typing import Dict, Hashable, List, Optional
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+
+class ReplicaRouter:
+    """
+    Instrada le letture sulle repliche in round-robin, escludendo per
+    `retry_seconds` le repliche che non rispondono e ripiegando sul primario.
+    Le chiavi marcate con stick_to_primary leggono dal primario per
+    `sticky_seconds`, così un client rilegge subito le proprie scritture.
+    """
+
+    # Oltre questa soglia le chiavi scadute vengono ripulite
+    MAX_STICKY_KEYS = 10000
+
+    def __init__(self, primary: Engine, replicas: List[Engine], retry_seconds: int = 30, sticky_seconds: int = 5):
+        self.primary = primary
+        self.replicas = replicas
+        self.retry_seconds = retry_seconds
+        self.sticky_seconds = sticky_seconds
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._down_until: Dict[Engine, float] = {}
+        self._sticky_until: Dict[Hashable, float] = {}
+
+    def stick_to_primary(self, key: Hashable):
+        """Forza le letture di `key` sul primario dopo una scrittura."""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._sticky_until) > self.MAX_STICKY_KEYS:
+                self._sticky_until = {k: v for k, v in self._sticky_until.items() if v > now}
+            self._sticky_until[str(key)] = now + self.sticky_seconds
+
+    def _is_sticky(self, key: Optional[Hashable]) -> bool:
+        if key is None:
+            return False
+        key = str(key)
+        with self._lock:
+            until = self._sticky_until.get(key)
+            if until is None:
+                return False
+            if until <= time.monotonic():
+                del self._sticky_until[key]
+                return False
+            return True
+
+    def _healthy_replicas(self) -> List[Engine]:
+        """Repliche disponibili, ruotate in ordine round-robin."""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [r for r in self.replicas if self._down_until.get(r, 0) <= now]
+        if not healthy:
+            return []
+        start = next(self._counter) % len(healthy)
+        return healthy[start:] + healthy[:start]
+
+    def _mark_down(self, replica: Engine):
+        with self._lock:
+            self._down_until[replica] = time.monotonic() + self.retry_seconds
+
+    def connect(self, key: Optional[Hashable] = None) -> Connection:
+        """
+        Apre una connessione di sola lettura sulla prima replica sana,
+        altrimenti sul primario.
+        """
+        if not self._is_sticky(key):
+            for replica in self._healthy_replicas():
+                try:
+                    return replica.connect()
+                except DBAPIError:
+                    self._mark_down(replica)
+        return self.primary.connect()
+
+    def status(self) -> list:
+        now = time.monotonic()
+        with self._lock:
+            down_until = dict(self._down_until)
+        return [
+            {"url": replica.url.render_as_string(hide_password=True), "healthy": down_until.get(replica, 0) <= now}
+            for replica in self.replicas
+        ]
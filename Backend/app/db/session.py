@@ -1,15 +1,62 @@
+from fastapi import Request
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from app.settings import DATABASE_URL
+from app.settings import (
+    DATABASE_URL,
+    ASYNC_DB_ENABLED,
+    ASYNC_DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_PRE_PING,
+    DB_POOL_PRE_PING_IDLE_SECONDS,
+    DATABASE_REPLICA_URLS,
+    DB_REPLICA_RETRY_SECONDS,
+    DB_REPLICA_STICKY_SECONDS,
+)
+from app.db.pool import MeteredQueuePool, enable_idle_pre_ping
+from app.db.routing import ReplicaRouter
+
+def pool_options(url: str, pre_ping: bool = DB_POOL_PRE_PING == "always", **extra) -> dict:
+    """
+    Opzioni del pool di connessioni per create_engine/create_async_engine.
+    SQLite usa un pool dedicato e non accetta dimensionamento.
+    """
+    options = {"pool_pre_ping": pre_ping}
+    if not url.startswith("sqlite"):
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_timeout=DB_POOL_TIMEOUT,
+            **extra,
+        )
+    return options
 
 # Configurazione del motore di database
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,  # Verifica dello stato della connessione prima di utilizzarla
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL, poolclass=MeteredQueuePool))
+
+# Motori delle repliche in sola lettura
+replica_engines = [create_engine(url, **pool_options(url)) for url in DATABASE_REPLICA_URLS]
+
+if DB_POOL_PRE_PING == "idle":
+    # Verifica solo le connessioni inattive da più di DB_POOL_PRE_PING_IDLE_SECONDS
+    for _engine in [engine, *replica_engines]:
+        enable_idle_pre_ping(_engine, DB_POOL_PRE_PING_IDLE_SECONDS)
+
+read_router = ReplicaRouter(
+    engine,
+    replica_engines,
+    retry_seconds=DB_REPLICA_RETRY_SECONDS,
+    sticky_seconds=DB_REPLICA_STICKY_SECONDS,
 )
 
 # Creazione della session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: le istanze restituite dai servizi restano leggibili dopo il commit
+# senza un refresh (SELECT) aggiuntivo
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Funzione per ottenere una sessione del database
 def get_db():
@@ -22,3 +69,77 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Funzione per ottenere una sessione di sola lettura
+def get_read_db(request: Request):
+    """
+    Generator che fornisce una sessione instradata su una replica.
+    Ripiega sul primario se nessuna replica è disponibile o se l'utente
+    della richiesta ha appena eseguito una scrittura.
+    Da usare solo per operazioni di sola lettura.
+    """
+    connection = read_router.connect(request.path_params.get("user_id"))
+    db = SessionLocal(bind=connection)
+    try:
+        yield db
+    finally:
+        db.close()
+        connection.close()
+
+# Funzione per le letture con revalidation (If-None-Match)
+def get_conditional_read_db(request: Request):
+    """
+    Come get_read_db, ma le richieste condizionali leggono dal primario:
+    una replica in ritardo confermerebbe con un 304 un ETag già superato.
+    """
+    if request.headers.get("if-none-match"):
+        yield from get_db()
+    else:
+        yield from get_read_db(request)
+
+
+# Driver asincroni corrispondenti ai driver sync supportati
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def build_async_url(url: str) -> str:
+    """
+    Converte un URL di database sync nel corrispondente URL asincrono.
+    Es: postgresql://... -> postgresql+asyncpg://...
+    """
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        raise ValueError(f"URL del database non valido: {url}")
+    dialect = scheme.split("+", 1)[0]
+    if dialect not in _ASYNC_DRIVERS:
+        raise ValueError(f"Nessun driver asincrono disponibile per il dialetto '{dialect}'.")
+    return f"{_ASYNC_DRIVERS[dialect]}://{rest}"
+
+# Configurazione del motore asincrono (solo se la modalità async è abilitata)
+async_engine = None
+AsyncSessionLocal = None
+
+if ASYNC_DB_ENABLED:
+    _async_url = ASYNC_DATABASE_URL or build_async_url(DATABASE_URL)
+    # Il pre-ping "idle" richiede accesso al driver sync: in async equivale a "always"
+    async_engine = create_async_engine(
+        _async_url, **pool_options(_async_url, pre_ping=DB_POOL_PRE_PING != "never")
+    )
+    # expire_on_commit=False: gli oggetti restano leggibili dopo il commit senza nuovi round trip
+    AsyncSessionLocal = sessionmaker(
+        bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+
+# Funzione per ottenere una sessione asincrona del database
+async def get_async_db():
+    """
+    Generator asincrono che fornisce una AsyncSession.
+    Richiede ASYNC_DB_ENABLED=true.
+    """
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Modalità async non abilitata: impostare ASYNC_DB_ENABLED=true.")
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,96 @@
+from typing import Optional
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# INSERT con supporto ON CONFLICT per i dialetti supportati
+_UPSERT_INSERTS = {
+    "postgresql": pg_insert,
+    "sqlite": sqlite_insert,
+}
+
+
+def dialect_name(db) -> str:
+    """Nome del dialetto della sessione (Session o AsyncSession)."""
+    return getattr(db, "sync_session", db).get_bind().dialect.name
+
+
+def supports_returning(db) -> bool:
+    """
+    True se il dialetto supporta INSERT/UPDATE ... RETURNING.
+    SQLAlchemy 1.4 non emette RETURNING per SQLite.
+    """
+    return dialect_name(db) == "postgresql"
+
+
+def upsert_insert(db, table):
+    """
+    Costruisce un INSERT che supporta on_conflict_do_update/on_conflict_do_nothing.
+    :raises NotImplementedError: Se il dialetto non supporta ON CONFLICT.
+    """
+    name = dialect_name(db)
+    if name not in _UPSERT_INSERTS:
+        raise NotImplementedError(f"Upsert non supportato per il dialetto '{name}'.")
+    return _UPSERT_INSERTS[name](table)
+
+
+def _returning_select(model, stmt):
+    """SELECT ORM che popola le istanze dalla clausola RETURNING di stmt."""
+    return select(model).from_statement(
+        stmt.returning(*model.__table__.c)
+    ).execution_options(populate_existing=True)
+
+
+def insert_returning(db, model, values: dict):
+    """
+    Inserisce una riga e restituisce l'istanza ORM in un solo round trip
+    (INSERT ... RETURNING). Su SQLite ripiega su INSERT + SELECT per chiave primaria.
+    Il commit resta a carico del chiamante.
+    """
+    stmt = insert(model).values(**values)
+    if supports_returning(db):
+        return db.execute(_returning_select(model, stmt)).scalar_one()
+    result = db.execute(stmt)
+    return db.get(model, result.inserted_primary_key[0])
+
+
+def update_returning(db, model, criteria: list, values: dict) -> Optional[object]:
+    """
+    Aggiorna le righe che soddisfano criteria senza caricarle prima
+    (UPDATE ... RETURNING) e restituisce la prima istanza aggiornata.
+    :return: L'istanza aggiornata, None se nessuna riga corrisponde.
+    """
+    if not values:
+        return db.execute(select(model).where(*criteria)).scalars().first()
+    stmt = update(model).where(*criteria).values(**values)
+    if supports_returning(db):
+        return db.execute(_returning_select(model, stmt)).scalars().first()
+    if db.execute(stmt).rowcount == 0:
+        return None
+    return db.execute(
+        select(model).where(*criteria).execution_options(populate_existing=True)
+    ).scalars().first()
+
+
+async def insert_returning_async(db, model, values: dict):
+    """Variante asincrona di insert_returning (AsyncSession)."""
+    stmt = insert(model).values(**values)
+    if supports_returning(db):
+        return (await db.execute(_returning_select(model, stmt))).scalar_one()
+    result = await db.execute(stmt)
+    return await db.get(model, result.inserted_primary_key[0])
+
+
+async def update_returning_async(db, model, criteria: list, values: dict) -> Optional[object]:
+    """Variante asincrona di update_returning (AsyncSession)."""
+    if not values:
+        return (await db.execute(select(model).where(*criteria))).scalars().first()
+    stmt = update(model).where(*criteria).values(**values)
+    if supports_returning(db):
+        return (await db.execute(_returning_select(model, stmt))).scalars().first()
+    if (await db.execute(stmt)).rowcount == 0:
+        return None
+    result = await db.execute(
+        select(model).where(*criteria).execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
@@ -1,9 +1,28 @@
+import time
+
+# Inizio del cold start, misurato fino alla fine degli eventi di startup
+_import_started = time.perf_counter()
+
+import logging
 from fastapi import FastAPI
-from app.db.session import engine, Base
-from app.routes import user_routes, room_routes, ai_routes, subscription_routes, emotional_state_routes
+from app.db.session import engine
+from app.db.pool import warm_up_pool
+from app.routes import user_routes, room_routes, ai_routes, subscription_routes, emotional_state_routes, health_routes, jwks_routes
+from app.utils.jwt_utils import is_asymmetric, jwt_keyring
+from app.settings import (
+    DB_POOL_WARMUP,
+    DB_BOOTSTRAP,
+    CHECKIN_WRITE_BEHIND,
+    AI_USAGE_RETENTION_ENABLED,
+    USAGE_INGEST_ASYNC,
+    ENTITLEMENT_CACHE_ENABLED,
+    PASSWORD_HASH_POOL_ENABLED,
+    TOKEN_DENYLIST_SYNC_ENABLED,
+    LAST_LOGIN_WRITE_BEHIND,
+    AI_ENGINE_LATENCY_WRITEBACK_ENABLED,
+)
 
-# Creazione del database (se non già esistente)
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
 
 # Istanza dell'app FastAPI
 app = FastAPI(
@@ -18,3 +37,97 @@ app.include_router(room_routes.router, prefix="/rooms", tags=["Rooms"])
 app.include_router(ai_routes.router, prefix="/ai", tags=["AI"])
 app.include_router(subscription_routes.router, prefix="/subscriptions", tags=["Subscriptions"])
 app.include_router(emotional_state_routes.router, prefix="/emotional-states", tags=["Emotional States"])
+app.include_router(health_routes.router, prefix="/health", tags=["Health"])
+app.include_router(jwks_routes.router, tags=["Auth"])
+
+# Verifica dello schema: nessun DDL se lo stamp di versione è già aggiornato
+@app.on_event("startup")
+def bootstrap_database():
+    from app.db.bootstrap import bootstrap_schema
+
+    app.state.schema_revision = bootstrap_schema(engine, DB_BOOTSTRAP)
+
+# Warm-up del pool: le prime richieste trovano connessioni già aperte
+@app.on_event("startup")
+def warm_up_db_pool():
+    warm_up_pool(engine, DB_POOL_WARMUP)
+
+# Writer dei check-in in modalità write-behind, svuotato allo shutdown
+if CHECKIN_WRITE_BEHIND:
+    from app.services.checkin_buffer import checkin_buffer
+
+    app.add_event_handler("startup", checkin_buffer.start)
+    app.add_event_handler("shutdown", checkin_buffer.stop)
+
+# Writer degli AIUsageLog in modalità asincrona, svuotato allo shutdown
+if USAGE_INGEST_ASYNC:
+    from app.services.usage_ingestion import usage_ingestion_queue
+
+    app.add_event_handler("startup", usage_ingestion_queue.start)
+    app.add_event_handler("shutdown", usage_ingestion_queue.stop)
+
+# Partizioni e retention di ai_usage_logs
+if AI_USAGE_RETENTION_ENABLED:
+    from app.services.usage_retention import usage_retention_job
+
+    app.add_event_handler("startup", usage_retention_job.start)
+    app.add_event_handler("shutdown", usage_retention_job.stop)
+
+# Versioni dei cataloghi scritte dagli altri worker: sempre attivo, anche con
+# CATALOG_CACHE_ENABLED=false il gateway AI tiene in memoria motori e preset
+from app.services.catalog_cache import catalog_cache
+
+app.add_event_handler("startup", catalog_cache.start)
+app.add_event_handler("shutdown", catalog_cache.stop)
+
+# Entitlement in cache: sottoscrizioni modificate dagli altri worker, indipendente dalla cache dei cataloghi
+if ENTITLEMENT_CACHE_ENABLED:
+    from app.services.entitlement_cache import entitlement_cache
+
+    app.add_event_handler("startup", entitlement_cache.start)
+    app.add_event_handler("shutdown", entitlement_cache.stop)
+
+# Pool di processi per bcrypt, avviato subito così il primo login non paga lo spawn
+if PASSWORD_HASH_POOL_ENABLED:
+    from app.services.password_hasher import password_hasher
+
+    app.add_event_handler("startup", password_hasher.start)
+    app.add_event_handler("shutdown", password_hasher.stop)
+
+# Sessioni revocate dagli altri worker (logout, riuso di un refresh token)
+if TOKEN_DENYLIST_SYNC_ENABLED:
+    from app.services.token_service import token_denylist_sync
+
+    app.add_event_handler("startup", token_denylist_sync.start)
+    app.add_event_handler("shutdown", token_denylist_sync.stop)
+
+# Keyring JWT letto all'avvio: una chiave mancante blocca lo startup invece del primo login
+if is_asymmetric():
+    app.add_event_handler("startup", jwt_keyring.jwks)
+
+# Writer di users.last_login, svuotato allo shutdown
+if LAST_LOGIN_WRITE_BEHIND:
+    from app.services.last_login_buffer import last_login_buffer
+
+    app.add_event_handler("startup", last_login_buffer.start)
+    app.add_event_handler("shutdown", last_login_buffer.stop)
+
+# Latenze dal vivo dei motori AI riscritte periodicamente in ai_engines.latency_ms
+if AI_ENGINE_LATENCY_WRITEBACK_ENABLED:
+    from app.services.engine_health import engine_health
+
+    app.add_event_handler("startup", engine_health.start)
+    app.add_event_handler("shutdown", engine_health.stop)
+
+# Connessioni keep-alive verso i motori AI, chiuse allo shutdown
+@app.on_event("shutdown")
+async def close_ai_gateway():
+    from app.services.ai_gateway import ai_gateway
+
+    await ai_gateway.aclose()
+
+# Tempo di cold start (import + startup), esposto anche su /health/startup
+@app.on_event("startup")
+def record_cold_start():
+    app.state.cold_start_ms = round((time.perf_counter() - _import_started) * 1000, 2)
+    logger.info("Cold start completato in %.2f ms", app.state.cold_start_ms)
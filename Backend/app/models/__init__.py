@@ -0,0 +1,3 @@
+# Registra tutti i modelli (app.db.base li importa) qualunque sia il primo modulo importato,
+# così le relationship tra modelli si risolvono sempre
+import app.db.base  # noqa: F401
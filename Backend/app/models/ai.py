@@ -1,6 +1,8 @@
-from sqlalchemy import Column, Integer, String, Boolean, JSON, Text, ForeignKey, DECIMAL, TIMESTAMP
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, JSON, Text, ForeignKey, DECIMAL, TIMESTAMP, Date, Index, event
 from sqlalchemy.orm import relationship
+from datetime import datetime
 from app.db.base import Base
+from app.schemas.pricing_model_schema import PricingModelSchema
 
 class AIEngine(Base):
     __tablename__ = "ai_engines"
@@ -13,8 +15,10 @@ class AIEngine(Base):
     pricing_model = Column(JSON, nullable=False)  # JSON to store pricing details
     max_tokens = Column(Integer)
     latency_ms = Column(Integer, default=0)
-    created_at = Column(TIMESTAMP, default="now()")
-    updated_at = Column(TIMESTAMP, default="now()")
+    batch_max_size = Column(Integer, nullable=False, default=0)  # Richieste per chiamata batch (0/1 = nessun batch)
+    batch_window_ms = Column(Integer, nullable=False, default=15)  # Attesa massima per riempire un batch
+    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     usage_logs = relationship("AIUsageLog", back_populates="engine")
 
@@ -51,13 +55,18 @@ class AIPreset(Base):
     color_theme = Column(String(7), default="#000000")
     dynamic_behavior = Column(Boolean, default=True)
     is_premium = Column(Boolean, default=False)
-    created_at = Column(TIMESTAMP, default="now()")
-    updated_at = Column(TIMESTAMP, default="now()")
+    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user_settings = relationship("UserAISettings", back_populates="preset")
 
 class AIUsageLog(Base):
     __tablename__ = "ai_usage_logs"
+    # Su Postgres la tabella è partizionata per mese su created_at (vedi app/db/partitions.py)
+    __table_args__ = (
+        Index("ix_ai_usage_logs_user_created", "user_id", "created_at"),
+        Index("ix_ai_usage_logs_engine_created", "engine_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -69,11 +78,50 @@ class AIUsageLog(Base):
     cost = Column(DECIMAL(10, 4), default=0.0, nullable=False)
     premium_discount = Column(DECIMAL(10, 4), default=0.0)
     latency_ms = Column(Integer)
+    ttft_ms = Column(Integer)  # Tempo al primo frammento, solo per le risposte in streaming
     status = Column(String(50), nullable=False)
     error_message = Column(Text)
-    created_at = Column(TIMESTAMP, default="now()")
+    created_at = Column(TIMESTAMP, nullable=False, default=datetime.utcnow)  # Chiave di partizionamento
 
     user = relationship("User", back_populates="usage_logs")
     engine = relationship("AIEngine", back_populates="usage_logs")
     preset = relationship("AIPreset")
     emotional_state = relationship("EmotionalState")
+
+class AIUsageDailySummary(Base):
+    __tablename__ = "ai_usage_daily_summary"
+    __table_args__ = (
+        Index("uq_ai_usage_daily_summary_key", "day", "user_id", "engine_id", "preset_id", unique=True),
+    )
+
+    # Rollup giornaliero di ai_usage_logs, aggiornato nella stessa transazione dei log
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    engine_id = Column(Integer, nullable=False)
+    preset_id = Column(Integer, nullable=False, default=0)  # 0 = nessun preset
+    calls = Column(Integer, nullable=False, default=0)
+    success_count = Column(Integer, nullable=False, default=0)
+    failure_count = Column(Integer, nullable=False, default=0)
+    total_cost = Column(DECIMAL(14, 4), nullable=False, default=0)
+    total_premium_discount = Column(DECIMAL(14, 4), nullable=False, default=0)
+    total_latency_ms = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow)
+
+class AIUsageUserMonthly(Base):
+    __tablename__ = "ai_usage_user_monthly"
+    __table_args__ = (
+        Index("uq_ai_usage_user_monthly_key", "user_id", "month", unique=True),
+    )
+
+    # Rollup mensile per utente: la spesa del mese è una lookup su (user_id, month)
+    id = Column(Integer, primary_key=True, index=True)
+    month = Column(Date, nullable=False)  # Primo giorno del mese
+    user_id = Column(Integer, nullable=False)
+    calls = Column(Integer, nullable=False, default=0)
+    success_count = Column(Integer, nullable=False, default=0)
+    failure_count = Column(Integer, nullable=False, default=0)
+    total_cost = Column(DECIMAL(14, 4), nullable=False, default=0)
+    total_premium_discount = Column(DECIMAL(14, 4), nullable=False, default=0)
+    total_latency_ms = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, BigInteger, DateTime
+from app.db.base import Base
+from datetime import datetime
+
+class CatalogVersion(Base):
+    __tablename__ = "catalog_versions"
+
+    # Versione di ogni catalogo in cache (ai_presets, ai_engines, emotional_states, rooms),
+    # incrementata a ogni scrittura e letta dagli altri worker per invalidare la propria cache
+    name = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
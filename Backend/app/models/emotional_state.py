@@ -1,9 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, JSON, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Text, JSON, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship, validates
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 from app.db.base import Base
-from schemas.ai_match_schema import AIMatchMapSchema
+from app.schemas.ai_match_schema import AIMatchMapSchema
 
 class EmotionalState(Base):
     __tablename__ = "emotional_states"
@@ -44,6 +44,9 @@ def validate_emotional_state(mapper, connection, target):
 
 class EmotionalStateCheckin(Base):
     __tablename__ = "emotional_states_checkin"
+    __table_args__ = (
+        Index("ix_emotional_states_checkin_user_created", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
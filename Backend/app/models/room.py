@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Boolean, Text, ForeignKey, JSON, Date, TIMESTAMP, func
+from sqlalchemy import Column, Integer, String, Boolean, Text, ForeignKey, JSON, Date, TIMESTAMP, func, Index, event
 from sqlalchemy.orm import relationship
 from app.db.base import Base
+from app.schemas.emotional_match_schema import EmotionalMatchSchema
 
 class Room(Base):
     __tablename__ = "rooms"
@@ -31,6 +32,10 @@ def validate_room(mapper, connection, target):
 
 class RoomCheckin(Base):
     __tablename__ = "rooms_checkin"
+    __table_args__ = (
+        # Target dell'upsert atomico in create_room_checkin
+        Index("uq_rooms_checkin_user_room", "user_id", "room_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -1,10 +1,16 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 from datetime import datetime
 
 class Subscription(Base):
     __tablename__ = "subscriptions"
+    __table_args__ = (
+        # Copre is_user_premium e get_subscription_by_user_id (prefisso user_id, is_active)
+        Index("ix_subscriptions_user_active_type", "user_id", "is_active", "subscription_type"),
+        # Modifiche recenti lette dagli altri worker per invalidare gli entitlement
+        Index("ix_subscriptions_updated_at", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -14,9 +20,8 @@ class Subscription(Base):
     is_active = Column(Boolean, default=True)
     payment_method = Column(String(50), nullable=True)  # Optional: e.g., "credit_card", "paypal"
     auto_renew = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     user = relationship("User", back_populates="subscriptions")
-
-# Add this relationship in the User model (user.py):
-# subscriptions = relationship("Subscription", back_populates="user", cascade="all, delete-orphan")
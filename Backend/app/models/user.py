@@ -1,6 +1,7 @@
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, ForeignKey, Index, JSON, LargeBinary
 from sqlalchemy.orm import relationship
 from app.db.base import Base
+from datetime import datetime
 
 class User(Base):
     __tablename__ = "users"
@@ -13,17 +14,24 @@ class User(Base):
     last_login = Column(DateTime)
     language = Column(String(10), default="en")
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default="CURRENT_TIMESTAMP")
-    updated_at = Column(DateTime, default="CURRENT_TIMESTAMP", onupdate="CURRENT_TIMESTAMP")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     user_ai_settings = relationship("UserAISettings", back_populates="user", cascade="all, delete")
-    user_rooms = relationship("UserRoom", back_populates="user", cascade="all, delete")
+    user_rooms = relationship("UserRooms", back_populates="user", cascade="all, delete")
     user_settings = relationship("UserSettings", back_populates="user", uselist=False, cascade="all, delete")
+    subscriptions = relationship("Subscription", back_populates="user", cascade="all, delete-orphan")
+    usage_logs = relationship("AIUsageLog", back_populates="user")
+    emotional_state_checkins = relationship("EmotionalStateCheckin", back_populates="user")
+    room_checkins = relationship("RoomCheckin", back_populates="user")
 
 
 class UserAISettings(Base):
     __tablename__ = "user_ai_settings"
+    __table_args__ = (
+        Index("ix_user_ai_settings_user_id", "user_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -44,20 +52,24 @@ class UserAISettings(Base):
     custom_color_theme = Column(String(7))
     custom_dynamic_behavior = Column(Boolean)
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default="CURRENT_TIMESTAMP")
-    updated_at = Column(DateTime, default="CURRENT_TIMESTAMP", onupdate="CURRENT_TIMESTAMP")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     user = relationship("User", back_populates="user_ai_settings")
+    preset = relationship("AIPreset", back_populates="user_settings")
 
 
 class UserRooms(Base):
     __tablename__ = "users_rooms"
+    __table_args__ = (
+        Index("idx_user_room", "user_id", "room_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), nullable=False)
-    customization = Column(Text)
+    customization = Column(JSON)  # Come negli schemi SQL: dict della personalizzazione
 
     # Relationships
     user = relationship("User", back_populates="user_rooms")
@@ -65,6 +77,9 @@ class UserRooms(Base):
 
 class UserSettings(Base):
     __tablename__ = "user_settings"
+    __table_args__ = (
+        Index("ix_user_settings_user_id", "user_id", unique=True),  # Un solo set di impostazioni per utente
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -77,8 +92,28 @@ class UserSettings(Base):
     sound_notifications_enabled = Column(Boolean, default=True)
     default_room_id = Column(Integer, ForeignKey("rooms.id", ondelete="SET NULL"))
     receive_checkin_reminder = Column(Boolean, default=True)
-    created_at = Column(DateTime, default="CURRENT_TIMESTAMP")
-    updated_at = Column(DateTime, default="CURRENT_TIMESTAMP", onupdate="CURRENT_TIMESTAMP")
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Incrementata a ogni modifica (ETag)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     user = relationship("User", back_populates="user_settings")
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    __table_args__ = (
+        Index("ix_refresh_tokens_user_id", "user_id"),
+        Index("ix_refresh_tokens_family_id", "family_id"),
+        Index("ix_refresh_tokens_revoked_at", "revoked_at"),  # Revoche recenti lette dagli altri worker
+    )
+
+    # Del token si conserva solo lo SHA-256: chi legge la tabella non può usarlo
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    family_id = Column(String(32), nullable=False)  # Sessione: comune a tutti i token ottenuti per rotazione
+    token_hash = Column(LargeBinary(32), nullable=False, unique=True)
+    expires_at = Column(DateTime, nullable=False)
+    rotated_at = Column(DateTime)  # Già scambiato con un nuovo token: un secondo uso revoca la sessione
+    revoked_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -1,6 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, status
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db
 from app.schemas.ai_schema import (
     AIEngineCreate,
     AIPresetCreate,
@@ -8,34 +11,112 @@ from app.schemas.ai_schema import (
     UserAISettingsUpdate,
 )
 from app.services.ai_service import (
-    get_ai_engines,
+    get_ai_engines_json,
     create_ai_engine,
-    get_ai_presets,
+    get_ai_presets_json,
     create_ai_preset,
     get_user_ai_settings,
     create_user_ai_settings,
     update_user_ai_settings,
     delete_user_ai_settings,
 )
+from app.services.ai_gateway import call_best_engine, call_engine, stream_engine
+from app.services.entitlement_cache import load_entitlement
+from app.utils.auth import get_current_user_id
+from app.utils.etag import etag_response
+from app.utils.sse import sse_response
+from app.services.usage_rollups import (
+    get_month_to_date_usage,
+    get_user_daily_usage,
+    get_engine_daily_usage,
+    get_preset_daily_usage,
+)
 
-router = APIRouter(prefix="/ai", tags=["AI"])
+router = APIRouter()
 
 # Routes for AI Engines
 @router.get("/engines", response_model=list)
-def list_ai_engines(db: Session = Depends(get_db)):
-    """Retrieve all available AI engines."""
-    return get_ai_engines(db)
+def list_ai_engines(if_none_match: Optional[str] = Header(None)):
+    """Retrieve all available AI engines (served from the catalog cache, 304 if unchanged)."""
+    catalog = get_ai_engines_json()
+    return etag_response(catalog.body, catalog.etag, if_none_match)
 
 @router.post("/engines", response_model=dict)
 def create_ai_engine_route(ai_engine_data: AIEngineCreate, db: Session = Depends(get_db)):
     """Create a new AI engine."""
     return create_ai_engine(db, ai_engine_data)
 
+@router.post("/engines/{engine_id}/invoke", response_model=dict)
+async def invoke_ai_engine(
+    engine_id: int,
+    payload: dict = Body(...),
+    preset_id: Optional[int] = None,
+    emotional_state_id: Optional[int] = None,
+    use_cache: bool = True,
+    user_id: int = Depends(get_current_user_id),
+):
+    """
+    Call an AI engine through the pooled gateway; every call is recorded in ai_usage_logs.
+    Identical requests are served from the response cache unless use_cache=false.
+    """
+    # Nessuna sessione della richiesta: la connessione non resta occupata durante la chiamata al motore
+    entitlement = await run_in_threadpool(load_entitlement, user_id)
+    result = await call_engine(
+        engine_id, user_id, payload,
+        preset_id=preset_id, emotional_state_id=emotional_state_id, is_premium=entitlement.is_premium,
+        use_cache=use_cache,
+    )
+    return result._asdict()
+
+@router.post("/engines/{engine_id}/stream")
+async def stream_ai_engine(
+    engine_id: int,
+    payload: dict = Body(...),
+    preset_id: Optional[int] = None,
+    emotional_state_id: Optional[int] = None,
+    user_id: int = Depends(get_current_user_id),
+):
+    """
+    Stream an AI engine reply as Server-Sent Events: one "token" event per chunk,
+    then "done" (latency_ms, ttft_ms, cost) or "error". Disconnecting cancels the
+    upstream call; the usage log is written when the stream ends.
+    """
+    # Nessuna sessione della richiesta: resterebbe aperta fino alla fine dello stream
+    entitlement = await run_in_threadpool(load_entitlement, user_id)
+    events = await stream_engine(
+        engine_id, user_id, payload,
+        preset_id=preset_id, emotional_state_id=emotional_state_id, is_premium=entitlement.is_premium,
+    )
+    return sse_response(events)
+
+@router.post("/invoke", response_model=dict)
+async def invoke_best_ai_engine(
+    payload: dict = Body(...),
+    preset_id: Optional[int] = None,
+    emotional_state_id: Optional[int] = None,
+    max_cost_per_call: Optional[float] = None,
+    use_cache: bool = True,
+    user_id: int = Depends(get_current_user_id),
+):
+    """
+    Call the fastest healthy AI engine available to the user (tier and max cost),
+    falling back to the next one if it fails.
+    """
+    # Nessuna sessione della richiesta: i fallback possono sommare più chiamate lente
+    entitlement = await run_in_threadpool(load_entitlement, user_id)
+    result = await call_best_engine(
+        user_id, payload,
+        preset_id=preset_id, emotional_state_id=emotional_state_id,
+        is_premium=entitlement.is_premium, max_cost_per_call=max_cost_per_call, use_cache=use_cache,
+    )
+    return result._asdict()
+
 # Routes for AI Presets
 @router.get("/presets", response_model=list)
-def list_ai_presets(db: Session = Depends(get_db)):
-    """Retrieve all available AI presets."""
-    return get_ai_presets(db)
+def list_ai_presets(if_none_match: Optional[str] = Header(None)):
+    """Retrieve all available AI presets (served from the catalog cache, 304 if unchanged)."""
+    catalog = get_ai_presets_json()
+    return etag_response(catalog.body, catalog.etag, if_none_match)
 
 @router.post("/presets", response_model=dict)
 def create_ai_preset_route(ai_preset_data: AIPresetCreate, db: Session = Depends(get_db)):
@@ -66,3 +147,24 @@ def update_user_ai_settings_route(
 def delete_user_ai_settings_route(user_id: int, db: Session = Depends(get_db)):
     """Delete AI settings for a user."""
     return delete_user_ai_settings(db, user_id)
+
+# Routes for AI usage rollups
+@router.get("/users/{user_id}/usage/month-to-date", response_model=dict)
+def retrieve_month_to_date_usage(user_id: int, db: Session = Depends(get_read_db)):
+    """Month-to-date spend and call counts for a user."""
+    return get_month_to_date_usage(db, user_id)
+
+@router.get("/users/{user_id}/usage/daily", response_model=list)
+def retrieve_user_daily_usage(user_id: int, start: date, end: date, db: Session = Depends(get_read_db)):
+    """Daily usage totals per engine for a user."""
+    return get_user_daily_usage(db, user_id, start, end)
+
+@router.get("/engines/{engine_id}/usage/daily", response_model=list)
+def retrieve_engine_daily_usage(engine_id: int, start: date, end: date, db: Session = Depends(get_read_db)):
+    """Daily usage totals per preset for an AI engine."""
+    return get_engine_daily_usage(db, engine_id, start, end)
+
+@router.get("/presets/{preset_id}/usage/daily", response_model=list)
+def retrieve_preset_daily_usage(preset_id: int, start: date, end: date, db: Session = Depends(get_read_db)):
+    """Daily usage totals per engine for an AI preset."""
+    return get_preset_daily_usage(db, preset_id, start, end)
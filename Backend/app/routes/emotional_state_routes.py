@@ -0,0 +1,90 @@
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app.db.session import get_db, read_router
+from app.schemas.bulk_schema import BulkResponse
+from app.schemas.emotional_state_schema import (
+    EmotionalStateCreate,
+    EmotionalStateUpdate,
+    EmotionalStateResponse,
+)
+from app.services.emotional_state_service import (
+    create_emotional_state,
+    update_emotional_state,
+    delete_emotional_state,
+    get_emotional_state_json,
+    list_emotional_states_json,
+    create_emotional_checkins_bulk,
+)
+from app.utils.etag import etag_response
+
+router = APIRouter()
+
+
+@router.get("/", response_model=List[EmotionalStateResponse])
+def list_states(if_none_match: Optional[str] = Header(None)):
+    """
+    Endpoint per recuperare tutti gli stati emozionali (serviti dalla cache dei cataloghi).
+    Con If-None-Match uguale all'ETag corrente risponde 304 senza body.
+    """
+    catalog = list_emotional_states_json()
+    return etag_response(catalog.body, catalog.etag, if_none_match)
+
+
+@router.get("/{state_id}", response_model=EmotionalStateResponse)
+def get_state(state_id: int, if_none_match: Optional[str] = Header(None)):
+    """
+    Endpoint per recuperare uno stato emozionale per ID (servito dalla cache dei cataloghi).
+    """
+    try:
+        catalog = get_emotional_state_json(state_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return etag_response(catalog.body, catalog.etag, if_none_match)
+
+
+@router.post("/", response_model=EmotionalStateResponse, status_code=status.HTTP_201_CREATED)
+def create_state(state_data: EmotionalStateCreate, db: Session = Depends(get_db)):
+    """
+    Endpoint per creare un nuovo stato emozionale.
+    """
+    try:
+        return create_emotional_state(db, state_data)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.put("/{state_id}", response_model=EmotionalStateResponse)
+def update_state(state_id: int, state_data: EmotionalStateUpdate, db: Session = Depends(get_db)):
+    """
+    Endpoint per aggiornare uno stato emozionale esistente.
+    """
+    try:
+        return update_emotional_state(db, state_id, state_data)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.delete("/{state_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_state(state_id: int, db: Session = Depends(get_db)):
+    """
+    Endpoint per eliminare uno stato emozionale.
+    """
+    try:
+        delete_emotional_state(db, state_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
+@router.post("/users/{user_id}/checkins/bulk", response_model=BulkResponse)
+def create_checkins_bulk(user_id: int, items: List[dict] = Body(...), db: Session = Depends(get_db)):
+    """
+    Endpoint per sincronizzare in blocco i check-in emozionali di un utente.
+    Restituisce un esito per ciascun elemento.
+    """
+    try:
+        result = create_emotional_checkins_bulk(db, user_id, items)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    read_router.stick_to_primary(user_id)
+    return result
@@ -0,0 +1,178 @@
+from fastapi import APIRouter, Request
+from app.db.session import engine, read_router
+from app.db.pool import get_pool_stats
+
+router = APIRouter()
+
+# Route: Live connection pool stats
+@router.get("/db-pool")
+def db_pool_stats():
+    """
+    Statistiche live del pool di connessioni (connessioni in uso, overflow,
+    tempi di attesa e timeout).
+    """
+    return get_pool_stats(engine)
+
+
+# Route: Read replica health
+@router.get("/db-replicas")
+def db_replica_status():
+    """
+    Stato delle repliche in lettura (le repliche non sane sono escluse dal routing).
+    """
+    return read_router.status()
+
+
+# Route: Cold start report
+@router.get("/startup")
+def startup_report(request: Request):
+    """
+    Tempo di cold start del worker e revisione dello schema verificata all'avvio.
+    """
+    return {
+        "cold_start_ms": getattr(request.app.state, "cold_start_ms", None),
+        "schema_revision": getattr(request.app.state, "schema_revision", None),
+    }
+
+
+# Route: Write-behind check-in buffer
+@router.get("/checkin-buffer")
+def checkin_buffer_stats():
+    """
+    Stato del buffer write-behind dei check-in (chiavi in coda e flush eseguiti).
+    """
+    from app.services.checkin_buffer import checkin_buffer
+
+    return checkin_buffer.stats()
+
+
+# Route: ai_usage_logs retention job
+@router.get("/usage-retention")
+def usage_retention_stats():
+    """
+    Esito dell'ultimo ciclo di retention di ai_usage_logs (partizioni o righe rimosse).
+    """
+    from app.services.usage_retention import usage_retention_job
+
+    return usage_retention_job.stats()
+
+
+# Route: AIUsageLog ingestion pipeline
+@router.get("/usage-ingestion")
+def usage_ingestion_stats():
+    """
+    Profondità della coda, dimensione dei blocchi e latenza dei flush degli AIUsageLog.
+    """
+    from app.services.usage_ingestion import usage_ingestion_queue
+
+    return usage_ingestion_queue.stats()
+
+
+# Route: catalog cache
+@router.get("/catalog-cache")
+def catalog_cache_stats():
+    """
+    Voci, hit/miss e versioni della cache dei cataloghi di questo worker.
+    """
+    from app.services.catalog_cache import catalog_cache
+
+    return catalog_cache.stats()
+
+
+# Route: premium entitlement cache
+@router.get("/entitlement-cache")
+def entitlement_cache_stats():
+    """
+    Voci e hit/miss della cache degli entitlement premium di questo worker.
+    """
+    from app.services.entitlement_cache import entitlement_cache
+
+    return entitlement_cache.stats()
+
+
+# Route: verified token cache
+@router.get("/token-cache")
+def token_cache_stats():
+    """
+    Voci e hit/miss della cache dei token JWT già verificati.
+    """
+    from app.utils.auth import verified_token_cache
+
+    return verified_token_cache.stats()
+
+
+# Route: password hashing pool
+@router.get("/password-hasher")
+def password_hasher_stats():
+    """
+    Stato del pool di processi bcrypt (operazioni in corso, completate e rifiutate).
+    """
+    from app.services.password_hasher import password_hasher
+
+    return password_hasher.stats()
+
+
+# Route: revoked sessions
+@router.get("/token-denylist")
+def token_denylist_stats():
+    """
+    Sessioni revocate nella denylist del worker e stato della sincronizzazione.
+    """
+    from app.services.token_service import token_denylist_sync
+
+    return token_denylist_sync.stats()
+
+
+# Route: Write-behind last_login buffer
+@router.get("/last-login-buffer")
+def last_login_buffer_stats():
+    """
+    Login in attesa di scrittura su users.last_login e statistiche dei flush.
+    """
+    from app.services.last_login_buffer import last_login_buffer
+
+    return last_login_buffer.stats()
+
+
+# Route: AI engine gateway
+@router.get("/ai-gateway")
+def ai_gateway_stats():
+    """
+    Chiamate ai motori AI per motore (in corso, errori, retry, rifiutate per saturazione).
+    """
+    from app.services.ai_gateway import ai_gateway
+
+    return ai_gateway.stats()
+
+
+# Route: AI engine latency and circuit breakers
+@router.get("/ai-engines")
+def ai_engine_health():
+    """
+    Latenza osservata (EWMA, p95), tasso di errore e stato del circuit breaker per motore.
+    """
+    from app.services.engine_health import engine_health
+
+    return engine_health.stats()
+
+
+# Route: AI engine micro-batching
+@router.get("/ai-batcher")
+def ai_batcher_stats():
+    """
+    Batch inviati per motore (richieste, dimensione media, batch pieni, errori) e richieste in attesa.
+    """
+    from app.services.ai_gateway import micro_batcher
+
+    return micro_batcher.stats()
+
+
+# Route: AI response cache
+@router.get("/ai-response-cache")
+def ai_response_cache_stats():
+    """
+    Risposte AI in cache, chiamate in corso e contatori di hit, miss e richieste accodate.
+    """
+    from app.services.response_cache import response_cache
+
+    return response_cache.stats()
@@ -0,0 +1,22 @@
+from typing import Optional
+from fastapi import APIRouter, Header
+from app.settings import JWKS_MAX_AGE_SECONDS
+from app.utils.etag import etag_response, make_etag
+from app.utils.jwt_utils import is_asymmetric, jwt_keyring
+
+router = APIRouter()
+
+# Le chiavi cambiano solo con una rotazione: i client possono tenerle in cache
+JWKS_CACHE_CONTROL = f"public, max-age={JWKS_MAX_AGE_SECONDS}"
+
+
+# Route: Public signing keys
+@router.get("/.well-known/jwks.json")
+def get_jwks(if_none_match: Optional[str] = Header(None)):
+    """
+    Chiavi pubbliche per verificare i token di accesso senza chiamare /users/verify-token/.
+    Il kid nell'header del token indica la chiave da usare; un kid sconosciuto
+    va trattato come segnale per riscaricare il JWKS. Con firma HS256 l'elenco è vuoto.
+    """
+    body = jwt_keyring.jwks() if is_asymmetric() else b'{"keys":[]}'
+    return etag_response(body, make_etag(body), if_none_match, JWKS_CACHE_CONTROL)
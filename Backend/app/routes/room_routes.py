@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, status
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import get_db, read_router
+from app.schemas.bulk_schema import BulkResponse
 from app.schemas.room_schema import (
     RoomCreate,
     RoomUpdate,
@@ -13,17 +14,37 @@ from app.services.room_service import (
     create_room,
     update_room,
     delete_room,
+    list_rooms_json,
+    get_room_json,
     create_room_checkin,
+    buffer_room_checkin,
     update_room_customization,
     create_user_room,
+    create_user_rooms_bulk,
     update_user_room,
     delete_user_room,
 )
-from typing import List
+from app.settings import CHECKIN_WRITE_BEHIND
+from app.utils.etag import etag_response
+from typing import List, Optional
 
 router = APIRouter()
 
 # Room routes
+@router.get("/")
+def list_rooms_route(if_none_match: Optional[str] = Header(None)):
+    """Retrieve all rooms (served from the catalog cache, 304 if unchanged)."""
+    catalog = list_rooms_json()
+    return etag_response(catalog.body, catalog.etag, if_none_match)
+
+
+@router.get("/{room_id}")
+def get_room_route(room_id: int, if_none_match: Optional[str] = Header(None)):
+    """Retrieve a room by id (served from the catalog cache, 304 if unchanged)."""
+    catalog = get_room_json(room_id)
+    return etag_response(catalog.body, catalog.etag, if_none_match)
+
+
 @router.post("/", response_model=RoomCreate, status_code=status.HTTP_201_CREATED)
 def create_room_route(room_data: RoomCreate, db: Session = Depends(get_db)):
     return create_room(db, room_data)
@@ -44,7 +65,8 @@ def delete_room_route(room_id: int, db: Session = Depends(get_db)):
 def create_room_checkin_route(
     room_id: int, checkin_data: RoomCheckinBase, db: Session = Depends(get_db)
 ):
-    return create_room_checkin(
+    record_checkin = buffer_room_checkin if CHECKIN_WRITE_BEHIND else create_room_checkin
+    return record_checkin(
         db, checkin_data.user_id, room_id, checkin_data.is_random
     )
 
@@ -55,6 +77,13 @@ def create_user_room_route(user_room_data: UserRoomCreate, db: Session = Depends
     return create_user_room(db, user_room_data.user_id, user_room_data)
 
 
+@router.post("/users/{user_id}/user-room/bulk", response_model=BulkResponse)
+def create_user_rooms_bulk_route(user_id: int, items: List[dict] = Body(...), db: Session = Depends(get_db)):
+    result = create_user_rooms_bulk(db, user_id, items)
+    read_router.stick_to_primary(user_id)
+    return result
+
+
 @router.put("/user-room/", response_model=UserRoomUpdate)
 def update_user_room_route(user_room_data: UserRoomUpdate, db: Session = Depends(get_db)):
     return update_user_room(db, user_room_data.user_id, user_room_data)
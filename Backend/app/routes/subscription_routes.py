@@ -1,13 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import get_db, read_router
 from app.schemas.subscription_schema import SubscriptionCreate, SubscriptionUpdate, SubscriptionResponse
 from app.services.subscription_service import SubscriptionService
 
-router = APIRouter(
-    prefix="/subscriptions",
-    tags=["subscriptions"]
-)
+router = APIRouter()
 
 
 @router.post("/", response_model=SubscriptionResponse, status_code=status.HTTP_201_CREATED)
@@ -16,15 +13,18 @@ def create_subscription(subscription_data: SubscriptionCreate, db: Session = Dep
     Endpoint per creare una nuova sottoscrizione.
     """
     try:
-        return SubscriptionService.create_subscription(db, subscription_data)
+        subscription = SubscriptionService.create_subscription(db, subscription_data)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    read_router.stick_to_primary(subscription.user_id)
+    return subscription
 
 
 @router.get("/{user_id}", response_model=SubscriptionResponse)
 def get_subscription(user_id: int, db: Session = Depends(get_db)):
     """
     Endpoint per recuperare una sottoscrizione attiva per un utente.
+    Letta dal primario: subito dopo un pagamento una replica potrebbe non avere ancora la riga.
     """
     subscription = SubscriptionService.get_subscription_by_user_id(db, user_id)
     if not subscription:
@@ -42,6 +42,7 @@ def update_subscription(
     updated_subscription = SubscriptionService.update_subscription(db, subscription_id, subscription_data)
     if not updated_subscription:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Subscription not found.")
+    read_router.stick_to_primary(updated_subscription.user_id)
     return updated_subscription
 
 
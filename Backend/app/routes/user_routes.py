@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Response, status
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import get_conditional_read_db, get_db, get_read_db, read_router
+from app.schemas.bulk_schema import BulkResponse
 from app.schemas.user_schema import (
     UserCreate,
     UserUpdate,
@@ -10,35 +12,42 @@ from app.schemas.user_schema import (
     UserSettingsResponse,
 )
 from app.services.user_service import (
-    create_user,
+    create_user_pooled,
     get_user_by_id,
     update_user,
     delete_user,
     create_user_settings,
-    get_user_settings,
+    get_user_settings_etag,
+    get_user_settings_with_etag,
     update_user_settings,
+    update_user_settings_bulk,
     delete_user_settings,
     UserService,
 )
+from app.services.token_service import refresh_tokens, revoke_refresh_token
+from app.utils.etag import PRIVATE_CACHE_CONTROL, etag_matches, not_modified
 
 router = APIRouter()
 
 # Route: Create a new user
 @router.post("/users/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def create_new_user(user_data: UserCreate, db: Session = Depends(get_db)):
-    return create_user(db, user_data)
+async def create_new_user(user_data: UserCreate, db: Session = Depends(get_db)):
+    # async: the bcrypt hash is awaited instead of blocking a threadpool slot
+    return await create_user_pooled(db, user_data)
 
 
 # Route: Get user by ID
 @router.get("/users/{user_id}", response_model=UserResponse)
-def get_user(user_id: int, db: Session = Depends(get_db)):
+def get_user(user_id: int, db: Session = Depends(get_read_db)):
     return get_user_by_id(db, user_id)
 
 
 # Route: Update a user
 @router.put("/users/{user_id}", response_model=UserResponse)
 def update_existing_user(user_id: int, user_updates: UserUpdate, db: Session = Depends(get_db)):
-    return update_user(db, user_id, user_updates)
+    user = update_user(db, user_id, user_updates)
+    read_router.stick_to_primary(user_id)
+    return user
 
 
 # Route: Delete a user
@@ -51,19 +60,47 @@ def delete_existing_user(user_id: int, db: Session = Depends(get_db)):
 # Route: Create user settings
 @router.post("/users/{user_id}/settings/", response_model=UserSettingsResponse)
 def create_settings_for_user(user_id: int, settings_data: UserSettingsCreate, db: Session = Depends(get_db)):
-    return create_user_settings(db, user_id, settings_data)
+    settings = create_user_settings(db, user_id, settings_data)
+    read_router.stick_to_primary(user_id)
+    return settings
 
 
 # Route: Get user settings
 @router.get("/users/{user_id}/settings/", response_model=UserSettingsResponse)
-def get_settings_for_user(user_id: int, db: Session = Depends(get_db)):
-    return get_user_settings(db, user_id)
+def get_settings_for_user(
+    user_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_conditional_read_db),
+):
+    # Revalidation reads only id and version, on the primary: 304 without loading or serializing the row
+    if if_none_match:
+        etag = get_user_settings_etag(db, user_id)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, PRIVATE_CACHE_CONTROL)
+
+    settings, etag = get_user_settings_with_etag(db, user_id)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = PRIVATE_CACHE_CONTROL
+    return settings
 
 
 # Route: Update user settings
 @router.put("/users/{user_id}/settings/", response_model=UserSettingsResponse)
 def update_settings_for_user(user_id: int, settings_updates: UserSettingsUpdate, db: Session = Depends(get_db)):
-    return update_user_settings(db, user_id, settings_updates)
+    settings = update_user_settings(db, user_id, settings_updates)
+    read_router.stick_to_primary(user_id)
+    return settings
+
+
+# Route: Bulk update of user settings (one transaction, per-item results)
+@router.put("/users/settings/bulk", response_model=BulkResponse)
+def update_settings_bulk(items: List[dict] = Body(...), db: Session = Depends(get_db)):
+    result = update_user_settings_bulk(db, items)
+    for item in result.results:
+        if item.status == "updated":
+            read_router.stick_to_primary(items[item.index]["user_id"])
+    return result
 
 
 # Route: Delete user settings
@@ -75,14 +112,34 @@ def delete_settings_for_user(user_id: int, db: Session = Depends(get_db)):
 
 # Route: User login
 @router.post("/login/")
-def login_user(email: str, password: str, db: Session = Depends(get_db)):
+async def login_user(email: str, password: str, db: Session = Depends(get_db)):
+    # async: bcrypt is awaited on the process pool, queries run in the threadpool
     try:
-        token = UserService.login_user(db, email, password)
-        return {"access_token": token, "token_type": "bearer"}
+        return await UserService.login_user_pooled(db, email, password)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
 
 
+# Route: Refresh token
+@router.post("/token/refresh")
+def refresh_access_token(refresh_token: str = Body(..., embed=True), db: Session = Depends(get_db)):
+    """
+    Nuovo token di accesso senza password. Il refresh token usato viene
+    sostituito da quello restituito e non è più valido.
+    """
+    try:
+        return refresh_tokens(db, refresh_token)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
+
+
+# Route: Logout (revoca della sessione)
+@router.post("/token/revoke", status_code=status.HTTP_204_NO_CONTENT)
+def revoke_token(refresh_token: str = Body(..., embed=True), db: Session = Depends(get_db)):
+    revoke_refresh_token(db, refresh_token)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
 # Route: Verify token
 @router.post("/verify-token/")
 def verify_token(token: str):
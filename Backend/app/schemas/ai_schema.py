@@ -10,6 +10,8 @@ class AIEngineBase(BaseModel):
     pricing_model: Dict[str, float] = Field(..., description="JSON structure with cost details (e.g., {'type': 'per_call', 'cost_per_call': 0.005})")
     max_tokens: Optional[int] = None
     latency_ms: Optional[int] = Field(0, description="Average response latency in milliseconds")
+    batch_max_size: int = Field(0, ge=0, description="Requests sent in one batched call; 0 or 1 disables batching")
+    batch_window_ms: int = Field(15, ge=1, le=1000, description="Maximum wait to fill a batch, in milliseconds")
 
 class AIEngineCreate(AIEngineBase):
     pass
@@ -62,6 +64,7 @@ class AIUsageLogBase(BaseModel):
     emotional_state_id: Optional[int] = None
     cost: float = Field(0.0, description="Cost of the AI request")
     latency_ms: Optional[int] = None
+    ttft_ms: Optional[int] = Field(None, description="Time to first token of a streamed response, in milliseconds")
     status: str = Field(..., description="Status of the request, e.g., success or failure")
     error_message: Optional[str] = None
 
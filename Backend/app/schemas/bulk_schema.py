@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+
+# Esito di un singolo elemento di una richiesta bulk
+class BulkItemResult(BaseModel):
+    index: int = Field(..., description="Posizione dell'elemento nella richiesta")
+    status: str = Field(..., description="created, updated oppure error")
+    id: Optional[int] = None  # ID della riga scritta (se disponibile)
+    error: Optional[str] = None  # Motivo dello scarto
+
+
+# Risposta di una richiesta bulk: un esito per elemento, nell'ordine ricevuto
+class BulkResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BulkItemResult]
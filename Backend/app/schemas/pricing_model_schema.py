@@ -12,6 +12,12 @@ class PricingModelSchema(BaseModel):
     premium_discount: Optional[float] = Field(
         None, description="Percentuale di sconto per utenti premium", ge=0, le=100
     )
+    cost_per_batch_call: Optional[float] = Field(
+        None, description="Costo fisso di una chiamata batch (default: cost_per_call)", ge=0
+    )
+    cost_per_batch_item: Optional[float] = Field(
+        None, description="Costo aggiuntivo per ogni richiesta di un batch", ge=0
+    )
 
     @validator("cost_per_call", always=True)
     def validate_cost_per_call(cls, value, values):
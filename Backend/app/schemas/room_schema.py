@@ -36,6 +36,9 @@ class RoomCustomizationBase(BaseModel):
 class UserRoomCreate(RoomCustomizationBase):
     room_id: int = Field(..., description="ID della stanza personalizzata")
 
+class UserRoomUpdate(RoomCustomizationBase):
+    room_id: int = Field(..., description="ID della stanza personalizzata")
+
 class UserRoomResponse(RoomCustomizationBase):
     id: int
     user_id: int = Field(..., description="ID dell'utente che ha personalizzato la stanza")
@@ -55,6 +55,10 @@ class UserSettingsUpdate(BaseModel):
     default_room_id: Optional[int] = None
     receive_checkin_reminder: Optional[bool] = None
 
+# User settings bulk update item schema
+class UserSettingsBulkUpdate(UserSettingsUpdate):
+    user_id: int
+
 # User settings output schema
 class UserSettingsOut(BaseModel):
     id: int
@@ -70,3 +74,6 @@ class UserSettingsOut(BaseModel):
     receive_checkin_reminder: Optional[bool]
     class Config:
         orm_mode = True
+
+# User settings response schema (nome usato da route e servizi)
+UserSettingsResponse = UserSettingsOut
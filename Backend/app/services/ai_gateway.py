@@ -0,0 +1,652 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+import anyio
+import httpx
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+from app.db.session import SessionLocal
+from app.models.ai import AIEngine, AIPreset
+from app.services.ai_service import store_ai_usage
+from app.services.catalog_cache import catalog_cache
+from app.services.engine_health import engine_health
+from app.services.micro_batcher import MicroBatcher
+from app.services.response_cache import MISS, response_cache, response_cache_key
+from app.settings import (
+    AI_GATEWAY_MAX_CONCURRENCY,
+    AI_GATEWAY_QUEUE_TIMEOUT,
+    AI_GATEWAY_CONNECT_TIMEOUT,
+    AI_GATEWAY_READ_TIMEOUT,
+    AI_GATEWAY_KEEPALIVE_SECONDS,
+    AI_GATEWAY_MAX_RETRIES,
+    AI_GATEWAY_BACKOFF_BASE_MS,
+    AI_GATEWAY_BACKOFF_MAX_MS,
+    AI_GATEWAY_HTTP2,
+    AI_GATEWAY_CATALOG_TTL_SECONDS,
+    AI_ENGINE_EXPLORE_RATE,
+    USAGE_INGEST_ASYNC,
+)
+
+logger = logging.getLogger(__name__)
+
+ENGINES_CATALOG = "ai_engines"
+PRESETS_CATALOG = "ai_presets"
+
+# Colonne di AIPreset che influenzano la risposta del motore (chiave della cache)
+PRESET_PARAMS = (
+    "gender", "pitch", "speech_rate", "accent", "voice_quality", "tone", "formality_level", "empathy_level",
+    "focus", "language", "proactive_level", "response_length", "personality", "dynamic_behavior",
+)
+
+# Risposte del motore dopo le quali ha senso riprovare
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class EngineSpec(NamedTuple):
+    """Dati di un motore necessari alla chiamata, letti una volta per versione del catalogo."""
+    id: int
+    name: str
+    api_endpoint: str
+    api_key: str
+    max_tokens: Optional[int]
+    pricing_model: dict
+    latency_ms: int
+    batch_max_size: int = 0
+    batch_window_ms: int = 0
+
+
+class EngineResult(NamedTuple):
+    engine_id: int
+    response: dict
+    latency_ms: int
+    attempts: int
+
+
+class EngineCallError(Exception):
+    """Chiamata a un motore fallita; `status_code` è quello da restituire al client."""
+
+    def __init__(self, message: str, status_code: int = status.HTTP_502_BAD_GATEWAY,
+                 retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+@dataclass
+class EngineStats:
+    calls: int = 0
+    errors: int = 0
+    retries: int = 0
+    rejected: int = 0
+    in_flight: int = 0
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _status_error(engine: "EngineSpec", response: httpx.Response) -> Optional[EngineCallError]:
+    """Errore corrispondente allo status HTTP della risposta del motore, None se 2xx/3xx."""
+    if response.status_code in RETRYABLE_STATUS:
+        return EngineCallError(f"Il motore {engine.name} ha risposto {response.status_code}.",
+                               retryable=True, retry_after=_retry_after(response))
+    if response.status_code >= 400:
+        return EngineCallError(f"Il motore {engine.name} ha risposto {response.status_code}.")
+    return None
+
+
+def _transport_error(engine: "EngineSpec", e: httpx.HTTPError) -> EngineCallError:
+    if isinstance(e, httpx.TimeoutException):
+        return EngineCallError(f"Timeout del motore {engine.name}: {type(e).__name__}",
+                               status.HTTP_504_GATEWAY_TIMEOUT, retryable=True)
+    return EngineCallError(f"Motore {engine.name} non raggiungibile: {type(e).__name__}", retryable=True)
+
+
+class AIGateway:
+    """
+    Chiamate HTTP verso i motori AI (AIEngine.api_endpoint). Ogni motore ha un
+    client httpx condiviso, con connessioni keep-alive (HTTP/2 se il motore lo
+    negozia) e al massimo `max_concurrency` chiamate in corso: oltre, la
+    chiamata attende uno slot per `queue_timeout` secondi e poi fallisce con 503.
+    Gli errori transitori (connessione, timeout, 429 e 5xx) vengono ritentati
+    con backoff esponenziale e jitter, rispettando Retry-After.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        queue_timeout: float = 5.0,
+        connect_timeout: float = 2.0,
+        read_timeout: float = 30.0,
+        keepalive_seconds: float = 30.0,
+        max_retries: int = 2,
+        backoff_base_ms: int = 100,
+        backoff_max_ms: int = 2000,
+        http2: bool = True,
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout, pool=queue_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_concurrency,
+            max_keepalive_connections=max_concurrency,
+            keepalive_expiry=keepalive_seconds,
+        )
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base_ms / 1000
+        self.backoff_max = backoff_max_ms / 1000
+        self.http2 = http2
+        # Client e semafori appartengono all'event loop in cui sono stati creati
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._clients: Dict[int, httpx.AsyncClient] = {}
+        self._slots: Dict[int, asyncio.Semaphore] = {}
+        self._stats: Dict[int, EngineStats] = {}
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._clients, self._slots = loop, {}, {}
+
+    def _client(self, engine_id: int) -> httpx.AsyncClient:
+        client = self._clients.get(engine_id)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(http2=self.http2, timeout=self.timeout, limits=self.limits)
+            self._clients[engine_id] = client
+        return client
+
+    def _slot(self, engine_id: int) -> asyncio.Semaphore:
+        if engine_id not in self._slots:
+            self._slots[engine_id] = asyncio.Semaphore(self.max_concurrency)
+        return self._slots[engine_id]
+
+    def stats_for(self, engine_id: int) -> EngineStats:
+        return self._stats.setdefault(engine_id, EngineStats())
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        # Full jitter: attese casuali evitano che i client ritentino tutti insieme
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    async def _acquire(self, engine: EngineSpec) -> asyncio.Semaphore:
+        slot = self._slot(engine.id)
+        try:
+            await asyncio.wait_for(slot.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats_for(engine.id).rejected += 1
+            raise EngineCallError(f"Motore {engine.name} saturo.", status.HTTP_503_SERVICE_UNAVAILABLE)
+        return slot
+
+    async def _send(self, engine: EngineSpec, body: dict) -> dict:
+        stats = self.stats_for(engine.id)
+        slot = await self._acquire(engine)
+        stats.in_flight += 1
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = await self._client(engine.id).post(
+                engine.api_endpoint, json=body, headers={"Authorization": f"Bearer {engine.api_key}"}
+            )
+            error = _status_error(engine, response)
+            if error:
+                raise error
+            try:
+                result = response.json()
+            except ValueError:
+                raise EngineCallError(f"Risposta non JSON dal motore {engine.name}.")
+            ok = True
+            return result
+        except httpx.HTTPError as e:
+            raise _transport_error(engine, e)
+        finally:
+            stats.in_flight -= 1
+            slot.release()
+            engine_health.record(engine.id, (time.perf_counter() - started) * 1000, ok)
+
+    async def request(self, engine: EngineSpec, body: dict) -> Tuple[dict, int]:
+        """
+        Invia `body` al motore, ritentando gli errori transitori.
+        :return: La risposta JSON del motore e il numero di tentativi.
+        :raises EngineCallError: Se l'ultimo tentativo fallisce.
+        """
+        self._bind_loop()
+        stats = self.stats_for(engine.id)
+        stats.calls += 1
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._send(engine, body), attempt + 1
+            except EngineCallError as e:
+                # Con il circuito aperto non si insiste: il chiamante passa a un altro motore
+                if not e.retryable or attempt == self.max_retries or engine_health.is_open(engine.id):
+                    stats.errors += 1
+                    raise
+                stats.retries += 1
+                await asyncio.sleep(self._backoff(attempt, e.retry_after))
+
+    async def stream(self, engine: EngineSpec, body: dict) -> AsyncIterator[str]:
+        """
+        Invia `body` con "stream": true e restituisce i frammenti di testo man
+        mano che il motore li invia (righe SSE `data: {"delta": "..."}`, chiuse
+        da `data: [DONE]`). Si ritenta solo finché non è arrivato alcun frammento.
+
+        Il motore viene letto solo quando il chiamante chiede il frammento
+        successivo, quindi un client lento rallenta anche la lettura a monte;
+        chiudere il generatore chiude la connessione verso il motore.
+        :raises EngineCallError: Se la chiamata fallisce o la risposta non è valida.
+        """
+        self._bind_loop()
+        stats = self.stats_for(engine.id)
+        stats.calls += 1
+        body = {**body, "stream": True}
+        for attempt in range(self.max_retries + 1):
+            slot = await self._acquire(engine)
+            stats.in_flight += 1
+            started = time.perf_counter()
+            first = True
+            try:
+                async with self._client(engine.id).stream(
+                    "POST", engine.api_endpoint, json=body, headers={"Authorization": f"Bearer {engine.api_key}"}
+                ) as response:
+                    error = _status_error(engine, response)
+                    if error:
+                        raise error
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        try:
+                            delta = json.loads(data).get("delta")
+                        except (ValueError, AttributeError):
+                            raise EngineCallError(f"Frammento non valido dal motore {engine.name}.")
+                        if first:
+                            # Per i motori in streaming la latenza utile è il tempo al primo frammento
+                            first = False
+                            engine_health.record(engine.id, (time.perf_counter() - started) * 1000, True)
+                        if delta:
+                            yield delta
+                return
+            except (EngineCallError, httpx.HTTPError) as e:
+                error = e if isinstance(e, EngineCallError) else _transport_error(engine, e)
+                engine_health.record(engine.id, (time.perf_counter() - started) * 1000, False)
+                if (not first or not error.retryable or attempt == self.max_retries
+                        or engine_health.is_open(engine.id)):
+                    stats.errors += 1
+                    raise error
+            finally:
+                stats.in_flight -= 1
+                slot.release()
+            stats.retries += 1
+            await asyncio.sleep(self._backoff(attempt, error.retry_after))
+
+    async def aclose(self):
+        """Chiude le connessioni aperte verso i motori (shutdown)."""
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "engines": {engine_id: vars(stats).copy() for engine_id, stats in self._stats.items()},
+            "open_clients": len(self._clients),
+        }
+
+
+# Gateway condiviso dal worker
+ai_gateway = AIGateway(
+    max_concurrency=AI_GATEWAY_MAX_CONCURRENCY,
+    queue_timeout=AI_GATEWAY_QUEUE_TIMEOUT,
+    connect_timeout=AI_GATEWAY_CONNECT_TIMEOUT,
+    read_timeout=AI_GATEWAY_READ_TIMEOUT,
+    keepalive_seconds=AI_GATEWAY_KEEPALIVE_SECONDS,
+    max_retries=AI_GATEWAY_MAX_RETRIES,
+    backoff_base_ms=AI_GATEWAY_BACKOFF_BASE_MS,
+    backoff_max_ms=AI_GATEWAY_BACKOFF_MAX_MS,
+    http2=AI_GATEWAY_HTTP2,
+)
+
+# Batch per i motori con batch_max_size > 1
+micro_batcher = MicroBatcher(ai_gateway)
+
+def _is_current(cached: tuple, version: int) -> bool:
+    """Valori (versione, scadenza, dati) ancora validi per la versione del catalogo."""
+    return cached[0] == version and cached[1] > time.monotonic()
+
+
+# Motori (con api_key) legati alla versione del catalogo ai_engines, con scadenza
+_engines: Tuple[int, float, Dict[int, EngineSpec]] = (-1, 0.0, {})
+
+
+def _load_engines() -> Dict[int, EngineSpec]:
+    db = SessionLocal()
+    try:
+        rows = db.execute(select(
+            AIEngine.id, AIEngine.name, AIEngine.api_endpoint, AIEngine.api_key,
+            AIEngine.max_tokens, AIEngine.pricing_model, AIEngine.latency_ms,
+            AIEngine.batch_max_size, AIEngine.batch_window_ms,
+        )).all()
+    finally:
+        db.close()
+    return {
+        row.id: EngineSpec(*row[:6], row.latency_ms or 0, row.batch_max_size or 0, row.batch_window_ms or 0)
+        for row in rows
+    }
+
+
+async def get_engines() -> Dict[int, EngineSpec]:
+    """
+    Motori configurati, riletti dopo una modifica al catalogo ai_engines o
+    comunque ogni AI_GATEWAY_CATALOG_TTL_SECONDS.
+    """
+    global _engines
+    version = catalog_cache.version(ENGINES_CATALOG)
+    if not _is_current(_engines, version):
+        _engines = (version, time.monotonic() + AI_GATEWAY_CATALOG_TTL_SECONDS, await run_in_threadpool(_load_engines))
+    return _engines[2]
+
+
+# Parametri dei preset legati alla versione del catalogo ai_presets, con scadenza
+_preset_params: Tuple[int, float, Dict[int, dict]] = (-1, 0.0, {})
+
+
+def _load_preset_params() -> Dict[int, dict]:
+    db = SessionLocal()
+    try:
+        rows = db.execute(select(AIPreset.id, *(getattr(AIPreset, name) for name in PRESET_PARAMS))).all()
+    finally:
+        db.close()
+    return {row.id: {name: getattr(row, name) for name in PRESET_PARAMS} for row in rows}
+
+
+async def get_preset_params(preset_id: Optional[int]) -> Optional[dict]:
+    """
+    Parametri effettivi di un preset, riletti dopo una modifica al catalogo
+    ai_presets o comunque ogni AI_GATEWAY_CATALOG_TTL_SECONDS.
+    """
+    global _preset_params
+    if preset_id is None:
+        return None
+    version = catalog_cache.version(PRESETS_CATALOG)
+    if not _is_current(_preset_params, version):
+        _preset_params = (
+            version, time.monotonic() + AI_GATEWAY_CATALOG_TTL_SECONDS, await run_in_threadpool(_load_preset_params)
+        )
+    return _preset_params[2].get(preset_id)
+
+
+def usage_cost(pricing_model: dict, is_premium: bool, batch_size: int = 1) -> Tuple[Decimal, Decimal]:
+    """
+    Costo di una chiamata riuscita secondo il pricing_model del motore.
+    In un batch di `batch_size` richieste ogni chiamante paga la sua quota:
+    (cost_per_batch_call + cost_per_batch_item * batch_size) / batch_size.
+    :return: (costo, sconto premium); lo sconto è già sottratto dal costo.
+    """
+    if pricing_model.get("type") != "per_call":
+        return Decimal("0"), Decimal("0")
+    cost = Decimal(str(pricing_model.get("cost_per_call") or 0))
+    if batch_size > 1:
+        per_batch = pricing_model.get("cost_per_batch_call")
+        per_item = Decimal(str(pricing_model.get("cost_per_batch_item") or 0))
+        cost = Decimal(str(per_batch)) if per_batch is not None else cost
+        cost = ((cost + per_item * batch_size) / batch_size).quantize(Decimal("0.0001"))
+    discount = Decimal("0")
+    if is_premium and pricing_model.get("premium_discount"):
+        discount = (cost * Decimal(str(pricing_model["premium_discount"])) / 100).quantize(Decimal("0.0001"))
+    return cost - discount, discount
+
+
+def _store_usage(record: dict):
+    db = SessionLocal()
+    try:
+        store_ai_usage(db, record)
+    finally:
+        db.close()
+
+
+async def _record_usage(record: dict):
+    # Con l'ingestione asincrona è solo un put su una coda; altrimenti una scrittura sincrona
+    if USAGE_INGEST_ASYNC:
+        store_ai_usage(None, record)
+    else:
+        await run_in_threadpool(_store_usage, record)
+
+
+async def call_engine(
+    engine_id: int,
+    user_id: int,
+    payload: dict,
+    preset_id: Optional[int] = None,
+    emotional_state_id: Optional[int] = None,
+    is_premium: bool = False,
+    use_cache: bool = True,
+) -> EngineResult:
+    """
+    Chiama un motore AI e registra la chiamata in ai_usage_logs, riuscita o meno.
+    Le risposte arrivate dalla cache, o da una chiamata identica già in corso,
+    sono registrate con costo zero e stato "cached".
+    :param payload: Il body JSON per il motore; max_tokens viene aggiunto se il motore lo prevede.
+    :param use_cache: False per forzare una nuova generazione (la risposta aggiorna comunque la cache).
+    :raises HTTPException: 404 se il motore non esiste, 502/503/504 se la chiamata fallisce.
+    """
+    engine = (await get_engines()).get(engine_id)
+    if engine is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="AI engine not found.")
+
+    body = dict(payload)
+    if engine.max_tokens:
+        body.setdefault("max_tokens", engine.max_tokens)
+    record = {
+        "user_id": user_id,
+        "engine_id": engine_id,
+        "preset_id": preset_id,
+        "emotional_state_id": emotional_state_id,
+        "request_payload": body,
+    }
+
+    attempts = 0
+
+    async def send() -> dict:
+        # La chiamata vera e propria, registrata qui: con il coalescing prosegue
+        # anche se chi l'ha avviata si disconnette
+        nonlocal attempts
+        if not engine_health.allow(engine_id):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Motore {engine.name} temporaneamente escluso (circuito aperto).",
+            )
+        sent = time.perf_counter()
+        batch_size = 1
+        try:
+            if engine.batch_max_size > 1:
+                response, attempts, batch_size = await micro_batcher.submit(engine, body)
+            else:
+                response, attempts = await ai_gateway.request(engine, body)
+        except EngineCallError as e:
+            await _record_usage(dict(
+                record, response_payload=None, cost=0, premium_discount=0, status="error", error_message=str(e),
+                latency_ms=round((time.perf_counter() - sent) * 1000),
+            ))
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+        cost, discount = usage_cost(engine.pricing_model or {}, is_premium, batch_size)
+        await _record_usage(dict(
+            record, response_payload=response, cost=cost, premium_discount=discount, status="success",
+            error_message=None, latency_ms=round((time.perf_counter() - sent) * 1000),
+        ))
+        return response
+
+    started = time.perf_counter()
+    key = response_cache_key(engine_id, await get_preset_params(preset_id), emotional_state_id, body)
+    if use_cache:
+        response, source = await response_cache.fetch(key, send)
+    else:
+        response, source = await send(), MISS
+        response_cache.put(key, response)
+    latency_ms = round((time.perf_counter() - started) * 1000)
+
+    if source != MISS:
+        await _record_usage(dict(
+            record, response_payload=response, cost=0, premium_discount=0, status="cached",
+            error_message=None, latency_ms=latency_ms,
+        ))
+    return EngineResult(engine_id, response, latency_ms, attempts)
+
+
+async def stream_engine(
+    engine_id: int,
+    user_id: int,
+    payload: dict,
+    preset_id: Optional[int] = None,
+    emotional_state_id: Optional[int] = None,
+    is_premium: bool = False,
+) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Apre una chiamata in streaming a un motore AI. I controlli (motore
+    esistente, circuito chiuso) avvengono prima di restituire il generatore,
+    così possono ancora diventare una risposta HTTP di errore.
+    La cache delle risposte e il micro-batching non si applicano allo streaming.
+    :return: Generatore di eventi (nome, dati): "token" per ogni frammento,
+        poi "done" con latenza, TTFT e costo, oppure "error".
+    :raises HTTPException: 404 se il motore non esiste, 503 se il circuito è aperto.
+    """
+    engine = (await get_engines()).get(engine_id)
+    if engine is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="AI engine not found.")
+    if not engine_health.allow(engine_id):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Motore {engine.name} temporaneamente escluso (circuito aperto).",
+        )
+
+    body = dict(payload)
+    if engine.max_tokens:
+        body.setdefault("max_tokens", engine.max_tokens)
+    record = {
+        "user_id": user_id,
+        "engine_id": engine_id,
+        "preset_id": preset_id,
+        "emotional_state_id": emotional_state_id,
+        "request_payload": body,
+    }
+    return _stream_events(engine, body, record, is_premium)
+
+
+async def _stream_events(
+    engine: EngineSpec, body: dict, record: dict, is_premium: bool
+) -> AsyncIterator[Tuple[str, dict]]:
+    started = time.perf_counter()
+    ttft_ms: Optional[int] = None
+    chunks: List[str] = []
+    # Se il generatore viene chiuso prima della fine il client si è disconnesso
+    record.update(cost=0, premium_discount=0, status="cancelled", error_message="Client disconnesso.")
+    try:
+        async for delta in ai_gateway.stream(engine, body):
+            if ttft_ms is None:
+                # Il motore ha iniziato a generare: la chiamata è dovuta anche se poi viene interrotta
+                ttft_ms = round((time.perf_counter() - started) * 1000)
+                cost, discount = usage_cost(engine.pricing_model or {}, is_premium)
+                record.update(cost=cost, premium_discount=discount)
+            chunks.append(delta)
+            yield "token", {"delta": delta}
+        record.update(status="success", error_message=None)
+        yield "done", {
+            "engine_id": engine.id,
+            "latency_ms": round((time.perf_counter() - started) * 1000),
+            "ttft_ms": ttft_ms,
+            "cost": str(record["cost"]),
+        }
+    except EngineCallError as e:
+        record.update(status="error", error_message=str(e))
+        yield "error", {"status_code": e.status_code, "detail": str(e)}
+    finally:
+        record.update(
+            response_payload={"output": "".join(chunks)} if chunks else None,
+            latency_ms=round((time.perf_counter() - started) * 1000),
+            ttft_ms=ttft_ms,
+        )
+        # Alla disconnessione il task della risposta è già cancellato: la scrittura va protetta
+        with anyio.CancelScope(shield=True):
+            await _record_usage(record)
+
+
+def engine_fits(engine: EngineSpec, is_premium: bool, max_cost_per_call: Optional[float]) -> bool:
+    """
+    Verifica che il motore sia utilizzabile dall'utente: i motori "subscription"
+    sono riservati agli utenti premium, e il costo effettivo per chiamata
+    (sconto premium incluso) non deve superare max_cost_per_call.
+    """
+    pricing_model = engine.pricing_model or {}
+    if pricing_model.get("type") == "subscription" and not is_premium:
+        return False
+    if max_cost_per_call is not None:
+        cost, _ = usage_cost(pricing_model, is_premium)
+        return cost <= Decimal(str(max_cost_per_call))
+    return True
+
+
+def _rank_key(engine: EngineSpec):
+    # Prima i motori senza campioni (vanno misurati), in ordine di latency_ms salvata
+    score = engine_health.score(engine.id)
+    return (0, engine.latency_ms) if score is None else (1, score)
+
+
+async def rank_engines(is_premium: bool, max_cost_per_call: Optional[float] = None) -> List[EngineSpec]:
+    """
+    Motori compatibili con l'utente, dal più veloce al più lento secondo la
+    latenza osservata; quelli con il circuito aperto sono esclusi.
+    Con probabilità AI_ENGINE_EXPLORE_RATE un altro motore passa in testa,
+    così le latenze dei motori non scelti restano aggiornate.
+    """
+    candidates = sorted(
+        (
+            engine for engine in (await get_engines()).values()
+            if engine_fits(engine, is_premium, max_cost_per_call) and engine_health.is_available(engine.id)
+        ),
+        key=_rank_key,
+    )
+    if len(candidates) > 1 and random.random() < AI_ENGINE_EXPLORE_RATE:
+        candidates.insert(0, candidates.pop(random.randrange(1, len(candidates))))
+    return candidates
+
+
+async def call_best_engine(
+    user_id: int,
+    payload: dict,
+    preset_id: Optional[int] = None,
+    emotional_state_id: Optional[int] = None,
+    is_premium: bool = False,
+    max_cost_per_call: Optional[float] = None,
+    use_cache: bool = True,
+) -> EngineResult:
+    """
+    Chiama il motore più veloce tra quelli disponibili per l'utente; se la
+    chiamata fallisce (5xx o circuito aperto) passa al successivo.
+    :raises HTTPException: 503 se nessun motore è disponibile, altrimenti l'errore dell'ultimo tentativo.
+    """
+    last_error: Optional[HTTPException] = None
+    for engine in await rank_engines(is_premium, max_cost_per_call):
+        try:
+            return await call_engine(
+                engine.id, user_id, payload,
+                preset_id=preset_id, emotional_state_id=emotional_state_id, is_premium=is_premium,
+                use_cache=use_cache,
+            )
+        except HTTPException as e:
+            if e.status_code < 500:
+                raise
+            last_error = e
+    raise last_error or HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Nessun motore AI disponibile.",
+    )
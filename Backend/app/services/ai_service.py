@@ -1,8 +1,13 @@
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.models.ai import AIEngine, AIPreset, UserAISettings
+from app.models.ai import AIEngine, AIPreset, AIUsageLog
+from app.models.user import UserAISettings
 from app.schemas.ai_schema import (
     AIEngineBase,
     AIEngineCreate,
+    AIUsageLogCreate,
     AIPresetBase,
     AIPresetCreate,
     UserAISettingsBase,
@@ -13,6 +18,12 @@ from app.schemas.ai_schema import (
 from app.schemas.pricing_model_schema import PricingModelSchema  # Import per la validazione
 from app.models.user import User
 from app.db.session import get_db
+from app.db.writes import insert_returning, insert_returning_async, update_returning, update_returning_async
+from app.services.catalog_cache import CatalogBody, catalog_cache, invalidate_catalog, load_catalog
+from app.services.entitlement_cache import require_premium_access, require_premium_access_async
+from app.services.usage_rollups import apply_usage_rollups
+from app.settings import USAGE_INGEST_ASYNC
+from datetime import datetime
 from fastapi import HTTPException, status
 
 # AIEngine Services
@@ -21,6 +32,13 @@ def get_ai_engines(db: Session):
     """Retrieve all available AI engines."""
     return db.query(AIEngine).all()
 
+def get_ai_engines_json() -> CatalogBody:
+    """Serialized AI engine catalog (without api_key) and its ETag, served from the catalog cache."""
+    return catalog_cache.get(
+        "ai_engines", "all", lambda: load_catalog("ai_engines", get_ai_engines, exclude=("api_key",))
+    )
+
+def create_ai_engine(db: Session, ai_engine_data: AIEngineCreate):
     """Create a new AI engine."""
     # Validazione di pricing_model
     try:
@@ -31,10 +49,9 @@ def get_ai_engines(db: Session):
             detail=f"Invalid pricing model: {e}",
         )
 
-    ai_engine = AIEngine(**ai_engine_data.dict())
-    db.add(ai_engine)
+    ai_engine = insert_returning(db, AIEngine, ai_engine_data.dict())
+    invalidate_catalog(db, "ai_engines")
     db.commit()
-    db.refresh(ai_engine)
     return ai_engine
 
 # AIPreset Services
@@ -43,12 +60,15 @@ def get_ai_presets(db: Session):
     """Retrieve all available AI presets."""
     return db.query(AIPreset).all()
 
+def get_ai_presets_json() -> CatalogBody:
+    """Serialized AI preset catalog and its ETag, served from the catalog cache."""
+    return catalog_cache.get("ai_presets", "all", lambda: load_catalog("ai_presets", get_ai_presets))
+
 def create_ai_preset(db: Session, ai_preset_data: AIPresetCreate):
     """Create a new AI preset."""
-    ai_preset = AIPreset(**ai_preset_data.dict())
-    db.add(ai_preset)
+    ai_preset = insert_returning(db, AIPreset, ai_preset_data.dict())
+    invalidate_catalog(db, "ai_presets")
     db.commit()
-    db.refresh(ai_preset)
     return ai_preset
 
 # UserAISettings Services
@@ -65,30 +85,30 @@ def get_user_ai_settings(db: Session, user_id: int):
 
 def create_user_ai_settings(db: Session, user_id: int, settings_data: UserAISettingsCreate):
     """Create AI settings for a user."""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.query(User.id).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"User with ID {user_id} not found."
         )
-    user_ai_settings = UserAISettings(user_id=user_id, **settings_data.dict())
-    db.add(user_ai_settings)
+    require_premium_access(db, user_id, "ai_presets", [settings_data.ai_preset_id])
+    user_ai_settings = insert_returning(db, UserAISettings, {"user_id": user_id, **settings_data.dict()})
     db.commit()
-    db.refresh(user_ai_settings)
     return user_ai_settings
 
 def update_user_ai_settings(db: Session, user_id: int, settings_data: UserAISettingsUpdate):
     """Update AI settings for a user."""
-    user_ai_settings = db.query(UserAISettings).filter(UserAISettings.user_id == user_id).first()
+    if settings_data.ai_preset_id is not None:
+        require_premium_access(db, user_id, "ai_presets", [settings_data.ai_preset_id])
+    user_ai_settings = update_returning(
+        db, UserAISettings, [UserAISettings.user_id == user_id], settings_data.dict(exclude_unset=True)
+    )
     if not user_ai_settings:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"AI settings for user with ID {user_id} not found."
         )
-    for key, value in settings_data.dict(exclude_unset=True).items():
-        setattr(user_ai_settings, key, value)
     db.commit()
-    db.refresh(user_ai_settings)
     return user_ai_settings
 
 def delete_user_ai_settings(db: Session, user_id: int):
@@ -102,3 +122,113 @@ def delete_user_ai_settings(db: Session, user_id: int):
     db.delete(user_ai_settings)
     db.commit()
     return {"message": "AI settings deleted successfully."}
+
+# AIUsageLog Services
+
+def record_ai_usage(db: Session, usage_data: AIUsageLogCreate):
+    """
+    Record an AI call. With USAGE_INGEST_ASYNC the record is queued and written
+    in batches by the ingestion pipeline instead of inline with the request.
+    """
+    return store_ai_usage(db, usage_data.dict())
+
+def store_ai_usage(db: Optional[Session], record: dict):
+    """
+    Record an AI call from an already validated dict (e.g. from the engine gateway).
+    The session is not used when USAGE_INGEST_ASYNC is enabled.
+    """
+    record = {**record, "created_at": datetime.utcnow()}
+    if USAGE_INGEST_ASYNC:
+        from app.services.usage_ingestion import usage_ingestion_queue
+
+        usage_ingestion_queue.put(record)
+        return None
+    usage_log = AIUsageLog(**record)
+    db.add(usage_log)
+    apply_usage_rollups(db, [record])
+    db.commit()
+    return usage_log
+
+
+# Async variants (AsyncSession)
+
+async def get_ai_engines_async(db: AsyncSession):
+    """Retrieve all available AI engines."""
+    result = await db.execute(select(AIEngine))
+    return result.scalars().all()
+
+async def create_ai_engine_async(db: AsyncSession, ai_engine_data: AIEngineCreate):
+    """Create a new AI engine."""
+    try:
+        PricingModelSchema.parse_obj(ai_engine_data.pricing_model)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid pricing model: {e}",
+        )
+
+    ai_engine = await insert_returning_async(db, AIEngine, ai_engine_data.dict())
+    invalidate_catalog(db, "ai_engines")
+    await db.commit()
+    return ai_engine
+
+async def get_ai_presets_async(db: AsyncSession):
+    """Retrieve all available AI presets."""
+    result = await db.execute(select(AIPreset))
+    return result.scalars().all()
+
+async def create_ai_preset_async(db: AsyncSession, ai_preset_data: AIPresetCreate):
+    """Create a new AI preset."""
+    ai_preset = await insert_returning_async(db, AIPreset, ai_preset_data.dict())
+    invalidate_catalog(db, "ai_presets")
+    await db.commit()
+    return ai_preset
+
+async def _get_user_ai_settings_row(db: AsyncSession, user_id: int):
+    result = await db.execute(select(UserAISettings).where(UserAISettings.user_id == user_id))
+    user_ai_settings = result.scalars().first()
+    if not user_ai_settings:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"AI settings for user with ID {user_id} not found."
+        )
+    return user_ai_settings
+
+async def get_user_ai_settings_async(db: AsyncSession, user_id: int):
+    """Retrieve AI settings for a specific user."""
+    return await _get_user_ai_settings_row(db, user_id)
+
+async def create_user_ai_settings_async(db: AsyncSession, user_id: int, settings_data: UserAISettingsCreate):
+    """Create AI settings for a user."""
+    result = await db.execute(select(User.id).where(User.id == user_id))
+    if not result.first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with ID {user_id} not found."
+        )
+    await require_premium_access_async(db, user_id, "ai_presets", [settings_data.ai_preset_id])
+    user_ai_settings = await insert_returning_async(db, UserAISettings, {"user_id": user_id, **settings_data.dict()})
+    await db.commit()
+    return user_ai_settings
+
+async def update_user_ai_settings_async(db: AsyncSession, user_id: int, settings_data: UserAISettingsUpdate):
+    """Update AI settings for a user."""
+    if settings_data.ai_preset_id is not None:
+        await require_premium_access_async(db, user_id, "ai_presets", [settings_data.ai_preset_id])
+    user_ai_settings = await update_returning_async(
+        db, UserAISettings, [UserAISettings.user_id == user_id], settings_data.dict(exclude_unset=True)
+    )
+    if not user_ai_settings:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"AI settings for user with ID {user_id} not found."
+        )
+    await db.commit()
+    return user_ai_settings
+
+async def delete_user_ai_settings_async(db: AsyncSession, user_id: int):
+    """Delete AI settings for a user."""
+    user_ai_settings = await _get_user_ai_settings_row(db, user_id)
+    await db.delete(user_ai_settings)
+    await db.commit()
+    return {"message": "AI settings deleted successfully."}
@@ -0,0 +1,233 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app.db.session import SessionLocal, engine, read_router
+from app.db.writes import upsert_insert
+from app.models.catalog import CatalogVersion
+from app.utils.etag import make_etag
+from app.settings import (
+    CATALOG_CACHE_ENABLED,
+    CATALOG_CACHE_TTL_SECONDS,
+    CATALOG_CACHE_MAX_ENTRIES,
+    CATALOG_VERSION_POLL_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str]  # (catalogo, chiave)
+
+
+class CatalogBody(NamedTuple):
+    """Body JSON serializzato e relativo ETag, calcolato una sola volta al caricamento."""
+    body: bytes
+    etag: str
+
+
+def catalog_read_key(name: str) -> str:
+    """Chiave del ReplicaRouter per le letture di un catalogo."""
+    return f"catalog:{name}"
+
+
+class CatalogCache:
+    """
+    Cache in memoria dei cataloghi (preset, motori, stati emozionali, stanze)
+    con limite LRU e TTL. Conserva i body JSON già serializzati, così le
+    richieste servite dalla cache non toccano né il database né Pydantic.
+
+    Ogni catalogo ha una versione locale: una voce caricata prima di
+    un'invalidazione non viene più servita né salvata. Le scritture di altri
+    worker arrivano tramite la tabella catalog_versions, letta in background
+    anche con la cache disattivata: le versioni servono pure agli altri
+    consumatori dei cataloghi (motori e preset del gateway AI).
+    """
+
+    def __init__(self, ttl_seconds: int = 300, max_entries: int = 256, poll_seconds: float = 2.0, enabled: bool = True):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.poll_seconds = poll_seconds
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, Tuple[int, float, CatalogBody]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._db_versions: Optional[Dict[str, int]] = None
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, name: str, key: str, loader: Callable[[], bytes]) -> CatalogBody:
+        """
+        Restituisce body ed ETag di (name, key), caricandoli con `loader` se assenti o scaduti.
+        Le eccezioni del loader (es. 404) non vengono messe in cache.
+        """
+        if not self.enabled:
+            body = loader()
+            return CatalogBody(body, make_etag(body))
+        now = time.monotonic()
+        with self._lock:
+            version = self._versions.get(name, 0)
+            entry = self._entries.get((name, key))
+            if entry and entry[0] == version and entry[1] > now:
+                self._entries.move_to_end((name, key))
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        loaded = loader()
+        body = CatalogBody(loaded, make_etag(loaded))
+        with self._lock:
+            # Invalidato durante il caricamento: il body potrebbe essere già vecchio
+            if self._versions.get(name, 0) == version:
+                self._entries[(name, key)] = (version, now + self.ttl, body)
+                self._entries.move_to_end((name, key))
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return body
+
+    def version(self, name: str) -> int:
+        """Versione locale di un catalogo, incrementata a ogni invalidazione."""
+        with self._lock:
+            return self._versions.get(name, 0)
+
+    def invalidate(self, name: str):
+        """
+        Scarta le voci di un catalogo in questo worker. Per qualche secondo il
+        catalogo viene riletto dal primario, così una replica in ritardo non
+        rimette in cache i dati precedenti alla scrittura.
+        """
+        read_router.stick_to_primary(catalog_read_key(name))
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            for cache_key in [k for k in self._entries if k[0] == name]:
+                del self._entries[cache_key]
+            self.invalidations += 1
+
+    def poll_versions(self):
+        """Invalida i cataloghi la cui versione in catalog_versions è cambiata."""
+        with engine.connect() as connection:
+            versions = dict(connection.execute(select(CatalogVersion.name, CatalogVersion.version)).all())
+        previous, self._db_versions = self._db_versions, versions
+        if previous is None:
+            return
+        for name, version in versions.items():
+            if previous.get(name) != version:
+                self.invalidate(name)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.poll_versions()
+            except Exception:
+                logger.exception("Lettura di catalog_versions fallita")
+            self._stopping.wait(self.poll_seconds)
+
+    def start(self):
+        """Avvia il controllo periodico delle versioni scritte dagli altri worker."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="catalog-versions", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "versions": dict(self._versions),
+            }
+
+
+# Cache condivisa dal worker
+catalog_cache = CatalogCache(
+    ttl_seconds=CATALOG_CACHE_TTL_SECONDS,
+    max_entries=CATALOG_CACHE_MAX_ENTRIES,
+    poll_seconds=CATALOG_VERSION_POLL_SECONDS,
+    enabled=CATALOG_CACHE_ENABLED,
+)
+
+
+def invalidate_catalog(db, *names: str):
+    """
+    Segna i cataloghi modificati dalla transazione corrente (Session o AsyncSession).
+    Al commit la versione in catalog_versions viene incrementata nella stessa
+    transazione e la cache locale viene svuotata; un rollback annulla tutto.
+    """
+    session = getattr(db, "sync_session", db)
+    if not session.in_transaction():
+        # Senza transazione aperta un rollback non emetterebbe after_rollback
+        session.begin()
+    session.info.setdefault("invalidated_catalogs", set()).update(names)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_catalog_versions(session):
+    names = session.info.get("invalidated_catalogs")
+    if not names:
+        return
+    table = CatalogVersion.__table__
+    insert = upsert_insert(session, table).values([
+        {"name": name, "version": 1, "updated_at": datetime.utcnow()} for name in sorted(names)
+    ])
+    session.execute(insert.on_conflict_do_update(
+        index_elements=[table.c.name],
+        set_={"version": table.c.version + 1, "updated_at": insert.excluded.updated_at},
+    ))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_local_catalogs(session):
+    for name in session.info.pop("invalidated_catalogs", ()):
+        catalog_cache.invalidate(name)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_catalog_invalidations(session):
+    session.info.pop("invalidated_catalogs", None)
+
+
+def serialize_catalog(rows, exclude: Iterable[str] = ()) -> bytes:
+    """
+    Serializza una riga o una lista di righe in JSON. Le righe ORM vengono lette
+    colonna per colonna, i modelli Pydantic così come sono.
+    """
+    exclude = set(exclude)
+
+    def as_dict(row):
+        if isinstance(row, BaseModel):
+            return row
+        return {column.name: getattr(row, column.key) for column in row.__table__.columns if column.name not in exclude}
+
+    data = [as_dict(row) for row in rows] if isinstance(rows, list) else as_dict(rows)
+    return json.dumps(jsonable_encoder(data), separators=(",", ":")).encode()
+
+
+def load_catalog(name: str, query: Callable[[Session], object], exclude: Iterable[str] = ()) -> bytes:
+    """
+    Esegue `query` su una replica in lettura e serializza il risultato.
+    Usata solo in caso di miss: le hit non aprono connessioni.
+    """
+    connection = read_router.connect(catalog_read_key(name))
+    db = SessionLocal(bind=connection)
+    try:
+        return serialize_catalog(query(db), exclude)
+    finally:
+        db.close()
+        connection.close()
@@ -0,0 +1,99 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+from sqlalchemy import func
+from app.db.session import SessionLocal
+from app.db.writes import upsert_insert
+from app.models.room import RoomCheckin
+from app.services.write_behind import WriteBehindBuffer
+from app.settings import CHECKIN_FLUSH_INTERVAL_MS, CHECKIN_FLUSH_MAX_ENTRIES, CHECKIN_SPILL_PATH
+
+CheckinKey = Tuple[int, int]  # (user_id, room_id)
+
+
+@dataclass(frozen=True)
+class PendingCheckin:
+    count: int
+    last_checkin: datetime
+    is_random: bool
+
+
+class CheckinBuffer(WriteBehindBuffer[CheckinKey, PendingCheckin]):
+    """
+    Buffer write-behind per i check-in: gli incrementi per (user_id, room_id)
+    vengono accumulati in memoria e scritti su rooms_checkin con un unico
+    upsert multi-riga ogni `flush_interval_ms` o al raggiungimento di
+    `max_entries` chiavi.
+    """
+
+    thread_name = "checkin-buffer"
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        flush_interval_ms: int = 500,
+        max_entries: int = 1000,
+        spill_path: str = "checkin_spill.jsonl",
+    ):
+        super().__init__(session_factory, flush_interval_ms, max_entries, spill_path)
+
+    def add(self, user_id: int, room_id: int, is_random: bool) -> datetime:
+        """
+        Accoda un check-in; risveglia il writer se il buffer è pieno.
+        :return: L'istante registrato per il check-in.
+        """
+        now = datetime.utcnow()
+        self._put((user_id, room_id), PendingCheckin(1, now, is_random))
+        return now
+
+    def pending_for(self, user_id: int, room_id: int) -> Optional[PendingCheckin]:
+        """Incrementi non ancora persistiti per (user_id, room_id)."""
+        return self.pending((user_id, room_id))
+
+    def merge(self, current: PendingCheckin, value: PendingCheckin) -> PendingCheckin:
+        return PendingCheckin(
+            count=current.count + value.count,
+            last_checkin=max(current.last_checkin, value.last_checkin),
+            is_random=current.is_random,
+        )
+
+    def write(self, db, batch: Dict[CheckinKey, PendingCheckin]):
+        """Un solo upsert multi-riga che somma gli incrementi a checkin_count."""
+        table = RoomCheckin.__table__
+        insert = upsert_insert(db, table).values([
+            {
+                "user_id": user_id,
+                "room_id": room_id,
+                "checkin_count": entry.count,
+                "last_checkin": entry.last_checkin,
+                "is_random": entry.is_random,
+            }
+            for (user_id, room_id), entry in batch.items()
+        ])
+        db.execute(insert.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.room_id],
+            set_={
+                "checkin_count": func.coalesce(table.c.checkin_count, 0) + insert.excluded.checkin_count,
+                "last_checkin": insert.excluded.last_checkin,
+                "updated_at": func.now(),
+            },
+        ))
+
+    def dump(self, key: CheckinKey, value: PendingCheckin) -> dict:
+        user_id, room_id = key
+        return {
+            "user_id": user_id,
+            "room_id": room_id,
+            "count": value.count,
+            "last_checkin": value.last_checkin.isoformat(),
+            "is_random": value.is_random,
+        }
+
+    def load(self, row: dict) -> Tuple[CheckinKey, PendingCheckin]:
+        return (row["user_id"], row["room_id"]), PendingCheckin(
+            row["count"], datetime.fromisoformat(row["last_checkin"]), row["is_random"]
+        )
+
+
+# Buffer condiviso dal worker (attivo solo con CHECKIN_WRITE_BEHIND=true)
+checkin_buffer = CheckinBuffer(SessionLocal, CHECKIN_FLUSH_INTERVAL_MS, CHECKIN_FLUSH_MAX_ENTRIES, CHECKIN_SPILL_PATH)
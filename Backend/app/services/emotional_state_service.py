@@ -1,12 +1,20 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from app.models.emotional_state import EmotionalState
+from app.db.writes import insert_returning, insert_returning_async, update_returning, update_returning_async
+from app.models.emotional_state import EmotionalState, EmotionalStateCheckin
+from app.models.user import User
+from app.schemas.bulk_schema import BulkItemResult, BulkResponse
 from app.schemas.emotional_state_schema import (
     EmotionalStateCreate,
     EmotionalStateUpdate,
-    EmotionalStateResponse
+    EmotionalStateResponse,
+    EmotionalStateCheckinCreate
 )
 from app.schemas.ai_match_schema import AIMatchMapSchema
+from app.services.catalog_cache import CatalogBody, catalog_cache, invalidate_catalog, load_catalog
+from app.utils.validators import bulk_response, validate_bulk_items
 
 def create_emotional_state(db: Session, emotional_state_data: EmotionalStateCreate) -> EmotionalStateResponse:
     """
@@ -17,16 +25,9 @@ def create_emotional_state(db: Session, emotional_state_data: EmotionalStateCrea
         if emotional_state_data.ai_match:
             AIMatchMapSchema.parse_obj(emotional_state_data.ai_match)
 
-        new_emotional_state = EmotionalState(
-            name=emotional_state_data.name,
-            description=emotional_state_data.description,
-            color_code=emotional_state_data.color_code,
-            intensity_levels=emotional_state_data.intensity_levels,
-            ai_match=emotional_state_data.ai_match
-        )
-        db.add(new_emotional_state)
+        new_emotional_state = insert_returning(db, EmotionalState, emotional_state_data.dict())
+        invalidate_catalog(db, "emotional_states")
         db.commit()
-        db.refresh(new_emotional_state)
         return EmotionalStateResponse.from_orm(new_emotional_state)
 
     except ValueError as ve:
@@ -42,20 +43,19 @@ def update_emotional_state(db: Session, state_id: int, update_data: EmotionalSta
     Aggiorna uno stato emozionale esistente e valida il campo ai_match.
     """
     try:
-        emotional_state = db.query(EmotionalState).filter(EmotionalState.id == state_id).first()
-        if not emotional_state:
-            raise ValueError(f"Stato emozionale con ID {state_id} non trovato.")
-
         # Validazione di ai_match tramite Pydantic
         if update_data.ai_match:
             AIMatchMapSchema.parse_obj(update_data.ai_match)
 
-        # Aggiornamento dei campi
-        for field, value in update_data.dict(exclude_unset=True).items():
-            setattr(emotional_state, field, value)
+        # Aggiornamento dei campi con UPDATE ... RETURNING
+        emotional_state = update_returning(
+            db, EmotionalState, [EmotionalState.id == state_id], update_data.dict(exclude_unset=True)
+        )
+        if not emotional_state:
+            raise ValueError(f"Stato emozionale con ID {state_id} non trovato.")
 
+        invalidate_catalog(db, "emotional_states")
         db.commit()
-        db.refresh(emotional_state)
         return EmotionalStateResponse.from_orm(emotional_state)
 
     except ValueError as ve:
@@ -76,6 +76,7 @@ def delete_emotional_state(db: Session, state_id: int) -> bool:
             raise ValueError(f"Stato emozionale con ID {state_id} non trovato.")
 
         db.delete(emotional_state)
+        invalidate_catalog(db, "emotional_states")
         db.commit()
         return True
 
@@ -98,3 +99,142 @@ def list_emotional_states(db: Session) -> list[EmotionalStateResponse]:
     """
     emotional_states = db.query(EmotionalState).all()
     return [EmotionalStateResponse.from_orm(state) for state in emotional_states]
+
+def list_emotional_states_json() -> CatalogBody:
+    """
+    Elenco degli stati emozionali già serializzato, con il relativo ETag, servito dalla cache dei cataloghi.
+    """
+    return catalog_cache.get(
+        "emotional_states", "all", lambda: load_catalog("emotional_states", list_emotional_states)
+    )
+
+def get_emotional_state_json(state_id: int) -> CatalogBody:
+    """
+    Stato emozionale per ID già serializzato. Un ID inesistente solleva ValueError e non viene messo in cache.
+    """
+    return catalog_cache.get(
+        "emotional_states",
+        f"id:{state_id}",
+        lambda: load_catalog("emotional_states", lambda db: get_emotional_state_by_id(db, state_id)),
+    )
+
+
+def create_emotional_checkins_bulk(db: Session, user_id: int, items: list[dict]) -> BulkResponse:
+    """
+    Registra in blocco i check-in emozionali di un utente (es. sincronizzati dall'app offline).
+    Gli elementi validi vengono scritti con un unico INSERT multi-riga in una sola transazione;
+    quelli non validi o con stato emozionale inesistente vengono scartati singolarmente.
+    """
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise ValueError(f"Utente con ID {user_id} non trovato.")
+
+    valid, results = validate_bulk_items(EmotionalStateCheckinCreate, items)
+    state_ids = {checkin.emotional_state_id for _, checkin in valid}
+    known_ids = {
+        state_id for (state_id,) in
+        db.query(EmotionalState.id).filter(EmotionalState.id.in_(state_ids))
+    } if state_ids else set()
+
+    pending = []
+    for index, checkin in valid:
+        if checkin.emotional_state_id not in known_ids:
+            results.append(BulkItemResult(
+                index=index, status="error",
+                error=f"Stato emozionale con ID {checkin.emotional_state_id} non trovato."
+            ))
+        else:
+            pending.append((index, EmotionalStateCheckin(user_id=user_id, **checkin.dict())))
+
+    try:
+        # Il flush raggruppa le righe in un INSERT multi-riga (con RETURNING degli ID su Postgres)
+        db.add_all([checkin for _, checkin in pending])
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise RuntimeError(f"Errore durante la registrazione dei check-in emozionali: {e}")
+
+    results.extend(BulkItemResult(index=index, status="created", id=checkin.id) for index, checkin in pending)
+    return bulk_response(results)
+
+# Varianti asincrone (AsyncSession)
+
+async def create_emotional_state_async(db: AsyncSession, emotional_state_data: EmotionalStateCreate) -> EmotionalStateResponse:
+    """
+    Variante asincrona di create_emotional_state.
+    """
+    try:
+        if emotional_state_data.ai_match:
+            AIMatchMapSchema.parse_obj(emotional_state_data.ai_match)
+
+        new_emotional_state = await insert_returning_async(db, EmotionalState, emotional_state_data.dict())
+        invalidate_catalog(db, "emotional_states")
+        await db.commit()
+        return EmotionalStateResponse.from_orm(new_emotional_state)
+
+    except ValueError as ve:
+        await db.rollback()
+        raise ValueError(f"Errore di validazione: {ve}")
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise RuntimeError(f"Errore durante la creazione dello stato emozionale: {e}")
+
+async def update_emotional_state_async(db: AsyncSession, state_id: int, update_data: EmotionalStateUpdate) -> EmotionalStateResponse:
+    """
+    Variante asincrona di update_emotional_state.
+    """
+    try:
+        if update_data.ai_match:
+            AIMatchMapSchema.parse_obj(update_data.ai_match)
+
+        emotional_state = await update_returning_async(
+            db, EmotionalState, [EmotionalState.id == state_id], update_data.dict(exclude_unset=True)
+        )
+        if not emotional_state:
+            raise ValueError(f"Stato emozionale con ID {state_id} non trovato.")
+
+        invalidate_catalog(db, "emotional_states")
+        await db.commit()
+        return EmotionalStateResponse.from_orm(emotional_state)
+
+    except ValueError as ve:
+        await db.rollback()
+        raise ValueError(f"Errore di validazione: {ve}")
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise RuntimeError(f"Errore durante l'aggiornamento dello stato emozionale: {e}")
+
+async def delete_emotional_state_async(db: AsyncSession, state_id: int) -> bool:
+    """
+    Variante asincrona di delete_emotional_state.
+    """
+    try:
+        emotional_state = await db.get(EmotionalState, state_id)
+        if not emotional_state:
+            raise ValueError(f"Stato emozionale con ID {state_id} non trovato.")
+
+        await db.delete(emotional_state)
+        invalidate_catalog(db, "emotional_states")
+        await db.commit()
+        return True
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise RuntimeError(f"Errore durante l'eliminazione dello stato emozionale: {e}")
+
+async def get_emotional_state_by_id_async(db: AsyncSession, state_id: int) -> EmotionalStateResponse:
+    """
+    Variante asincrona di get_emotional_state_by_id.
+    """
+    emotional_state = await db.get(EmotionalState, state_id)
+    if not emotional_state:
+        raise ValueError(f"Stato emozionale con ID {state_id} non trovato.")
+    return EmotionalStateResponse.from_orm(emotional_state)
+
+async def list_emotional_states_async(db: AsyncSession) -> list[EmotionalStateResponse]:
+    """
+    Variante asincrona di list_emotional_states.
+    """
+    result = await db.execute(select(EmotionalState))
+    return [EmotionalStateResponse.from_orm(state) for state in result.scalars().all()]
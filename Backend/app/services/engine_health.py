@@ -0,0 +1,232 @@
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Optional
+from sqlalchemy import bindparam, update
+from app.db.session import SessionLocal
+from app.models.ai import AIEngine
+from app.settings import (
+    AI_ENGINE_EWMA_ALPHA,
+    AI_ENGINE_BREAKER_FAILURES,
+    AI_ENGINE_BREAKER_ERROR_RATE,
+    AI_ENGINE_BREAKER_COOLDOWN_SECONDS,
+    AI_ENGINE_LATENCY_WRITEBACK_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Campioni recenti su cui si calcola il p95 di ogni motore
+LATENCY_WINDOW = 256
+# Campioni minimi prima che il tasso di errore possa aprire il circuito
+MIN_SAMPLES_FOR_ERROR_RATE = 20
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+@dataclass
+class EngineHealth:
+    """Latenza ed errori osservati su un motore, più lo stato del suo circuit breaker."""
+    ewma_ms: Optional[float] = None
+    error_rate: float = 0.0
+    samples: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+    p95_cache: Optional[float] = None
+    calls: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    state: str = CLOSED
+    opened_at: float = 0.0
+    probe_started_at: float = 0.0
+    trips: int = 0
+
+    def p95_ms(self) -> Optional[float]:
+        if self.p95_cache is None and self.samples:
+            ordered = sorted(self.samples)
+            self.p95_cache = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return self.p95_cache
+
+
+class EngineHealthRegistry:
+    """
+    Latenza dal vivo dei motori AI (EWMA e p95 sugli ultimi campioni) e
+    circuit breaker per motore. Il circuito si apre dopo `breaker_failures`
+    errori consecutivi o con un tasso di errore (EWMA) oltre
+    `breaker_error_rate`; dopo `cooldown_seconds` lascia passare una sola
+    chiamata di prova, che lo richiude se va a buon fine.
+
+    Le latenze vengono riscritte periodicamente in AIEngine.latency_ms.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        alpha: float = 0.2,
+        breaker_failures: int = 5,
+        breaker_error_rate: float = 0.5,
+        cooldown_seconds: float = 30.0,
+        writeback_seconds: float = 60.0,
+    ):
+        self.session_factory = session_factory
+        self.alpha = alpha
+        self.breaker_failures = breaker_failures
+        self.breaker_error_rate = breaker_error_rate
+        self.cooldown = cooldown_seconds
+        self.writeback_seconds = writeback_seconds
+        self._lock = threading.Lock()
+        self._engines: Dict[int, EngineHealth] = {}
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.writebacks = 0
+
+    def _health(self, engine_id: int) -> EngineHealth:
+        health = self._engines.get(engine_id)
+        if health is None:
+            health = self._engines[engine_id] = EngineHealth()
+        return health
+
+    def record(self, engine_id: int, latency_ms: float, ok: bool):
+        """Registra l'esito di una richiesta HTTP a un motore."""
+        with self._lock:
+            health = self._health(engine_id)
+            health.calls += 1
+            health.error_rate += self.alpha * ((0.0 if ok else 1.0) - health.error_rate)
+            if ok:
+                # Solo le risposte riuscite: un errore veloce non rende un motore "rapido"
+                health.ewma_ms = latency_ms if health.ewma_ms is None else (
+                    health.ewma_ms + self.alpha * (latency_ms - health.ewma_ms)
+                )
+                health.samples.append(latency_ms)
+                health.p95_cache = None
+                health.consecutive_failures = 0
+                if health.state != CLOSED:
+                    logger.info("Circuito del motore %s richiuso", engine_id)
+                    health.state = CLOSED
+                return
+
+            health.failures += 1
+            health.consecutive_failures += 1
+            tripped = health.consecutive_failures >= self.breaker_failures or (
+                health.calls >= MIN_SAMPLES_FOR_ERROR_RATE and health.error_rate >= self.breaker_error_rate
+            )
+            if health.state == HALF_OPEN or (health.state == CLOSED and tripped):
+                logger.warning("Circuito del motore %s aperto (errori consecutivi: %d, tasso errori: %.2f)",
+                               engine_id, health.consecutive_failures, health.error_rate)
+                health.state = OPEN
+                health.opened_at = time.monotonic()
+                health.trips += 1
+
+    def is_available(self, engine_id: int) -> bool:
+        """True se il motore accetta chiamate ora (senza riservare la chiamata di prova)."""
+        with self._lock:
+            health = self._engines.get(engine_id)
+            if health is None or health.state == CLOSED:
+                return True
+            return time.monotonic() - max(health.opened_at, health.probe_started_at) >= self.cooldown
+
+    def allow(self, engine_id: int) -> bool:
+        """
+        True se una chiamata al motore può partire. Con il circuito semiaperto
+        passa una sola chiamata di prova per periodo di cooldown.
+        """
+        with self._lock:
+            health = self._engines.get(engine_id)
+            if health is None or health.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if now - max(health.opened_at, health.probe_started_at) < self.cooldown:
+                return False
+            health.state = HALF_OPEN
+            health.probe_started_at = now
+            return True
+
+    def is_open(self, engine_id: int) -> bool:
+        with self._lock:
+            health = self._engines.get(engine_id)
+            return health is not None and health.state == OPEN
+
+    def score(self, engine_id: int) -> Optional[float]:
+        """
+        Latenza attesa per l'ordinamento dei motori: 0.7 * EWMA + 0.3 * p95,
+        penalizzata dal tasso di errore. None se il motore non ha ancora campioni.
+        """
+        with self._lock:
+            health = self._engines.get(engine_id)
+            if health is None or health.ewma_ms is None:
+                return None
+            p95 = health.p95_ms() or health.ewma_ms
+            return (0.7 * health.ewma_ms + 0.3 * p95) * (1 + 4 * health.error_rate)
+
+    def write_back(self) -> int:
+        """Riscrive l'EWMA di ogni motore osservato in AIEngine.latency_ms."""
+        with self._lock:
+            rows = [
+                {"b_id": engine_id, "b_latency_ms": round(health.ewma_ms)}
+                for engine_id, health in self._engines.items() if health.ewma_ms is not None
+            ]
+        if not rows:
+            return 0
+        table = AIEngine.__table__
+        db = self.session_factory()
+        try:
+            db.execute(
+                update(table).where(table.c.id == bindparam("b_id")).values(latency_ms=bindparam("b_latency_ms")),
+                rows,
+            )
+            db.commit()
+        finally:
+            db.close()
+        self.writebacks += 1
+        return len(rows)
+
+    def _run(self):
+        while not self._stopping.wait(self.writeback_seconds):
+            try:
+                self.write_back()
+            except Exception:
+                logger.exception("Scrittura di latency_ms fallita")
+
+    def start(self):
+        """Avvia la scrittura periodica delle latenze."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="engine-latency", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.write_back()
+        except Exception:
+            logger.exception("Scrittura di latency_ms fallita")
+
+    def stats(self) -> dict:
+        with self._lock:
+            engines = {
+                engine_id: {
+                    "state": health.state,
+                    "ewma_ms": round(health.ewma_ms, 1) if health.ewma_ms is not None else None,
+                    "p95_ms": health.p95_ms(),
+                    "error_rate": round(health.error_rate, 3),
+                    "calls": health.calls,
+                    "failures": health.failures,
+                    "trips": health.trips,
+                }
+                for engine_id, health in self._engines.items()
+            }
+        return {"engines": engines, "writebacks": self.writebacks}
+
+
+# Registro condiviso dal worker
+engine_health = EngineHealthRegistry(
+    SessionLocal,
+    alpha=AI_ENGINE_EWMA_ALPHA,
+    breaker_failures=AI_ENGINE_BREAKER_FAILURES,
+    breaker_error_rate=AI_ENGINE_BREAKER_ERROR_RATE,
+    cooldown_seconds=AI_ENGINE_BREAKER_COOLDOWN_SECONDS,
+    writeback_seconds=AI_ENGINE_LATENCY_WRITEBACK_SECONDS,
+)
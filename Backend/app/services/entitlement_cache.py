@@ -0,0 +1,374 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import event, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.db.session import SessionLocal, engine
+from app.models.ai import AIPreset
+from app.models.room import Room
+from app.models.subscription import Subscription
+from app.services.catalog_cache import catalog_cache
+from app.settings import (
+    ENTITLEMENT_CACHE_ENABLED,
+    ENTITLEMENT_CACHE_TTL_SECONDS,
+    ENTITLEMENT_CACHE_MAX_ENTRIES,
+    ENTITLEMENT_SYNC_POLL_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Tier che danno accesso ai contenuti premium e priorità tra sottoscrizioni sovrapposte
+PREMIUM_TIERS = frozenset({"premium"})
+TIER_RANK = {"free": 0, "trial": 1, "premium": 2}
+
+# Cataloghi con contenuti premium (colonna is_premium)
+PREMIUM_CATALOGS = {"rooms": Room, "ai_presets": AIPreset}
+
+
+class Entitlement(NamedTuple):
+    """Tier attivo di un utente e istante esatto in cui scade (None: senza scadenza)."""
+    tier: str
+    expires_at: Optional[datetime]
+    subscription_id: Optional[int]
+
+    @property
+    def is_premium(self) -> bool:
+        return self.tier in PREMIUM_TIERS
+
+
+FREE_ENTITLEMENT = Entitlement("free", None, None)
+
+
+def compute_entitlement(subscriptions, now: datetime) -> Tuple[Entitlement, Optional[datetime]]:
+    """
+    Sceglie il tier migliore tra le sottoscrizioni attive valide in `now`.
+    :param subscriptions: Righe con id, subscription_type, start_date ed end_date.
+    :return: L'entitlement e l'istante fino al quale resta valido: la scadenza
+             del tier scelto o l'inizio di una sottoscrizione futura, se precedente.
+    """
+    current = [
+        sub for sub in subscriptions
+        if sub.start_date <= now and (sub.end_date is None or sub.end_date > now)
+    ]
+    best = max(
+        current,
+        key=lambda sub: (TIER_RANK.get(sub.subscription_type, 0), sub.end_date or datetime.max),
+        default=None,
+    )
+    entitlement = Entitlement(best.subscription_type, best.end_date, best.id) if best else FREE_ENTITLEMENT
+
+    changes = [sub.start_date for sub in subscriptions if sub.start_date > now]
+    if entitlement.expires_at:
+        changes.append(entitlement.expires_at)
+    return entitlement, min(changes, default=None)
+
+
+class EntitlementCache:
+    """
+    Cache in memoria degli entitlement per utente, con limite LRU e TTL.
+    Ogni voce resta valida solo fino all'istante in cui il tier cambia
+    (end_date o start_date di una sottoscrizione futura): alla scadenza
+    la voce viene ricalcolata, senza attendere il TTL.
+
+    L'invalidazione è per utente: una scrittura sulle sottoscrizioni scarta
+    solo la voce del proprietario, in questo worker al commit e negli altri
+    tramite il controllo periodico di subscriptions.updated_at, attivo anche
+    con la cache dei cataloghi disattivata.
+    Conserva anche gli ID premium di stanze e preset, legati alla versione del
+    rispettivo catalogo.
+    """
+
+    # Finestra di subscriptions.updated_at riletta a ogni controllo: copre i commit
+    # arrivati in ritardo rispetto al timestamp della riga
+    CHANGE_WINDOW_SECONDS = 300
+    # Oltre questa soglia le invalidazioni più vecchie della finestra vengono ripulite
+    MAX_INVALIDATIONS = 10000
+
+    def __init__(self, ttl_seconds: int = 300, max_entries: int = 50000, poll_seconds: float = 2.0, enabled: bool = True):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.poll_seconds = poll_seconds
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # user_id -> (scadenza monotonic, valida fino a (UTC), entitlement)
+        self._entries: "OrderedDict[int, Tuple[float, Optional[datetime], Entitlement]]" = OrderedDict()
+        # Contatore delle invalidazioni e ultima invalidazione per utente (numero, istante monotonic)
+        self._sequence = 0
+        self._invalidated: Dict[int, Tuple[int, float]] = {}
+        # Ultimo updated_at visto per utente dal controllo periodico
+        self._seen_changes: Dict[int, datetime] = {}
+        # catalogo -> (versione, scadenza monotonic, ID premium)
+        self._premium_ids: Dict[str, Tuple[int, float, FrozenSet[int]]] = {}
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.polls = 0
+
+    def lookup(self, user_id: int, now: datetime) -> Tuple[Optional[Entitlement], int]:
+        """
+        :return: L'entitlement in cache (None se assente o scaduto) e il numero
+                 di sequenza da passare a store per memorizzare quello ricalcolato.
+        """
+        with self._lock:
+            sequence = self._sequence
+            if not self.enabled:
+                return None, sequence
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > time.monotonic() and (entry[1] is None or now < entry[1]):
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[2], sequence
+            self.misses += 1
+        return None, sequence
+
+    def store(self, user_id: int, sequence: int, entitlement: Entitlement, valid_until: Optional[datetime]):
+        if not self.enabled:
+            return
+        with self._lock:
+            # Sottoscrizioni dell'utente modificate durante il caricamento: il risultato potrebbe essere già vecchio
+            invalidated = self._invalidated.get(user_id)
+            if invalidated and invalidated[0] > sequence:
+                return
+            self._entries[user_id] = (time.monotonic() + self.ttl, valid_until, entitlement)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        """Scarta l'entitlement in cache di un utente e i caricamenti in corso."""
+        now = time.monotonic()
+        with self._lock:
+            self._sequence += 1
+            if len(self._invalidated) > self.MAX_INVALIDATIONS:
+                # Nessun caricamento dura quanto la finestra: le invalidazioni vecchie non servono più
+                horizon = now - self.CHANGE_WINDOW_SECONDS
+                self._invalidated = {k: v for k, v in self._invalidated.items() if v[1] > horizon}
+            self._invalidated[user_id] = (self._sequence, now)
+            self._entries.pop(user_id, None)
+            self.invalidations += 1
+
+    def poll_changes(self):
+        """Invalida gli utenti le cui sottoscrizioni sono cambiate in altri worker."""
+        since = datetime.utcnow() - timedelta(seconds=self.CHANGE_WINDOW_SECONDS)
+        with engine.connect() as connection:
+            changes = dict(connection.execute(
+                select(Subscription.user_id, func.max(Subscription.updated_at))
+                .where(Subscription.updated_at > since)
+                .group_by(Subscription.user_id)
+            ).all())
+        seen, self._seen_changes = self._seen_changes, changes
+        for user_id, changed_at in changes.items():
+            if seen.get(user_id) != changed_at:
+                self.invalidate_user(user_id)
+        self.polls += 1
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.poll_changes()
+            except Exception:
+                logger.exception("Lettura delle sottoscrizioni modificate fallita")
+            self._stopping.wait(self.poll_seconds)
+
+    def start(self):
+        """Avvia il controllo periodico delle sottoscrizioni scritte dagli altri worker."""
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="entitlement-changes", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def premium_ids(self, catalog: str) -> Tuple[Optional[FrozenSet[int]], int]:
+        """
+        :return: Gli ID premium del catalogo (None se da ricaricare) e la versione del catalogo.
+                 Oltre alla versione vale il TTL degli entitlement: una modifica fatta
+                 in un altro worker arriva al più tardi alla scadenza.
+        """
+        version = catalog_cache.version(catalog)
+        with self._lock:
+            entry = self._premium_ids.get(catalog)
+        if self.enabled and entry and entry[0] == version and entry[1] > time.monotonic():
+            return entry[2], version
+        return None, version
+
+    def store_premium_ids(self, catalog: str, version: int, ids: FrozenSet[int]):
+        if self.enabled and catalog_cache.version(catalog) == version:
+            with self._lock:
+                self._premium_ids[catalog] = (version, time.monotonic() + self.ttl, ids)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "polls": self.polls,
+                "premium_ids": {name: len(ids) for name, (_, _, ids) in self._premium_ids.items()},
+            }
+
+
+# Cache condivisa dal worker
+entitlement_cache = EntitlementCache(
+    ttl_seconds=ENTITLEMENT_CACHE_TTL_SECONDS,
+    max_entries=ENTITLEMENT_CACHE_MAX_ENTRIES,
+    poll_seconds=ENTITLEMENT_SYNC_POLL_SECONDS,
+    enabled=ENTITLEMENT_CACHE_ENABLED,
+)
+
+
+def invalidate_entitlements(db, *user_ids: int):
+    """
+    Segna gli utenti le cui sottoscrizioni cambiano nella transazione corrente
+    (Session o AsyncSession): al commit le loro voci vengono scartate, un
+    rollback non invalida nulla. Gli altri worker se ne accorgono da updated_at.
+    """
+    session = getattr(db, "sync_session", db)
+    if not session.in_transaction():
+        # Senza transazione aperta un rollback non emetterebbe after_rollback
+        session.begin()
+    session.info.setdefault("invalidated_entitlements", set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_local_entitlements(session):
+    for user_id in session.info.pop("invalidated_entitlements", ()):
+        entitlement_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_entitlement_invalidations(session):
+    session.info.pop("invalidated_entitlements", None)
+
+
+def _subscriptions_query(user_id: int, now: datetime):
+    # Sottoscrizioni attive non ancora scadute, comprese quelle che iniziano in futuro
+    return select(
+        Subscription.id, Subscription.subscription_type, Subscription.start_date, Subscription.end_date
+    ).where(
+        Subscription.user_id == user_id,
+        Subscription.is_active == True,
+        or_(Subscription.end_date.is_(None), Subscription.end_date > now),
+    )
+
+
+def _premium_ids_query(catalog: str):
+    model = PREMIUM_CATALOGS[catalog]
+    return select(model.id).where(model.is_premium == True)
+
+
+def _on_primary(db: Session) -> bool:
+    bind = db.get_bind()
+    return getattr(bind, "engine", bind) is engine
+
+
+def get_entitlement(db: Session, user_id: int) -> Entitlement:
+    """
+    Entitlement corrente di un utente: una lookup in memoria finché il tier non cambia.
+    In caso di miss le sottoscrizioni vengono lette sempre dal primario.
+    """
+    now = datetime.utcnow()
+    entitlement, version = entitlement_cache.lookup(user_id, now)
+    if entitlement:
+        return entitlement
+    if _on_primary(db):
+        subscriptions = db.execute(_subscriptions_query(user_id, now)).all()
+    else:
+        # Una replica in ritardo metterebbe in cache il tier precedente a un pagamento
+        with SessionLocal() as primary:
+            subscriptions = primary.execute(_subscriptions_query(user_id, now)).all()
+    entitlement, valid_until = compute_entitlement(subscriptions, now)
+    entitlement_cache.store(user_id, version, entitlement, valid_until)
+    return entitlement
+
+
+def load_entitlement(user_id: int) -> Entitlement:
+    """
+    Come get_entitlement, ma senza una sessione della richiesta: in caso di miss
+    apre una sessione breve e la chiude subito dopo la query. Da usare nelle route
+    che poi attendono chiamate lente (motori AI), per non tenere occupata una
+    connessione del pool per tutta la durata della chiamata.
+    """
+    entitlement, _ = entitlement_cache.lookup(user_id, datetime.utcnow())
+    if entitlement:
+        return entitlement
+    db = SessionLocal()
+    try:
+        return get_entitlement(db, user_id)
+    finally:
+        db.close()
+
+
+async def get_entitlement_async(db: AsyncSession, user_id: int) -> Entitlement:
+    """
+    Variante asincrona di get_entitlement.
+    """
+    now = datetime.utcnow()
+    entitlement, version = entitlement_cache.lookup(user_id, now)
+    if entitlement:
+        return entitlement
+    subscriptions = (await db.execute(_subscriptions_query(user_id, now))).all()
+    entitlement, valid_until = compute_entitlement(subscriptions, now)
+    entitlement_cache.store(user_id, version, entitlement, valid_until)
+    return entitlement
+
+
+def get_premium_ids(db: Session, catalog: str) -> FrozenSet[int]:
+    """
+    ID di stanze ("rooms") o preset ("ai_presets") riservati agli utenti premium.
+    """
+    ids, version = entitlement_cache.premium_ids(catalog)
+    if ids is None:
+        ids = frozenset(db.execute(_premium_ids_query(catalog)).scalars().all())
+        entitlement_cache.store_premium_ids(catalog, version, ids)
+    return ids
+
+
+async def get_premium_ids_async(db: AsyncSession, catalog: str) -> FrozenSet[int]:
+    """
+    Variante asincrona di get_premium_ids.
+    """
+    ids, version = entitlement_cache.premium_ids(catalog)
+    if ids is None:
+        ids = frozenset((await db.execute(_premium_ids_query(catalog))).scalars().all())
+        entitlement_cache.store_premium_ids(catalog, version, ids)
+    return ids
+
+
+def _premium_required(catalog: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=f"An active premium subscription is required for this item ({catalog}).",
+    )
+
+
+def require_premium_access(db: Session, user_id: int, catalog: str, item_ids: List[int]):
+    """
+    Verifica che l'utente possa usare gli elementi indicati del catalogo.
+    :raises HTTPException: 403 se almeno un elemento è premium e l'utente non lo è.
+    """
+    premium_ids = get_premium_ids(db, catalog)
+    if any(item_id in premium_ids for item_id in item_ids) and not get_entitlement(db, user_id).is_premium:
+        raise _premium_required(catalog)
+
+
+async def require_premium_access_async(db: AsyncSession, user_id: int, catalog: str, item_ids: List[int]):
+    """
+    Variante asincrona di require_premium_access.
+    """
+    premium_ids = await get_premium_ids_async(db, catalog)
+    if any(item_id in premium_ids for item_id in item_ids) and not (await get_entitlement_async(db, user_id)).is_premium:
+        raise _premium_required(catalog)
@@ -0,0 +1,64 @@
+from datetime import datetime
+from typing import Callable, Dict, Tuple
+from sqlalchemy import bindparam, or_, update
+from app.db.session import SessionLocal
+from app.models.user import User
+from app.services.write_behind import WriteBehindBuffer
+from app.settings import LAST_LOGIN_FLUSH_INTERVAL_MS, LAST_LOGIN_FLUSH_MAX_ENTRIES, LAST_LOGIN_SPILL_PATH
+
+
+def last_login_statement():
+    """
+    UPDATE di users.last_login, eseguibile in executemany con parametri
+    b_id e b_last_login. Un valore più vecchio di quello salvato viene ignorato.
+    """
+    table = User.__table__
+    return update(table).where(
+        table.c.id == bindparam("b_id"),
+        or_(table.c.last_login.is_(None), table.c.last_login < bindparam("b_last_login")),
+    ).values(last_login=bindparam("b_last_login"))
+
+
+class LastLoginBuffer(WriteBehindBuffer[int, datetime]):
+    """
+    Buffer write-behind per users.last_login: il login accoda solo l'istante
+    in memoria e la scrittura avviene fuori dalla risposta, con un unico
+    UPDATE executemany ogni `flush_interval_ms` o al raggiungimento di
+    `max_entries` utenti. Più login dello stesso utente diventano una riga.
+    """
+
+    thread_name = "last-login-buffer"
+    pending_stat = "pending_users"
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        flush_interval_ms: int = 1000,
+        max_entries: int = 1000,
+        spill_path: str = "last_login_spill.jsonl",
+    ):
+        super().__init__(session_factory, flush_interval_ms, max_entries, spill_path)
+
+    def add(self, user_id: int):
+        """Registra un login; risveglia il writer se il buffer è pieno."""
+        self._put(user_id, datetime.utcnow())
+
+    def merge(self, current: datetime, value: datetime) -> datetime:
+        return max(current, value)
+
+    def write(self, db, batch: Dict[int, datetime]):
+        db.execute(last_login_statement(), [
+            {"b_id": user_id, "b_last_login": last_login} for user_id, last_login in batch.items()
+        ])
+
+    def dump(self, key: int, value: datetime) -> dict:
+        return {"user_id": key, "last_login": value.isoformat()}
+
+    def load(self, row: dict) -> Tuple[int, datetime]:
+        return row["user_id"], datetime.fromisoformat(row["last_login"])
+
+
+# Buffer condiviso dal worker (attivo solo con LAST_LOGIN_WRITE_BEHIND=true)
+last_login_buffer = LastLoginBuffer(
+    SessionLocal, LAST_LOGIN_FLUSH_INTERVAL_MS, LAST_LOGIN_FLUSH_MAX_ENTRIES, LAST_LOGIN_SPILL_PATH
+)
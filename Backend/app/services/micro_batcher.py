@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from fastapi import status
+
+logger = logging.getLogger(__name__)
+
+
+class BatchedResult(NamedTuple):
+    response: dict
+    attempts: int
+    batch_size: int
+
+
+@dataclass
+class BatcherStats:
+    batches: int = 0
+    items: int = 0
+    full_batches: int = 0
+    errors: int = 0
+
+
+@dataclass
+class _PendingBatch:
+    bodies: List[dict] = field(default_factory=list)
+    futures: List[asyncio.Future] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class MicroBatcher:
+    """
+    Raggruppa le chiamate ai motori che accettano input in batch
+    (AIEngine.batch_max_size > 1). Le richieste si accumulano per al massimo
+    batch_window_ms, o finché il batch è pieno, e partono come un'unica
+    chiamata {"batch": [body, ...]}; il motore risponde {"results": [...]}
+    nello stesso ordine e ogni chiamante riceve la propria risposta.
+
+    Un elemento {"error": "..."} nei results fa fallire solo il suo chiamante.
+    Un batch di un solo elemento parte come chiamata normale.
+    """
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+        # I batch in attesa appartengono all'event loop in cui sono stati creati
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[int, _PendingBatch] = {}
+        self._stats: Dict[int, BatcherStats] = {}
+
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._pending = loop, {}
+        return loop
+
+    async def submit(self, engine, body: dict) -> BatchedResult:
+        """
+        Accoda `body` nel batch corrente del motore e ne attende la risposta.
+        :raises EngineCallError: Se la chiamata del batch o il singolo elemento falliscono.
+        """
+        loop = self._bind_loop()
+        batch = self._pending.get(engine.id)
+        if batch is None:
+            batch = self._pending[engine.id] = _PendingBatch()
+            batch.timer = loop.call_later(engine.batch_window_ms / 1000, self._flush, engine)
+        future = loop.create_future()
+        batch.bodies.append(body)
+        batch.futures.append(future)
+        if len(batch.bodies) >= engine.batch_max_size:
+            self._flush(engine)
+        return await future
+
+    def _flush(self, engine):
+        batch = self._pending.pop(engine.id, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        stats = self._stats.setdefault(engine.id, BatcherStats())
+        stats.batches += 1
+        stats.items += len(batch.bodies)
+        stats.full_batches += len(batch.bodies) >= engine.batch_max_size
+        self._loop.create_task(self._dispatch(engine, batch, stats))
+
+    async def _dispatch(self, engine, batch: _PendingBatch, stats: BatcherStats):
+        # Import locale: ai_gateway importa questo modulo
+        from app.services.ai_gateway import EngineCallError
+
+        size = len(batch.bodies)
+        try:
+            if size == 1:
+                response, attempts = await self.gateway.request(engine, batch.bodies[0])
+                results = [response]
+            else:
+                response, attempts = await self.gateway.request(engine, {"batch": batch.bodies})
+                results = response.get("results") if isinstance(response, dict) else None
+                if not isinstance(results, list) or len(results) != size:
+                    raise EngineCallError(f"Risposta batch non valida dal motore {engine.name}.")
+        except Exception as e:
+            stats.errors += 1
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, result in zip(batch.futures, results):
+            if future.done():
+                continue
+            if isinstance(result, dict) and set(result) == {"error"}:
+                future.set_exception(EngineCallError(
+                    f"Il motore {engine.name} ha scartato la richiesta: {result['error']}",
+                    status.HTTP_502_BAD_GATEWAY,
+                ))
+            else:
+                future.set_result(BatchedResult(result, attempts, size))
+
+    def stats(self) -> dict:
+        return {
+            "engines": {
+                engine_id: dict(vars(stats), avg_batch_size=round(stats.items / stats.batches, 2) if stats.batches else 0)
+                for engine_id, stats in self._stats.items()
+            },
+            "pending": {engine_id: len(batch.bodies) for engine_id, batch in self._pending.items()},
+        }
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from app.utils.hashing import Hash
+from app.settings import (
+    BCRYPT_ROUNDS,
+    PASSWORD_HASH_POOL_ENABLED,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_MAX_PENDING,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_up() -> bool:
+    # Eseguita una volta per processo: importa bcrypt prima della prima richiesta
+    return Hash.cost(Hash.bcrypt("warm-up", 4)) == 4
+
+
+class PasswordHasher:
+    """
+    Esegue hash e verifica bcrypt in un pool di processi dedicato: il lavoro
+    CPU-bound non occupa il GIL del worker web e le altre richieste non ne
+    risentono. Al massimo `max_pending` operazioni possono essere in coda o
+    in esecuzione; oltre questo limite la richiesta riceve 503 invece di
+    accumulare latenza durante un picco di login.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 64, rounds: int = 12, enabled: bool = True):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self.max_pending_seen = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: i processi non ereditano thread e connessioni del worker
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Troppe richieste di autenticazione in corso, riprovare.",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+            self.max_pending_seen = max(self.max_pending_seen, self._pending)
+        try:
+            executor = self._get_executor()
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                # Un processo è terminato in modo anomalo: il pool viene ricreato
+                logger.warning("Pool di hashing non più utilizzabile, ricreato")
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = None
+                future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, _future: Optional[Future]):
+        with self._lock:
+            self._pending -= 1
+            self.completed += _future is not None
+
+    def hash(self, password: str) -> str:
+        """Hash bcrypt con il costo configurato."""
+        if not self.enabled:
+            return Hash.bcrypt(password, self.rounds)
+        return self._submit(Hash.bcrypt, password, self.rounds).result()
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        """Verifica una password contro il suo hash."""
+        if not self.enabled:
+            return Hash.verify(password, hashed_password)
+        return self._submit(Hash.verify, password, hashed_password).result()
+
+    async def hash_async(self, password: str) -> str:
+        """Variante asincrona di hash: l'event loop non resta bloccato."""
+        if not self.enabled:
+            return await run_in_threadpool(Hash.bcrypt, password, self.rounds)
+        return await asyncio.wrap_future(self._submit(Hash.bcrypt, password, self.rounds))
+
+    async def verify_async(self, password: str, hashed_password: str) -> bool:
+        """Variante asincrona di verify."""
+        if not self.enabled:
+            return await run_in_threadpool(Hash.verify, password, hashed_password)
+        return await asyncio.wrap_future(self._submit(Hash.verify, password, hashed_password))
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        return Hash.needs_rehash(hashed_password, self.rounds)
+
+    def start(self):
+        """Avvia i processi del pool, così il primo login non paga lo spawn."""
+        if not self.enabled:
+            return
+        executor = self._get_executor()
+        for future in [executor.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+
+    def stop(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "workers": self.workers,
+                "rounds": self.rounds,
+                "pending": self._pending,
+                "max_pending_seen": self.max_pending_seen,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+# Pool condiviso dal worker
+password_hasher = PasswordHasher(
+    workers=PASSWORD_HASH_WORKERS,
+    max_pending=PASSWORD_HASH_MAX_PENDING,
+    rounds=BCRYPT_ROUNDS,
+    enabled=PASSWORD_HASH_POOL_ENABLED,
+)
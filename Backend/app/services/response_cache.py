@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from app.settings import AI_RESPONSE_CACHE_ENABLED, AI_RESPONSE_CACHE_TTL_SECONDS, AI_RESPONSE_CACHE_MAX_ENTRIES
+
+# Origine di una risposta restituita da ResponseCache.fetch
+MISS, HIT, SHARED = "miss", "hit", "shared"
+
+
+def response_cache_key(engine_id: int, preset_params: Optional[dict], emotional_state_id: Optional[int], body: dict) -> str:
+    """
+    Chiave della cache: SHA-256 del JSON normalizzato (chiavi ordinate, senza
+    spazi) di motore, parametri effettivi del preset, stato emozionale e body.
+    """
+    normalized = json.dumps(
+        [engine_id, preset_params, emotional_state_id, body],
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Cache delle risposte dei motori AI con limite LRU e TTL, più coalescing
+    delle richieste identiche: finché una chiamata è in corso, le richieste
+    con la stessa chiave ne attendono il risultato invece di partire.
+
+    La chiamata condivisa gira in un task proprio, così la disconnessione di
+    chi l'ha avviata non la interrompe per gli altri. Si mettono in cache solo
+    le risposte riuscite; le risposte sono condivise, quindi non vanno modificate.
+    """
+
+    def __init__(self, ttl_seconds: int = 300, max_entries: int = 1000, enabled: bool = True):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        # Le chiamate in corso appartengono all'event loop in cui sono state create
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, response: dict):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if task.cancelled():
+            return
+        # Letta sempre, anche se nessuno attende più il risultato
+        if task.exception() is None:
+            self.put(key, task.result())
+
+    async def fetch(self, key: str, call: Callable[[], Awaitable[dict]]) -> Tuple[dict, str]:
+        """
+        Restituisce la risposta per `key`: dalla cache, da una chiamata identica
+        già in corso o eseguendo `call`.
+        :return: La risposta e la sua origine (HIT, SHARED o MISS).
+        :raises: L'eccezione di `call`, anche per le richieste accodate.
+        """
+        if not self.enabled:
+            return await call(), MISS
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached, HIT
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._in_flight = loop, {}
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task), SHARED
+
+        self.misses += 1
+        task = loop.create_task(call())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda done: self._done(key, done))
+        return await asyncio.shield(task), MISS
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = len(self._entries)
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "in_flight": len(self._in_flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+        }
+
+
+# Cache condivisa dal worker
+response_cache = ResponseCache(AI_RESPONSE_CACHE_TTL_SECONDS, AI_RESPONSE_CACHE_MAX_ENTRIES, AI_RESPONSE_CACHE_ENABLED)
@@ -1,6 +1,11 @@
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.models.room import Room, RoomCheckin, UserRoom
+from app.models.room import Room, RoomCheckin
+from app.models.user import UserRooms as UserRoom
 from app.models.user import User
+from app.schemas.bulk_schema import BulkItemResult, BulkResponse
 from app.schemas.room_schema import (
     RoomCreate,
     RoomUpdate,
@@ -11,8 +16,25 @@ from app.schemas.room_schema import (
 )
 
 from app.schemas.emotional_match_schema import EmotionalMatchSchema  # Import per la validazione
+from app.db.writes import (
+    insert_returning,
+    insert_returning_async,
+    supports_returning,
+    update_returning,
+    update_returning_async,
+    upsert_insert,
+)
+from app.services.catalog_cache import CatalogBody, catalog_cache, invalidate_catalog, load_catalog
+from app.services.checkin_buffer import checkin_buffer
+from app.services.entitlement_cache import (
+    get_entitlement,
+    get_premium_ids,
+    require_premium_access,
+    require_premium_access_async,
+)
 from app.utils.randomizer import weighted_random_choice
-from datetime import date
+from app.utils.validators import bulk_response, validate_bulk_items
+from datetime import datetime
 from fastapi import HTTPException, status
 
 def create_room(db: Session, room_data: RoomCreate) -> Room:
@@ -26,23 +48,59 @@ def create_room(db: Session, room_data: RoomCreate) -> Room:
             detail=f"Invalid emotional match structure: {e}",
         )
 
-    new_room = Room(**room_data.dict())
-    db.add(new_room)
+    new_room = insert_returning(db, Room, room_data.dict())
+    invalidate_catalog(db, "rooms")
     db.commit()
-    db.refresh(new_room)
     return new_room
 
-def update_room(db: Session, room_id: int, room_data: RoomUpdate) -> Room:
+def list_rooms(db: Session):
+    """Retrieve all rooms."""
+    return db.query(Room).all()
+
+def get_room_by_id(db: Session, room_id: int) -> Room:
     room = db.query(Room).filter(Room.id == room_id).first()
     if not room:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Room not found"
         )
-    for key, value in room_data.dict(exclude_unset=True).items():
-        setattr(room, key, value)
+    return room
+
+def list_rooms_json() -> CatalogBody:
+    """Serialized room catalog and its ETag, served from the catalog cache."""
+    return catalog_cache.get("rooms", "all", lambda: load_catalog("rooms", list_rooms))
+
+def get_room_json(room_id: int) -> CatalogBody:
+    """Serialized room by id; a missing room raises 404 and is not cached."""
+    return catalog_cache.get(
+        "rooms", f"id:{room_id}", lambda: load_catalog("rooms", lambda db: get_room_by_id(db, room_id))
+    )
+
+def _room_update_values(room_data: RoomUpdate) -> dict:
+    """
+    Campi da aggiornare; emotional_match viene validato qui perché l'UPDATE
+    diretto non passa dagli eventi before_update del modello.
+    """
+    values = room_data.dict(exclude_unset=True)
+    if values.get("emotional_match") is not None:
+        try:
+            EmotionalMatchSchema(matches=values["emotional_match"])
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid emotional match structure: {e}",
+            )
+    return values
+
+def update_room(db: Session, room_id: int, room_data: RoomUpdate) -> Room:
+    room = update_returning(db, Room, [Room.id == room_id], _room_update_values(room_data))
+    if not room:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Room not found"
+        )
+    invalidate_catalog(db, "rooms")
     db.commit()
-    db.refresh(room)
     return room
 
 def delete_room(db: Session, room_id: int) -> None:
@@ -53,36 +111,92 @@ def delete_room(db: Session, room_id: int) -> None:
             detail="Room not found"
         )
     db.delete(room)
+    invalidate_catalog(db, "rooms")
     db.commit()
 
-def create_room_checkin(db: Session, user_id: int, room_id: int, is_random: bool) -> RoomCheckin:
-    room_checkin = db.query(RoomCheckin).filter(
+def _room_checkin_upsert(db, user_id: int, room_id: int, is_random: bool):
+    """
+    INSERT ... ON CONFLICT (user_id, room_id) DO UPDATE che incrementa il contatore
+    in un solo statement atomico.
+    """
+    table = RoomCheckin.__table__
+    insert = upsert_insert(db, table).values(
+        user_id=user_id,
+        room_id=room_id,
+        is_random=is_random,
+        checkin_count=1,
+        last_checkin=datetime.utcnow(),
+    )
+    return insert.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.room_id],
+        set_={
+            "checkin_count": func.coalesce(table.c.checkin_count, 0) + 1,
+            "last_checkin": insert.excluded.last_checkin,
+            "updated_at": func.now(),
+        },
+    )
+
+def _room_checkin_result(db, stmt, user_id: int, room_id: int):
+    """
+    Statement che restituisce la riga aggiornata: RETURNING dove supportato,
+    altrimenti una SELECT nella stessa transazione.
+    """
+    if supports_returning(db):
+        return select(RoomCheckin).from_statement(
+            stmt.returning(*RoomCheckin.__table__.c)
+        ).execution_options(populate_existing=True)
+    return select(RoomCheckin).where(
         RoomCheckin.user_id == user_id,
         RoomCheckin.room_id == room_id
-    ).first()
-
-    if room_checkin:
-        room_checkin.checkin_count += 1
-        room_checkin.last_checkin = date.today()
-    else:
-        room_checkin = RoomCheckin(
-            user_id=user_id,
-            room_id=room_id,
-            is_random=is_random,
-            checkin_count=1,
-            last_checkin=date.today()
-        )
-        db.add(room_checkin)
+    ).execution_options(populate_existing=True)
 
+def create_room_checkin(db: Session, user_id: int, room_id: int, is_random: bool) -> RoomCheckinResponse:
+    """
+    Registra un check-in: i check-in concorrenti non perdono incrementi
+    né creano righe duplicate (vincolo unique su user_id, room_id).
+    """
+    require_premium_access(db, user_id, "rooms", [room_id])
+    stmt = _room_checkin_upsert(db, user_id, room_id, is_random)
+    if not supports_returning(db):
+        db.execute(stmt)
+    room_checkin = db.execute(_room_checkin_result(db, stmt, user_id, room_id)).scalar_one()
+    # Risposta costruita prima del commit: nessun refresh dopo la scrittura
+    response = RoomCheckinResponse.from_orm(room_checkin)
     db.commit()
-    db.refresh(room_checkin)
-    return room_checkin
+    return response
+
+def buffer_room_checkin(db: Session, user_id: int, room_id: int, is_random: bool) -> RoomCheckinResponse:
+    """
+    Check-in in modalità write-behind: l'incremento viene accodato nel buffer
+    e scritto a blocchi. La risposta somma gli incrementi non ancora persistiti,
+    così l'utente vede subito il proprio contatore.
+    """
+    require_premium_access(db, user_id, "rooms", [room_id])
+    # Riga e incrementi in coda letti insieme: un flush in mezzo li conterebbe due volte o nessuna
+    room_checkin, pending = checkin_buffer.read_with_pending(
+        (user_id, room_id),
+        lambda: db.query(RoomCheckin).filter(
+            RoomCheckin.user_id == user_id,
+            RoomCheckin.room_id == room_id
+        ).populate_existing().first(),
+    )
+    if not room_checkin:
+        # Primo check-in per la stanza: la riga viene creata subito
+        return create_room_checkin(db, user_id, room_id, is_random)
+
+    last_checkin = checkin_buffer.add(user_id, room_id, is_random)
+    response = RoomCheckinResponse.from_orm(room_checkin)
+    response.checkin_count = (response.checkin_count or 0) + (pending.count if pending else 0) + 1
+    response.last_checkin = last_checkin
+    return response
 
 def update_room_customization(db: Session, user_id: int, customization_data: UserRoomUpdate) -> UserRoom:
-    user_room = db.query(UserRoom).filter(
-        UserRoom.user_id == user_id,
-        UserRoom.room_id == customization_data.room_id
-    ).first()
+    user_room = update_returning(
+        db,
+        UserRoom,
+        [UserRoom.user_id == user_id, UserRoom.room_id == customization_data.room_id],
+        customization_data.dict(exclude_unset=True),
+    )
 
     if not user_room:
         raise HTTPException(
@@ -90,28 +204,85 @@ def update_room_customization(db: Session, user_id: int, customization_data: Use
             detail="UserRoom not found"
         )
 
-    for key, value in customization_data.dict(exclude_unset=True).items():
-        setattr(user_room, key, value)
-
     db.commit()
-    db.refresh(user_room)
     return user_room
 
 def create_user_room(db: Session, user_id: int, user_room_data: UserRoomCreate) -> UserRoom:
-    user_room = UserRoom(
-        user_id=user_id,
-        **user_room_data.dict()
-    )
-    db.add(user_room)
+    require_premium_access(db, user_id, "rooms", [user_room_data.room_id])
+    user_room = insert_returning(db, UserRoom, {"user_id": user_id, **user_room_data.dict()})
     db.commit()
-    db.refresh(user_room)
     return user_room
 
+def create_user_rooms_bulk(db: Session, user_id: int, items: list) -> BulkResponse:
+    """
+    Create several room customizations for a user with a single multi-row INSERT.
+    Items that fail validation or reference unknown rooms are reported individually.
+    """
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+
+    valid, results = validate_bulk_items(UserRoomCreate, items)
+    room_ids = {item.room_id for _, item in valid}
+    known_ids = {
+        room_id for (room_id,) in db.query(Room.id).filter(Room.id.in_(room_ids))
+    } if room_ids else set()
+
+    premium_ids = get_premium_ids(db, "rooms")
+    is_premium = get_entitlement(db, user_id).is_premium if premium_ids & room_ids else True
+
+    pending = []
+    for index, item in valid:
+        if item.room_id not in known_ids:
+            results.append(BulkItemResult(index=index, status="error", error="Room not found"))
+        elif item.room_id in premium_ids and not is_premium:
+            results.append(BulkItemResult(
+                index=index, status="error", error="An active premium subscription is required for this room"
+            ))
+        else:
+            pending.append((index, item))
+
+    try:
+        # The flush batches the rows into one INSERT (RETURNING the ids on Postgres)
+        created = [(index, UserRoom(user_id=user_id, **item.dict())) for index, item in pending]
+        db.add_all([user_room for _, user_room in created])
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        created = _create_user_rooms_one_by_one(db, user_id, pending, results)
+
+    results.extend(BulkItemResult(index=index, status="created", id=user_room.id) for index, user_room in created)
+    return bulk_response(results)
+
+def _create_user_rooms_one_by_one(db: Session, user_id: int, pending: list, results: list) -> list:
+    """
+    Fallback of create_user_rooms_bulk when the multi-row INSERT fails: each item
+    is written in its own savepoint, so a failing row becomes an error result
+    instead of failing the whole batch.
+    """
+    created = []
+    for index, item in pending:
+        user_room = UserRoom(user_id=user_id, **item.dict())
+        try:
+            with db.begin_nested():
+                db.add(user_room)
+            created.append((index, user_room))
+        except SQLAlchemyError as e:
+            results.append(BulkItemResult(
+                index=index, status="error", error=f"Could not save the room customization: {getattr(e, 'orig', e)}"
+            ))
+    db.commit()
+    return created
+
 def update_user_room(db: Session, user_id: int, user_room_data: UserRoomUpdate) -> UserRoom:
-    user_room = db.query(UserRoom).filter(
-        UserRoom.user_id == user_id,
-        UserRoom.room_id == user_room_data.room_id
-    ).first()
+    user_room = update_returning(
+        db,
+        UserRoom,
+        [UserRoom.user_id == user_id, UserRoom.room_id == user_room_data.room_id],
+        user_room_data.dict(exclude_unset=True),
+    )
 
     if not user_room:
         raise HTTPException(
@@ -119,11 +290,7 @@ def update_user_room(db: Session, user_id: int, user_room_data: UserRoomUpdate)
             detail="UserRoom not found"
         )
 
-    for key, value in user_room_data.dict(exclude_unset=True).items():
-        setattr(user_room, key, value)
-
     db.commit()
-    db.refresh(user_room)
     return user_room
 
 def delete_user_room(db: Session, user_id: int, room_id: int) -> None:
@@ -140,3 +307,109 @@ def delete_user_room(db: Session, user_id: int, room_id: int) -> None:
 
     db.delete(user_room)
     db.commit()
+
+
+# Async variants (AsyncSession)
+
+async def create_room_async(db: AsyncSession, room_data: RoomCreate) -> Room:
+    """Create a new room."""
+    try:
+        EmotionalMatchSchema.parse_obj(room_data.emotional_match)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid emotional match structure: {e}",
+        )
+
+    new_room = await insert_returning_async(db, Room, room_data.dict())
+    invalidate_catalog(db, "rooms")
+    await db.commit()
+    return new_room
+
+async def update_room_async(db: AsyncSession, room_id: int, room_data: RoomUpdate) -> Room:
+    room = await update_returning_async(db, Room, [Room.id == room_id], _room_update_values(room_data))
+    if not room:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Room not found"
+        )
+    invalidate_catalog(db, "rooms")
+    await db.commit()
+    return room
+
+async def delete_room_async(db: AsyncSession, room_id: int) -> None:
+    room = await db.get(Room, room_id)
+    if not room:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Room not found"
+        )
+    await db.delete(room)
+    invalidate_catalog(db, "rooms")
+    await db.commit()
+
+async def create_room_checkin_async(db: AsyncSession, user_id: int, room_id: int, is_random: bool) -> RoomCheckinResponse:
+    await require_premium_access_async(db, user_id, "rooms", [room_id])
+    stmt = _room_checkin_upsert(db, user_id, room_id, is_random)
+    if not supports_returning(db):
+        await db.execute(stmt)
+    result = await db.execute(_room_checkin_result(db, stmt, user_id, room_id))
+    response = RoomCheckinResponse.from_orm(result.scalar_one())
+    await db.commit()
+    return response
+
+async def _get_user_room_row(db: AsyncSession, user_id: int, room_id: int) -> UserRoom:
+    result = await db.execute(
+        select(UserRoom).where(
+            UserRoom.user_id == user_id,
+            UserRoom.room_id == room_id
+        )
+    )
+    user_room = result.scalars().first()
+    if not user_room:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="UserRoom not found"
+        )
+    return user_room
+
+async def update_room_customization_async(db: AsyncSession, user_id: int, customization_data: UserRoomUpdate) -> UserRoom:
+    user_room = await update_returning_async(
+        db,
+        UserRoom,
+        [UserRoom.user_id == user_id, UserRoom.room_id == customization_data.room_id],
+        customization_data.dict(exclude_unset=True),
+    )
+    if not user_room:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="UserRoom not found"
+        )
+    await db.commit()
+    return user_room
+
+async def create_user_room_async(db: AsyncSession, user_id: int, user_room_data: UserRoomCreate) -> UserRoom:
+    await require_premium_access_async(db, user_id, "rooms", [user_room_data.room_id])
+    user_room = await insert_returning_async(db, UserRoom, {"user_id": user_id, **user_room_data.dict()})
+    await db.commit()
+    return user_room
+
+async def update_user_room_async(db: AsyncSession, user_id: int, user_room_data: UserRoomUpdate) -> UserRoom:
+    user_room = await update_returning_async(
+        db,
+        UserRoom,
+        [UserRoom.user_id == user_id, UserRoom.room_id == user_room_data.room_id],
+        user_room_data.dict(exclude_unset=True),
+    )
+    if not user_room:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="UserRoom not found"
+        )
+    await db.commit()
+    return user_room
+
+async def delete_user_room_async(db: AsyncSession, user_id: int, room_id: int) -> None:
+    user_room = await _get_user_room_row(db, user_id, room_id)
+    await db.delete(user_room)
+    await db.commit()
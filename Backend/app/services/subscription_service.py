@@ -1,32 +1,38 @@
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from app.db.writes import insert_returning, insert_returning_async, update_returning, update_returning_async
 from app.models.subscription import Subscription
 from app.schemas.subscription_schema import SubscriptionCreate, SubscriptionUpdate
+from app.services.entitlement_cache import get_entitlement, get_entitlement_async, invalidate_entitlements
+from app.utils.validators import validate_subscription_type
 from datetime import datetime
 from typing import Optional
 
 
+def _subscription_values(subscription_data: SubscriptionCreate) -> dict:
+    return {
+        "user_id": subscription_data.user_id,
+        "subscription_type": subscription_data.subscription_type,
+        "start_date": subscription_data.start_date or datetime.utcnow(),
+        "end_date": subscription_data.end_date,
+        "is_active": subscription_data.is_active,
+        "auto_renew": subscription_data.auto_renew,
+        "payment_method": subscription_data.payment_method,
+    }
+
+
 class SubscriptionService:
     @staticmethod
     def create_subscription(db: Session, subscription_data: SubscriptionCreate) -> Subscription:
-
-    # Validazione del tipo di sottoscrizione
-    subscription_data.subscription_type = validate_subscription_type(subscription_data.subscription_type)
-
         """
         Crea una nuova sottoscrizione per un utente.
         """
-        new_subscription = Subscription(
-            user_id=subscription_data.user_id,
-            subscription_type=subscription_data.subscription_type,
-            start_date=subscription_data.start_date or datetime.utcnow(),
-            end_date=subscription_data.end_date,
-            is_active=subscription_data.is_active,
-            auto_renew=subscription_data.auto_renew,
-            payment_method=subscription_data.payment_method,
-        )
-        db.add(new_subscription)
+        # Validazione del tipo di sottoscrizione
+        subscription_data.subscription_type = validate_subscription_type(subscription_data.subscription_type)
+
+        new_subscription = insert_returning(db, Subscription, _subscription_values(subscription_data))
+        invalidate_entitlements(db, new_subscription.user_id)
         db.commit()
-        db.refresh(new_subscription)
         return new_subscription
 
     @staticmethod
@@ -36,55 +42,100 @@ class SubscriptionService:
         """
         Aggiorna una sottoscrizione esistente.
         """
-        subscription = db.query(Subscription).filter(Subscription.id == subscription_id).first()
+        subscription = update_returning(
+            db, Subscription, [Subscription.id == subscription_id], subscription_data.dict(exclude_unset=True)
+        )
         if not subscription:
             return None
-
-        for key, value in subscription_data.dict(exclude_unset=True).items():
-            setattr(subscription, key, value)
-
-        subscription.updated_at = datetime.utcnow()
+        invalidate_entitlements(db, subscription.user_id)
         db.commit()
-        db.refresh(subscription)
         return subscription
 
     @staticmethod
     def get_subscription_by_user_id(db: Session, user_id: int) -> Optional[Subscription]:
         """
-        Recupera la sottoscrizione attiva di un utente.
+        Recupera la sottoscrizione attiva e non scaduta di un utente (quella che ne determina il tier).
+        L'ID arriva dalla cache degli entitlement: nessuna query se l'utente non ne ha.
         """
-        return (
-            db.query(Subscription)
-            .filter(Subscription.user_id == user_id, Subscription.is_active == True)
-            .first()
-        )
+        subscription_id = get_entitlement(db, user_id).subscription_id
+        return db.get(Subscription, subscription_id) if subscription_id else None
 
     @staticmethod
     def is_user_premium(db: Session, user_id: int) -> bool:
         """
-        Verifica se un utente ha una sottoscrizione premium attiva.
+        Verifica se un utente ha una sottoscrizione premium attiva e non scaduta.
         """
-        subscription = (
-            db.query(Subscription)
-            .filter(
-                Subscription.user_id == user_id,
-                Subscription.is_active == True,
-                Subscription.subscription_type == "premium",
-            )
-            .first()
-        )
-        return subscription is not None
+        return get_entitlement(db, user_id).is_premium
 
     @staticmethod
     def deactivate_subscription(db: Session, subscription_id: int) -> bool:
         """
         Disattiva una sottoscrizione esistente.
         """
-        subscription = db.query(Subscription).filter(Subscription.id == subscription_id).first()
+        subscription = update_returning(db, Subscription, [Subscription.id == subscription_id], {"is_active": False})
+        if subscription:
+            invalidate_entitlements(db, subscription.user_id)
+        db.commit()
+        return subscription is not None
+
+
+class AsyncSubscriptionService:
+    """
+    Variante asincrona di SubscriptionService basata su AsyncSession.
+    """
+
+    @staticmethod
+    async def create_subscription(db: AsyncSession, subscription_data: SubscriptionCreate) -> Subscription:
+        """
+        Crea una nuova sottoscrizione per un utente.
+        """
+        subscription_data.subscription_type = validate_subscription_type(subscription_data.subscription_type)
+
+        new_subscription = await insert_returning_async(db, Subscription, _subscription_values(subscription_data))
+        invalidate_entitlements(db, new_subscription.user_id)
+        await db.commit()
+        return new_subscription
+
+    @staticmethod
+    async def update_subscription(
+        db: AsyncSession, subscription_id: int, subscription_data: SubscriptionUpdate
+    ) -> Optional[Subscription]:
+        """
+        Aggiorna una sottoscrizione esistente.
+        """
+        subscription = await update_returning_async(
+            db, Subscription, [Subscription.id == subscription_id], subscription_data.dict(exclude_unset=True)
+        )
         if not subscription:
-            return False
+            return None
+        invalidate_entitlements(db, subscription.user_id)
+        await db.commit()
+        return subscription
 
-        subscription.is_active = False
-        subscription.updated_at = datetime.utcnow()
-        db.commit()
-        return True
+    @staticmethod
+    async def get_subscription_by_user_id(db: AsyncSession, user_id: int) -> Optional[Subscription]:
+        """
+        Recupera la sottoscrizione attiva e non scaduta di un utente (quella che ne determina il tier).
+        """
+        subscription_id = (await get_entitlement_async(db, user_id)).subscription_id
+        return await db.get(Subscription, subscription_id) if subscription_id else None
+
+    @staticmethod
+    async def is_user_premium(db: AsyncSession, user_id: int) -> bool:
+        """
+        Verifica se un utente ha una sottoscrizione premium attiva e non scaduta.
+        """
+        return (await get_entitlement_async(db, user_id)).is_premium
+
+    @staticmethod
+    async def deactivate_subscription(db: AsyncSession, subscription_id: int) -> bool:
+        """
+        Disattiva una sottoscrizione esistente.
+        """
+        subscription = await update_returning_async(
+            db, Subscription, [Subscription.id == subscription_id], {"is_active": False}
+        )
+        if subscription:
+            invalidate_entitlements(db, subscription.user_id)
+        await db.commit()
+        return subscription is not None
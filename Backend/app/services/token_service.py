@@ -0,0 +1,234 @@
+import hashlib
+import logging
+import secrets
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.db.session import engine
+from app.models.user import RefreshToken, User
+from app.utils.auth import token_denylist
+from app.utils.jwt_utils import generate_jwt_token
+from app.settings import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    REFRESH_TOKEN_EXPIRE_DAYS,
+    TOKEN_DENYLIST_SYNC_ENABLED,
+    TOKEN_DENYLIST_POLL_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+INVALID_REFRESH_TOKEN = "Refresh token non valido o scaduto."
+REUSED_REFRESH_TOKEN = "Refresh token già utilizzato: la sessione è stata revocata."
+
+# Un token di accesso emesso prima della revoca resta valido al massimo per questo tempo
+ACCESS_TOKEN_LIFETIME = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+
+
+def _hash_token(refresh_token: str) -> bytes:
+    # Il token è casuale a 256 bit: basta un hash veloce, non serve bcrypt
+    return hashlib.sha256(refresh_token.encode()).digest()
+
+
+def _new_refresh_token(user_id: int, family_id: str, now: datetime):
+    """:return: Il token in chiaro e la riga da salvare (solo hash)."""
+    refresh_token = secrets.token_urlsafe(32)
+    row = RefreshToken(
+        user_id=user_id,
+        family_id=family_id,
+        token_hash=_hash_token(refresh_token),
+        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        created_at=now,
+    )
+    return refresh_token, row
+
+
+def _token_response(user_id: int, email: str, family_id: str, refresh_token: str) -> dict:
+    access_token = generate_jwt_token({"user_id": user_id, "email": email, "sid": family_id})
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+def _lookup_query(refresh_token: str):
+    return select(
+        RefreshToken.id, RefreshToken.user_id, RefreshToken.family_id, RefreshToken.expires_at,
+        RefreshToken.rotated_at, RefreshToken.revoked_at, User.email, User.is_active,
+    ).join(User, User.id == RefreshToken.user_id).where(RefreshToken.token_hash == _hash_token(refresh_token))
+
+
+def _rotate_statement(token_id: int, now: datetime):
+    # Compare-and-set: due richieste con lo stesso token non possono ruotarlo entrambe
+    return update(RefreshToken).where(
+        RefreshToken.id == token_id,
+        RefreshToken.rotated_at.is_(None),
+        RefreshToken.revoked_at.is_(None),
+    ).values(rotated_at=now)
+
+
+def _revoke_statement(family_id: str, now: datetime):
+    return update(RefreshToken).where(
+        RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None)
+    ).values(revoked_at=now)
+
+
+def _deny_session(family_id: str, revoked_at: datetime):
+    token_denylist.deny(family_id, (revoked_at + ACCESS_TOKEN_LIFETIME).replace(tzinfo=timezone.utc).timestamp())
+
+
+def _check_usable(row, now: datetime):
+    if not row or row.revoked_at or row.expires_at <= now or not row.is_active:
+        raise ValueError(INVALID_REFRESH_TOKEN)
+
+
+def issue_tokens(db: Session, user_id: int, email: str) -> dict:
+    """
+    Apre una nuova sessione: token di accesso e refresh token.
+    Fa il commit della transazione corrente.
+    """
+    now = datetime.utcnow()
+    family_id = uuid.uuid4().hex
+    refresh_token, row = _new_refresh_token(user_id, family_id, now)
+    db.add(row)
+    db.commit()
+    return _token_response(user_id, email, family_id, refresh_token)
+
+
+def refresh_tokens(db: Session, refresh_token: str) -> dict:
+    """
+    Scambia un refresh token con un nuovo token di accesso e un nuovo refresh
+    token della stessa sessione, senza verifica della password.
+    Un token già scambiato indica un furto: l'intera sessione viene revocata.
+    :raises ValueError: Se il token è invalido, scaduto, revocato o già usato.
+    """
+    now = datetime.utcnow()
+    row = db.execute(_lookup_query(refresh_token)).first()
+    _check_usable(row, now)
+    if row.rotated_at is None and db.execute(_rotate_statement(row.id, now)).rowcount == 1:
+        new_token, new_row = _new_refresh_token(row.user_id, row.family_id, now)
+        db.add(new_row)
+        db.commit()
+        return _token_response(row.user_id, row.email, row.family_id, new_token)
+
+    db.execute(_revoke_statement(row.family_id, now))
+    db.commit()
+    _deny_session(row.family_id, now)
+    raise ValueError(REUSED_REFRESH_TOKEN)
+
+
+def revoke_refresh_token(db: Session, refresh_token: str):
+    """
+    Logout: revoca la sessione del refresh token e i relativi token di accesso.
+    Un token sconosciuto viene ignorato.
+    """
+    family_id = db.execute(
+        select(RefreshToken.family_id).where(RefreshToken.token_hash == _hash_token(refresh_token))
+    ).scalar()
+    if family_id is None:
+        return
+    now = datetime.utcnow()
+    db.execute(_revoke_statement(family_id, now))
+    db.commit()
+    _deny_session(family_id, now)
+
+
+# Async variants (AsyncSession)
+async def issue_tokens_async(db: AsyncSession, user_id: int, email: str) -> dict:
+    """
+    Variante asincrona di issue_tokens.
+    """
+    now = datetime.utcnow()
+    family_id = uuid.uuid4().hex
+    refresh_token, row = _new_refresh_token(user_id, family_id, now)
+    db.add(row)
+    await db.commit()
+    return _token_response(user_id, email, family_id, refresh_token)
+
+
+async def refresh_tokens_async(db: AsyncSession, refresh_token: str) -> dict:
+    """
+    Variante asincrona di refresh_tokens.
+    """
+    now = datetime.utcnow()
+    row = (await db.execute(_lookup_query(refresh_token))).first()
+    _check_usable(row, now)
+    if row.rotated_at is None and (await db.execute(_rotate_statement(row.id, now))).rowcount == 1:
+        new_token, new_row = _new_refresh_token(row.user_id, row.family_id, now)
+        db.add(new_row)
+        await db.commit()
+        return _token_response(row.user_id, row.email, row.family_id, new_token)
+
+    await db.execute(_revoke_statement(row.family_id, now))
+    await db.commit()
+    _deny_session(row.family_id, now)
+    raise ValueError(REUSED_REFRESH_TOKEN)
+
+
+class TokenDenylistSync:
+    """
+    Porta nella denylist di questo worker le sessioni revocate dagli altri
+    worker, leggendo periodicamente le revoche recenti da refresh_tokens.
+    Una volta all'ora elimina i refresh token scaduti.
+    """
+
+    PURGE_INTERVAL_SECONDS = 3600
+
+    def __init__(self, poll_seconds: float = 5.0, enabled: bool = True):
+        self.poll_seconds = poll_seconds
+        self.enabled = enabled
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._next_purge = 0.0
+        self.polls = 0
+        self.purged = 0
+
+    def poll(self):
+        """Aggiunge alla denylist le sessioni revocate da meno di ACCESS_TOKEN_EXPIRE_MINUTES."""
+        now = datetime.utcnow()
+        with engine.begin() as connection:
+            revoked = connection.execute(
+                select(RefreshToken.family_id, func.max(RefreshToken.revoked_at))
+                .where(RefreshToken.revoked_at > now - ACCESS_TOKEN_LIFETIME)
+                .group_by(RefreshToken.family_id)
+            ).all()
+            if time.monotonic() >= self._next_purge:
+                self._next_purge = time.monotonic() + self.PURGE_INTERVAL_SECONDS
+                self.purged += connection.execute(
+                    delete(RefreshToken).where(RefreshToken.expires_at < now)
+                ).rowcount
+        for family_id, revoked_at in revoked:
+            _deny_session(family_id, revoked_at)
+        self.polls += 1
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Lettura delle sessioni revocate fallita")
+            self._stopping.wait(self.poll_seconds)
+
+    def start(self):
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="token-denylist", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {**token_denylist.stats(), "polls": self.polls, "purged": self.purged}
+
+
+# Sincronizzazione condivisa dal worker
+token_denylist_sync = TokenDenylistSync(
+    poll_seconds=TOKEN_DENYLIST_POLL_SECONDS,
+    enabled=TOKEN_DENYLIST_SYNC_ENABLED,
+)
@@ -0,0 +1,311 @@
+import csv
+import io
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, List, Optional, Tuple
+from sqlalchemy import insert
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError
+from app.db.session import SessionLocal
+from app.models.ai import AIUsageLog
+from app.services.usage_rollups import apply_usage_rollups
+from app.settings import (
+    USAGE_INGEST_QUEUE_SIZE,
+    USAGE_INGEST_BATCH_SIZE,
+    USAGE_INGEST_FLUSH_INTERVAL_MS,
+    USAGE_INGEST_SPILL_PATH,
+    USAGE_INGEST_USE_COPY,
+)
+from app.utils.spill_file import SpillFile
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (
+    "user_id", "engine_id", "preset_id", "emotional_state_id", "request_payload", "response_payload",
+    "cost", "premium_discount", "latency_ms", "ttft_ms", "status", "error_message", "created_at",
+)
+JSON_COLUMNS = ("request_payload", "response_payload")
+# Errori del database (non del record): il replay si ferma e riprova al prossimo flush
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, DisconnectionError)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Tipo non serializzabile: {type(value).__name__}")
+
+
+def _copy_value(column: str, value):
+    """Valore CSV per COPY: None diventa un campo vuoto, cioè NULL."""
+    if value is None:
+        return None
+    if column in JSON_COLUMNS:
+        return json.dumps(value, default=_json_default)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class UsageIngestionQueue:
+    """
+    Pipeline di scrittura degli AIUsageLog fuori dal percorso della richiesta.
+    Gli handler accodano i record su una coda limitata; un writer in background
+    li scrive a blocchi (COPY su Postgres/psycopg2, INSERT multi-riga altrove).
+    Se la coda è piena o il database non risponde, i record finiscono in un file
+    append-only (JSON lines) che viene riprodotto al primo flush riuscito.
+    Il file è condiviso dai worker dell'host (vedi SpillFile); i record che il
+    database rifiuta vanno in `<spill_path>.dead` invece di bloccare il replay.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        max_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval_ms: int = 200,
+        spill_path: str = "ai_usage_spill.jsonl",
+        use_copy: bool = True,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.spill_path = spill_path
+        self.spill = SpillFile(spill_path)
+        self.dead_letter = SpillFile(spill_path + ".dead")
+        self.use_copy = use_copy
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.max_depth = 0
+        self.batches = 0
+        self.written = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.dead_lettered = 0
+        self.failed_flushes = 0
+        self.last_batch_size = 0
+        self.total_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    def put(self, record: dict) -> bool:
+        """
+        Accoda un record senza bloccare la richiesta.
+        :return: False se la coda era piena e il record è stato scritto nel file di spill.
+        """
+        record = {column: record.get(column) for column in COLUMNS}
+        record["created_at"] = record["created_at"] or datetime.utcnow()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._spill([record])
+            return False
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    def _drain(self, timeout: Optional[float]) -> List[dict]:
+        """Attende il primo record fino a `timeout`, poi prende quelli già in coda."""
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait())
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write(self, rows: List[dict]):
+        db = self.session_factory()
+        try:
+            if self.use_copy and db.get_bind().dialect.driver == "psycopg2":
+                self._copy(db, rows)
+            else:
+                db.execute(insert(AIUsageLog.__table__), rows)
+            # Rollup nella stessa transazione: un blocco fallito non lascia totali parziali
+            apply_usage_rollups(db, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _copy(db, rows: List[dict]):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([_copy_value(column, row[column]) for column in COLUMNS])
+        buffer.seek(0)
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {AIUsageLog.__tablename__} ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+        finally:
+            cursor.close()
+
+    def flush(self, timeout: Optional[float] = None) -> int:
+        """
+        Scrive un blocco di record; in caso di errore il blocco va nel file di spill.
+        :return: Numero di record scritti.
+        """
+        batch = self._drain(timeout)
+        if not batch:
+            return 0
+
+        start = time.perf_counter()
+        try:
+            self._write(batch)
+        except Exception:
+            self.failed_flushes += 1
+            logger.exception("Scrittura di %d AIUsageLog fallita, record salvati su %s", len(batch), self.spill_path)
+            self._spill(batch)
+            return 0
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            self.batches += 1
+            self.written += len(batch)
+            self.last_batch_size = len(batch)
+            self.total_flush_ms += elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.replay()
+        return len(batch)
+
+    def _spill(self, rows: List[dict]):
+        self.spill.append(json.dumps(row, default=_json_default) + "\n" for row in rows)
+        with self._lock:
+            self.spilled += len(rows)
+
+    def _dead_letter(self, line: str):
+        self.dead_letter.append([line])
+        with self._lock:
+            self.dead_lettered += 1
+
+    @staticmethod
+    def _parse(line: str) -> dict:
+        row = json.loads(line)
+        row["created_at"] = datetime.fromisoformat(row["created_at"])
+        return row
+
+    def _replay_rows(self, chunk: List[str]) -> Tuple[int, int]:
+        """
+        Scrive un blocco fallito un record alla volta: i record rifiutati vanno
+        nel file dead-letter, un errore del database interrompe il blocco.
+        :return: (righe gestite, record scritti).
+        """
+        written = 0
+        for index, line in enumerate(chunk):
+            try:
+                self._write([self._parse(line)])
+            except TRANSIENT_ERRORS:
+                return index, written
+            except Exception:
+                logger.exception("Record AIUsageLog rifiutato, spostato su %s", self.dead_letter.path)
+                self._dead_letter(line)
+                continue
+            written += 1
+        return len(chunk), written
+
+    def replay(self) -> int:
+        """
+        Riproduce il file di spill a blocchi. Un blocco fallito viene riprovato
+        record per record; se il database non risponde, le righe non scritte
+        tornano nel file di spill.
+        :return: Numero di record riprodotti.
+        """
+        replay_path = self.spill.claim()
+        if replay_path is None:
+            return 0
+
+        replayed = 0
+        with open(replay_path, encoding="utf-8") as replay_file:
+            lines = iter(replay_file)
+            while True:
+                chunk = [line for _, line in zip(range(self.batch_size), lines)]
+                if not chunk:
+                    break
+                try:
+                    self._write([self._parse(line) for line in chunk])
+                    handled = written = len(chunk)
+                except TRANSIENT_ERRORS:
+                    handled = written = 0
+                except Exception:
+                    handled, written = self._replay_rows(chunk)
+                replayed += written
+                if handled < len(chunk):
+                    logger.warning("Replay di %s interrotto, riprova al prossimo flush", self.spill_path)
+                    self.spill.append(chunk[handled:])
+                    self.spill.append(lines)
+                    break
+        os.remove(replay_path)
+
+        with self._lock:
+            self.replayed += replayed
+        return replayed
+
+    def _run(self):
+        try:
+            self.replay()
+        except Exception:
+            logger.exception("Replay di %s fallito", self.spill_path)
+        while not self._stopping.is_set():
+            try:
+                self.flush(timeout=self.flush_interval)
+            except Exception:
+                logger.exception("Flush degli AIUsageLog fallito")
+
+    def start(self):
+        """Avvia il writer in background, riproducendo lo spill lasciato da un'esecuzione precedente."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="usage-ingestion", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Ferma il writer e scrive i record rimasti in coda."""
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        while not self._queue.empty():
+            self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_depth,
+                "batches": self.batches,
+                "written": self.written,
+                "last_batch_size": self.last_batch_size,
+                "avg_batch_size": round(self.written / self.batches, 1) if self.batches else 0.0,
+                "avg_flush_ms": round(self.total_flush_ms / self.batches, 3) if self.batches else 0.0,
+                "max_flush_ms": round(self.max_flush_ms, 3),
+                "spilled": self.spilled,
+                "replayed": self.replayed,
+                "dead_lettered": self.dead_lettered,
+                "failed_flushes": self.failed_flushes,
+            }
+
+
+# Coda condivisa dal worker (attiva solo con USAGE_INGEST_ASYNC=true)
+usage_ingestion_queue = UsageIngestionQueue(
+    SessionLocal,
+    max_size=USAGE_INGEST_QUEUE_SIZE,
+    batch_size=USAGE_INGEST_BATCH_SIZE,
+    flush_interval_ms=USAGE_INGEST_FLUSH_INTERVAL_MS,
+    spill_path=USAGE_INGEST_SPILL_PATH,
+    use_copy=USAGE_INGEST_USE_COPY,
+)
@@ -0,0 +1,165 @@
+import logging
+import threading
+from datetime import date, datetime
+from typing import Callable, Optional
+from sqlalchemy import delete, select, text
+from app.db.partitions import add_months, ensure_monthly_partitions, list_monthly_partitions, month_start
+from app.db.session import SessionLocal, engine
+from app.models.ai import AIUsageLog
+from app.settings import (
+    AI_USAGE_RETENTION_MONTHS,
+    AI_USAGE_PARTITION_MONTHS_AHEAD,
+    AI_USAGE_RETENTION_INTERVAL_SECONDS,
+    AI_USAGE_RETENTION_DETACH_ONLY,
+    AI_USAGE_DELETE_CHUNK_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+USAGE_TABLE = AIUsageLog.__tablename__
+
+# Chiave dell'advisory lock Postgres: un solo worker esegue la retention
+RETENTION_LOCK_KEY = 7_715_302
+
+
+class UsageRetentionJob:
+    """
+    Manutenzione periodica di ai_usage_logs.
+    Su Postgres crea in anticipo le partizioni mensili e, oltre la retention,
+    stacca (o elimina) le partizioni intere. Su SQLite la retention è emulata
+    con DELETE a blocchi. I totali restano nei rollup (app/services/usage_rollups.py),
+    aggiornati già in fase di scrittura dei log.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        retention_months: int = 12,
+        months_ahead: int = 3,
+        interval_seconds: int = 3600,
+        chunk_size: int = 5000,
+        detach_only: bool = False,
+    ):
+        self.session_factory = session_factory
+        self.retention_months = retention_months
+        self.months_ahead = months_ahead
+        self.interval = interval_seconds
+        self.chunk_size = chunk_size
+        self.detach_only = detach_only
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.last_run: Optional[datetime] = None
+        self.last_result: dict = {}
+        self.failed_runs = 0
+
+    def cutoff(self, today: Optional[date] = None) -> date:
+        """I log creati prima di questa data sono fuori retention."""
+        return add_months(month_start(today or datetime.utcnow().date()), -self.retention_months)
+
+    def run_once(self, today: Optional[date] = None) -> dict:
+        """
+        Esegue un ciclo di manutenzione.
+        :return: Riepilogo di partizioni create/rimosse o righe eliminate.
+        """
+        with engine.connect() as connection:
+            is_postgres = connection.dialect.name == "postgresql"
+            if is_postgres and not connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": RETENTION_LOCK_KEY}
+            ).scalar():
+                return {"skipped": "locked by another worker"}
+            db = self.session_factory(bind=connection)
+            try:
+                if is_postgres:
+                    result = self._maintain_partitions(db, today)
+                else:
+                    result = self._delete_in_chunks(db, today)
+            finally:
+                db.close()
+                if is_postgres:
+                    connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": RETENTION_LOCK_KEY})
+
+        self.runs += 1
+        self.last_run = datetime.utcnow()
+        self.last_result = result
+        return result
+
+    def _maintain_partitions(self, db, today: Optional[date]) -> dict:
+        current = month_start(today or datetime.utcnow().date())
+        created = ensure_monthly_partitions(db, USAGE_TABLE, current, add_months(current, self.months_ahead))
+        db.commit()
+
+        cutoff = self.cutoff(today)
+        removed = []
+        for name, month in list_monthly_partitions(db, USAGE_TABLE):
+            end = add_months(month, 1)
+            if end > cutoff:
+                break
+            db.execute(text(f"ALTER TABLE {USAGE_TABLE} DETACH PARTITION {name}"))
+            if not self.detach_only:
+                db.execute(text(f"DROP TABLE {name}"))
+            db.commit()
+            removed.append(name)
+            logger.info("Partizione %s %s", name, "staccata" if self.detach_only else "eliminata")
+        return {"partitions_ensured": len(created), "partitions_removed": removed}
+
+    def _delete_in_chunks(self, db, today: Optional[date]) -> dict:
+        cutoff = datetime.combine(self.cutoff(today), datetime.min.time())
+        deleted = 0
+        while True:
+            ids = db.execute(
+                select(AIUsageLog.id)
+                .where(AIUsageLog.created_at < cutoff)
+                .order_by(AIUsageLog.id)
+                .limit(self.chunk_size)
+            ).scalars().all()
+            if not ids:
+                break
+            db.execute(delete(AIUsageLog).where(AIUsageLog.id.in_(ids)))
+            db.commit()
+            deleted += len(ids)
+        return {"rows_deleted": deleted}
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                self.failed_runs += 1
+                logger.exception("Manutenzione di %s fallita", USAGE_TABLE)
+            self._stopping.wait(self.interval)
+
+    def start(self):
+        """Avvia il job in background (primo ciclo immediato)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="usage-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Ferma il job al termine del ciclo in corso."""
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "failed_runs": self.failed_runs,
+            "last_run": self.last_run,
+            "last_result": self.last_result,
+            "retention_months": self.retention_months,
+        }
+
+
+# Job condiviso dal worker (attivo solo con AI_USAGE_RETENTION_ENABLED=true)
+usage_retention_job = UsageRetentionJob(
+    SessionLocal,
+    retention_months=AI_USAGE_RETENTION_MONTHS,
+    months_ahead=AI_USAGE_PARTITION_MONTHS_AHEAD,
+    interval_seconds=AI_USAGE_RETENTION_INTERVAL_SECONDS,
+    chunk_size=AI_USAGE_DELETE_CHUNK_SIZE,
+    detach_only=AI_USAGE_RETENTION_DETACH_ONLY,
+)
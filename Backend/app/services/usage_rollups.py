@@ -0,0 +1,126 @@
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.db.partitions import month_start
+from app.db.writes import upsert_insert
+from app.models.ai import AIUsageDailySummary, AIUsageUserMonthly
+
+# Stati di AIUsageLog conteggiati come chiamate riuscite (le risposte dalla cache costano zero)
+SUCCESS_STATUSES = ("success", "cached")
+
+# Campi sommati in entrambe le tabelle di rollup
+TOTALS = ("calls", "success_count", "failure_count", "total_cost", "total_premium_discount", "total_latency_ms")
+
+
+def _empty_totals() -> dict:
+    return {
+        "calls": 0,
+        "success_count": 0,
+        "failure_count": 0,
+        "total_cost": Decimal(0),
+        "total_premium_discount": Decimal(0),
+        "total_latency_ms": 0,
+    }
+
+
+def _add(totals: dict, row: dict):
+    success = row["status"] in SUCCESS_STATUSES
+    totals["calls"] += 1
+    totals["success_count"] += success
+    totals["failure_count"] += not success
+    totals["total_cost"] += Decimal(str(row.get("cost") or 0))
+    totals["total_premium_discount"] += Decimal(str(row.get("premium_discount") or 0))
+    totals["total_latency_ms"] += row.get("latency_ms") or 0
+
+
+def aggregate_usage(rows: Iterable[dict]) -> Tuple[Dict[tuple, dict], Dict[tuple, dict]]:
+    """
+    Aggrega in memoria un blocco di AIUsageLog.
+    :return: Totali per (giorno, utente, motore, preset) e per (mese, utente).
+    """
+    daily, monthly = {}, {}
+    for row in rows:
+        created_at = row.get("created_at") or datetime.utcnow()
+        day = created_at.date()
+        daily_key = (day, row["user_id"], row["engine_id"], row.get("preset_id") or 0)
+        _add(daily.setdefault(daily_key, _empty_totals()), row)
+        _add(monthly.setdefault((month_start(day), row["user_id"]), _empty_totals()), row)
+    return daily, monthly
+
+
+def _upsert_totals(db: Session, model, key_columns: Tuple[str, ...], totals: Dict[tuple, dict]):
+    if not totals:
+        return
+    table = model.__table__
+    now = datetime.utcnow()
+    # Chiavi ordinate: scrittori concorrenti bloccano le righe nello stesso ordine
+    insert = upsert_insert(db, table).values([
+        {**dict(zip(key_columns, key)), **values, "updated_at": now}
+        for key, values in sorted(totals.items())
+    ])
+    db.execute(insert.on_conflict_do_update(
+        index_elements=[table.c[column] for column in key_columns],
+        set_={
+            **{column: table.c[column] + insert.excluded[column] for column in TOTALS},
+            "updated_at": insert.excluded.updated_at,
+        },
+    ))
+
+
+def apply_usage_rollups(db: Session, rows: List[dict]):
+    """
+    Aggiorna i rollup con un blocco di AIUsageLog appena scritti.
+    Va eseguita nella stessa transazione dell'INSERT dei log.
+    """
+    daily, monthly = aggregate_usage(rows)
+    _upsert_totals(db, AIUsageDailySummary, ("day", "user_id", "engine_id", "preset_id"), daily)
+    _upsert_totals(db, AIUsageUserMonthly, ("month", "user_id"), monthly)
+
+
+def get_month_to_date_usage(db: Session, user_id: int, today: Optional[date] = None) -> dict:
+    """
+    Spesa del mese corrente per un utente: una lookup sulla chiave (user_id, month).
+    """
+    month = month_start(today or datetime.utcnow().date())
+    row = db.execute(
+        select(AIUsageUserMonthly).where(AIUsageUserMonthly.user_id == user_id, AIUsageUserMonthly.month == month)
+    ).scalars().first()
+    totals = {column: getattr(row, column) for column in TOTALS} if row else _empty_totals()
+    return {"user_id": user_id, "month": month, **totals}
+
+
+def _daily_totals(db: Session, group_column, *criteria) -> List[dict]:
+    summary = AIUsageDailySummary
+    rows = db.execute(
+        select(summary.day, group_column, *(func.sum(getattr(summary, column)).label(column) for column in TOTALS))
+        .where(*criteria)
+        .group_by(summary.day, group_column)
+        .order_by(summary.day)
+    ).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def get_user_daily_usage(db: Session, user_id: int, start: date, end: date) -> List[dict]:
+    """Totali giornalieri per motore di un utente, tra start ed end inclusi."""
+    summary = AIUsageDailySummary
+    return _daily_totals(
+        db, summary.engine_id, summary.user_id == user_id, summary.day >= start, summary.day <= end
+    )
+
+
+def get_engine_daily_usage(db: Session, engine_id: int, start: date, end: date) -> List[dict]:
+    """Totali giornalieri per preset di un motore, tra start ed end inclusi."""
+    summary = AIUsageDailySummary
+    return _daily_totals(
+        db, summary.preset_id, summary.engine_id == engine_id, summary.day >= start, summary.day <= end
+    )
+
+
+def get_preset_daily_usage(db: Session, preset_id: int, start: date, end: date) -> List[dict]:
+    """Totali giornalieri per motore di un preset (0 = nessun preset), tra start ed end inclusi."""
+    summary = AIUsageDailySummary
+    return _daily_totals(
+        db, summary.engine_id, summary.preset_id == preset_id, summary.day >= start, summary.day <= end
+    )
@@ -1,48 +1,76 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from app.db.writes import insert_returning, insert_returning_async, update_returning, update_returning_async
 from app.models.user import User, UserSettings
+from app.schemas.bulk_schema import BulkItemResult, BulkResponse
 from app.schemas.user_schema import (
     UserCreate,
     UserUpdate,
     UserResponse,
     UserSettingsCreate,
     UserSettingsUpdate,
+    UserSettingsBulkUpdate,
     UserSettingsResponse
 )
-from app.utils.hashing import Hash
-from app.utils.jwt_utils import generate_jwt_token, decode_jwt_token
+from app.services.last_login_buffer import last_login_buffer, last_login_statement
+from app.services.password_hasher import password_hasher
+from app.services.token_service import issue_tokens, issue_tokens_async
+from app.utils.auth import verify_access_token
+from app.utils.validators import bulk_response, validate_bulk_items, validate_email
+from app.settings import LAST_LOGIN_WRITE_BEHIND
 
-# CRUD Operations for Users
-def create_user(db: Session, user_data: UserCreate) -> UserResponse:
-    # Check if the email already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered",
-        )
+def _new_user_values(user_data: UserCreate, hashed_password: str) -> dict:
+    return {
+        "email": user_data.email,
+        "password_hash": hashed_password,
+        "display_name": user_data.display_name or user_data.email.split('@')[0],
+        "avatar_url": user_data.avatar_url,
+        "language": user_data.language,
+        "is_active": user_data.is_active,
+    }
 
+def _email_already_registered() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Email already registered",
+    )
+
+# CRUD Operations for Users
+def create_user(db: Session, user_data: UserCreate, hashed_password: Optional[str] = None) -> UserResponse:
     # Validazione dell'email
     validate_email(user_data.email)
 
-    hashed_password = Hash.bcrypt(user_data.password_hash)
+    # bcrypt gira nel pool di processi dedicato, se l'hash non è già stato calcolato
+    if hashed_password is None:
+        hashed_password = password_hasher.hash(user_data.password_hash)
 
-    # Create the user
-    new_user = User(
-        email=user_data.email,
-        password_hash=hashed_password,
-        display_name=user_data.display_name or user_data.email.split('@')[0],
-        avatar_url=user_data.avatar_url,
-        language=user_data.language,
-        is_active=user_data.is_active,
-    )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    # Create the user (INSERT ... RETURNING, nessun refresh dopo il commit).
+    # Le email duplicate le rifiuta il vincolo unique, senza SELECT preventiva.
+    try:
+        new_user = insert_returning(db, User, _new_user_values(user_data, hashed_password))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise _email_already_registered()
 
     return UserResponse.from_orm(new_user)
 
+async def create_user_pooled(db: Session, user_data: UserCreate) -> UserResponse:
+    """
+    create_user per le route async con sessione sync: l'hash bcrypt viene
+    atteso dal pool di processi senza occupare un thread del threadpool,
+    usato solo per l'INSERT.
+    """
+    validate_email(user_data.email)
+    hashed_password = await password_hasher.hash_async(user_data.password_hash)
+    return await run_in_threadpool(create_user, db, user_data, hashed_password)
+
 def get_user_by_id(db: Session, user_id: int) -> UserResponse:
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -53,18 +81,13 @@ def get_user_by_id(db: Session, user_id: int) -> UserResponse:
     return UserResponse.from_orm(user)
 
 def update_user(db: Session, user_id: int, updates: UserUpdate) -> UserResponse:
-    user = db.query(User).filter(User.id == user_id).first()
+    user = update_returning(db, User, [User.id == user_id], updates.dict(exclude_unset=True))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
-
-    for key, value in updates.dict(exclude_unset=True).items():
-        setattr(user, key, value)
-
     db.commit()
-    db.refresh(user)
 
     return UserResponse.from_orm(user)
 
@@ -89,21 +112,19 @@ def create_user_settings(db: Session, user_id: int, settings_data: UserSettingsC
         )
 
     # Create the settings
-    new_settings = UserSettings(
-        user_id=user_id,
-        language=settings_data.language,
-        notifications_enabled=settings_data.notifications_enabled,
-        show_emotion_checkins=settings_data.show_emotion_checkins,
-        dark_mode_enabled=settings_data.dark_mode_enabled,
-        preferred_ai_voice=settings_data.preferred_ai_voice,
-        preferred_ai_tone=settings_data.preferred_ai_tone,
-        sound_notifications_enabled=settings_data.sound_notifications_enabled,
-        default_room_id=settings_data.default_room_id,
-        receive_checkin_reminder=settings_data.receive_checkin_reminder,
-    )
-    db.add(new_settings)
+    new_settings = insert_returning(db, UserSettings, {
+        "user_id": user_id,
+        "language": settings_data.language,
+        "notifications_enabled": settings_data.notifications_enabled,
+        "show_emotion_checkins": settings_data.show_emotion_checkins,
+        "dark_mode_enabled": settings_data.dark_mode_enabled,
+        "preferred_ai_voice": settings_data.preferred_ai_voice,
+        "preferred_ai_tone": settings_data.preferred_ai_tone,
+        "sound_notifications_enabled": settings_data.sound_notifications_enabled,
+        "default_room_id": settings_data.default_room_id,
+        "receive_checkin_reminder": settings_data.receive_checkin_reminder,
+    })
     db.commit()
-    db.refresh(new_settings)
 
     return UserSettingsResponse.from_orm(new_settings)
 
@@ -116,22 +137,87 @@ def get_user_settings(db: Session, user_id: int) -> UserSettingsResponse:
         )
     return UserSettingsResponse.from_orm(settings)
 
-def update_user_settings(db: Session, user_id: int, updates: UserSettingsUpdate) -> UserSettingsResponse:
+def _user_settings_etag(settings_id: int, version: int) -> str:
+    # The id is included: settings deleted and created again restart from version 1
+    return f'"us-{settings_id}-{version}"'
+
+def _user_settings_changes(updates: UserSettingsUpdate) -> dict:
+    """Fields to update, plus the row version bump when something changes."""
+    values = updates.dict(exclude_unset=True)
+    if values:
+        values["version"] = UserSettings.version + 1
+    return values
+
+def get_user_settings_etag(db: Session, user_id: int) -> str:
+    """
+    Current ETag of the user settings. Only id and version are read,
+    so a conditional GET answered with 304 never loads the full row.
+    """
+    row = db.query(UserSettings.id, UserSettings.version).filter(UserSettings.user_id == user_id).first()
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User settings not found",
+        )
+    return _user_settings_etag(row.id, row.version)
+
+def get_user_settings_with_etag(db: Session, user_id: int) -> Tuple[UserSettingsResponse, str]:
+    """User settings and the ETag of the same row version."""
     settings = db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
     if not settings:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User settings not found",
         )
+    return UserSettingsResponse.from_orm(settings), _user_settings_etag(settings.id, settings.version)
 
-    for key, value in updates.dict(exclude_unset=True).items():
-        setattr(settings, key, value)
-
+def update_user_settings(db: Session, user_id: int, updates: UserSettingsUpdate) -> UserSettingsResponse:
+    settings = update_returning(
+        db, UserSettings, [UserSettings.user_id == user_id], _user_settings_changes(updates)
+    )
+    if not settings:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User settings not found",
+        )
     db.commit()
-    db.refresh(settings)
 
     return UserSettingsResponse.from_orm(settings)
 
+def update_user_settings_bulk(db: Session, items: List[dict]) -> BulkResponse:
+    """
+    Aggiorna in blocco le impostazioni di più utenti in una sola transazione.
+    Gli aggiornamenti con gli stessi campi vengono eseguiti con un unico executemany;
+    più elementi per lo stesso utente vengono applicati nell'ordine ricevuto.
+    """
+    valid, results = validate_bulk_items(UserSettingsBulkUpdate, items)
+    user_ids = {item.user_id for _, item in valid}
+    settings_ids = dict(
+        db.query(UserSettings.user_id, UserSettings.id).filter(UserSettings.user_id.in_(user_ids))
+    ) if user_ids else {}
+
+    merged = {}
+    for index, item in valid:
+        if item.user_id not in settings_ids:
+            results.append(BulkItemResult(index=index, status="error", error="User settings not found"))
+            continue
+        merged.setdefault(item.user_id, {}).update(item.dict(exclude_unset=True, exclude={"user_id"}))
+        results.append(BulkItemResult(index=index, status="updated", id=settings_ids[item.user_id]))
+
+    # Un executemany per ogni combinazione di campi aggiornati
+    batches = {}
+    for user_id, values in merged.items():
+        if values:
+            batches.setdefault(tuple(sorted(values)), []).append({"settings_user_id": user_id, **values})
+
+    table = UserSettings.__table__
+    stmt = update(table).where(table.c.user_id == bindparam("settings_user_id")).values(version=table.c.version + 1)
+    for rows in batches.values():
+        db.execute(stmt, rows)
+    db.commit()
+
+    return bulk_response(results)
+
 def delete_user_settings(db: Session, user_id: int):
     settings = db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
     if not settings:
@@ -142,28 +228,213 @@ def delete_user_settings(db: Session, user_id: int):
     db.delete(settings)
     db.commit()
 
+def _login_query(email: str):
+    # Solo le colonne usate dal login, senza caricare l'entità User
+    return select(User.id, User.email, User.password_hash).where(User.email == email)
+
+def _rehash_statement(user, new_hash: str):
+    """
+    Aggiorna l'hash della password al costo bcrypt configurato.
+    Se nel frattempo la password è cambiata l'UPDATE non ha effetto.
+    """
+    return (
+        update(User)
+        .where(User.id == user.id, User.password_hash == user.password_hash)
+        .values(password_hash=new_hash)
+    )
+
+def _find_login_user(db: Session, email: str):
+    user = db.execute(_login_query(email)).first()
+    # La connessione torna al pool mentre bcrypt verifica la password
+    db.rollback()
+    return user
+
+def _complete_login(db: Session, user, new_hash: Optional[str]) -> dict:
+    """Salva l'eventuale nuovo hash e last_login, poi genera i token."""
+    if new_hash:
+        db.execute(_rehash_statement(user, new_hash))
+
+    # last_login fuori dalla risposta, salvo write-behind disattivato
+    if LAST_LOGIN_WRITE_BEHIND:
+        last_login_buffer.add(user.id)
+    else:
+        db.execute(last_login_statement(), {"b_id": user.id, "b_last_login": datetime.utcnow()})
+
+    # Genera i token (il commit salva anche l'eventuale nuovo hash)
+    return issue_tokens(db, user.id, user.email)
+
+
 class UserService:
     @staticmethod
-    def login_user(db: Session, email: str, password: str) -> str:
+    def login_user(db: Session, email: str, password: str) -> dict:
+        """
+        Autentica un utente e genera un token di accesso JWT e un refresh token.
+        """
+        user = db.execute(_login_query(email)).first()
+        if not user or not password_hasher.verify(password, user.password_hash):
+            raise ValueError("Email o password non corretti.")
+
+        new_hash = password_hasher.hash(password) if password_hasher.needs_rehash(user.password_hash) else None
+        return _complete_login(db, user, new_hash)
+
+    @staticmethod
+    async def login_user_pooled(db: Session, email: str, password: str) -> dict:
         """
-        Autentica un utente e genera un token JWT.
+        login_user per le route async con sessione sync: le query girano nel
+        threadpool, mentre verifica e rehash bcrypt vengono attesi dal pool di
+        processi senza tenere occupati un thread né una connessione.
         """
-        user = db.query(User).filter(User.email == email).first()
-        if not user or not bcrypt.checkpw(password.encode(), user.password_hash.encode()):
+        user = await run_in_threadpool(_find_login_user, db, email)
+        if not user or not await password_hasher.verify_async(password, user.password_hash):
             raise ValueError("Email o password non corretti.")
 
-        # Genera il token JWT
-        token_payload = {"user_id": user.id, "email": user.email}
-        token = generate_jwt_token(token_payload)
-        return token
+        new_hash = await password_hasher.hash_async(password) if password_hasher.needs_rehash(user.password_hash) else None
+        return await run_in_threadpool(_complete_login, db, user, new_hash)
 
     @staticmethod
     def verify_token(token: str) -> dict:
         """
-        Verifica e decodifica un token JWT.
+        Verifica e decodifica un token JWT (i token già verificati arrivano dalla cache).
         """
         try:
-            payload = decode_jwt_token(token)
+            payload = verify_access_token(token)
             return payload
         except Exception as e:
             raise ValueError(f"Token non valido: {e}")
+
+
+# Async CRUD Operations for Users (AsyncSession)
+async def create_user_async(db: AsyncSession, user_data: UserCreate) -> UserResponse:
+    validate_email(user_data.email)
+
+    # bcrypt è CPU-bound: gira nel pool di processi senza bloccare l'event loop
+    hashed_password = await password_hasher.hash_async(user_data.password_hash)
+
+    try:
+        new_user = await insert_returning_async(db, User, _new_user_values(user_data, hashed_password))
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise _email_already_registered()
+
+    return UserResponse.from_orm(new_user)
+
+async def get_user_by_id_async(db: AsyncSession, user_id: int) -> UserResponse:
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+    return UserResponse.from_orm(user)
+
+async def update_user_async(db: AsyncSession, user_id: int, updates: UserUpdate) -> UserResponse:
+    user = await update_returning_async(db, User, [User.id == user_id], updates.dict(exclude_unset=True))
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+    await db.commit()
+
+    return UserResponse.from_orm(user)
+
+async def delete_user_async(db: AsyncSession, user_id: int):
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+    await db.delete(user)
+    await db.commit()
+
+# Async CRUD Operations for UserSettings (AsyncSession)
+async def _get_user_settings_row(db: AsyncSession, user_id: int) -> Optional[UserSettings]:
+    result = await db.execute(select(UserSettings).where(UserSettings.user_id == user_id))
+    return result.scalars().first()
+
+async def create_user_settings_async(db: AsyncSession, user_id: int, settings_data: UserSettingsCreate) -> UserSettingsResponse:
+    if await _get_user_settings_row(db, user_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Settings already exist for this user",
+        )
+
+    new_settings = await insert_returning_async(db, UserSettings, {"user_id": user_id, **settings_data.dict()})
+    await db.commit()
+
+    return UserSettingsResponse.from_orm(new_settings)
+
+async def get_user_settings_async(db: AsyncSession, user_id: int) -> UserSettingsResponse:
+    settings = await _get_user_settings_row(db, user_id)
+    if not settings:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User settings not found",
+        )
+    return UserSettingsResponse.from_orm(settings)
+
+async def get_user_settings_etag_async(db: AsyncSession, user_id: int) -> str:
+    result = await db.execute(
+        select(UserSettings.id, UserSettings.version).where(UserSettings.user_id == user_id)
+    )
+    row = result.first()
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User settings not found",
+        )
+    return _user_settings_etag(row.id, row.version)
+
+async def get_user_settings_with_etag_async(db: AsyncSession, user_id: int) -> Tuple[UserSettingsResponse, str]:
+    settings = await _get_user_settings_row(db, user_id)
+    if not settings:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User settings not found",
+        )
+    return UserSettingsResponse.from_orm(settings), _user_settings_etag(settings.id, settings.version)
+
+async def update_user_settings_async(db: AsyncSession, user_id: int, updates: UserSettingsUpdate) -> UserSettingsResponse:
+    settings = await update_returning_async(
+        db, UserSettings, [UserSettings.user_id == user_id], _user_settings_changes(updates)
+    )
+    if not settings:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User settings not found",
+        )
+    await db.commit()
+
+    return UserSettingsResponse.from_orm(settings)
+
+async def delete_user_settings_async(db: AsyncSession, user_id: int):
+    settings = await _get_user_settings_row(db, user_id)
+    if not settings:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User settings not found",
+        )
+    await db.delete(settings)
+    await db.commit()
+
+class AsyncUserService:
+    @staticmethod
+    async def login_user(db: AsyncSession, email: str, password: str) -> dict:
+        """
+        Variante asincrona di UserService.login_user.
+        """
+        user = (await db.execute(_login_query(email))).first()
+        if not user or not await password_hasher.verify_async(password, user.password_hash):
+            raise ValueError("Email o password non corretti.")
+
+        if password_hasher.needs_rehash(user.password_hash):
+            await db.execute(_rehash_statement(user, await password_hasher.hash_async(password)))
+
+        if LAST_LOGIN_WRITE_BEHIND:
+            last_login_buffer.add(user.id)
+        else:
+            await db.execute(last_login_statement(), {"b_id": user.id, "b_last_login": datetime.utcnow()})
+
+        return await issue_tokens_async(db, user.id, user.email)
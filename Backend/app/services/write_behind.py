@@ -0,0 +1,227 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+from app.utils.spill_file import SpillFile
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+T = TypeVar("T")
+
+
+class WriteBehindBuffer(Generic[K, V]):
+    """
+    Base dei buffer write-behind: i valori per chiave vengono accumulati in
+    memoria e scritti con una sola istruzione ogni `flush_interval_ms` o al
+    raggiungimento di `max_entries` chiavi. Un flush fallito rimette il blocco
+    in coda.
+
+    Allo shutdown il buffer viene svuotato, riprovando qualche volta; le voci
+    che non si riesce a scrivere finiscono in `spill_path` e vengono rimesse
+    in coda al successivo avvio.
+
+    Le sottoclassi definiscono merge (due valori della stessa chiave), write
+    (scrittura di un blocco, senza commit) e dump/load (righe del file di spill).
+    """
+
+    # Nome del thread del writer e della voce di stats() con le chiavi in coda
+    thread_name = "write-behind"
+    pending_stat = "pending_keys"
+    # Tentativi del flush finale allo shutdown, con attesa crescente tra l'uno e l'altro
+    FINAL_FLUSH_ATTEMPTS = 3
+    FINAL_FLUSH_BACKOFF_SECONDS = 0.5
+
+    def __init__(self, session_factory: Callable, flush_interval_ms: int, max_entries: int, spill_path: str):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_entries = max_entries
+        self.spill = SpillFile(spill_path)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[K, V] = {}
+        self._inflight: Dict[K, V] = {}
+        # Dispari mentre un flush è in corso: cambia all'inizio e alla fine di ogni flush
+        self._epoch = 0
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+        self.spilled = 0
+
+    def merge(self, current: V, value: V) -> V:
+        """Unisce due valori della stessa chiave, senza modificarli."""
+        raise NotImplementedError
+
+    def write(self, db, batch: Dict[K, V]):
+        """Scrive un blocco nella transazione di `db`; il commit è a carico del buffer."""
+        raise NotImplementedError
+
+    def dump(self, key: K, value: V) -> dict:
+        """Riga JSON del file di spill per una voce."""
+        raise NotImplementedError
+
+    def load(self, row: dict) -> Tuple[K, V]:
+        """Voce corrispondente a una riga del file di spill."""
+        raise NotImplementedError
+
+    def _put(self, key: K, value: V):
+        """Accoda un valore; risveglia il writer se il buffer è pieno."""
+        with self._lock:
+            self._merge_locked(key, value)
+            full = len(self._pending) >= self.max_entries
+        if full:
+            self._wake.set()
+
+    def _merge_locked(self, key: K, value: V):
+        current = self._pending.get(key)
+        self._pending[key] = value if current is None else self.merge(current, value)
+
+    def pending(self, key: K) -> Optional[V]:
+        """
+        Valore non ancora persistito (in coda o in scrittura) per una chiave,
+        da combinare con quanto letto dal database.
+        """
+        with self._lock:
+            return self._pending_locked(key)
+
+    def _pending_locked(self, key: K) -> Optional[V]:
+        inflight, pending = self._inflight.get(key), self._pending.get(key)
+        if inflight is None:
+            return pending
+        return inflight if pending is None else self.merge(inflight, pending)
+
+    def read_with_pending(self, key: K, read: Callable[[], T]) -> Tuple[T, Optional[V]]:
+        """
+        Esegue `read` (lettura della riga dal database) e restituisce anche il
+        valore non persistito, senza che un flush cada tra le due letture:
+        un commit in mezzo farebbe perdere il valore in coda o contarlo due volte.
+        Se un flush era in corso o è iniziato durante la lettura, questa viene
+        ripetuta in attesa che il flush finisca.
+        """
+        with self._lock:
+            epoch = self._epoch
+        if epoch % 2 == 0:
+            value = read()
+            with self._lock:
+                if self._epoch == epoch:
+                    return value, self._pending_locked(key)
+        with self._flush_lock:
+            value = read()
+            with self._lock:
+                return value, self._pending_locked(key)
+
+    def flush(self) -> int:
+        """
+        Scrive le voci accumulate. In caso di errore tornano nel buffer.
+        :return: Numero di chiavi scritte.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+                self._epoch += 1
+
+            db = self.session_factory()
+            try:
+                self.write(db, batch)
+                db.commit()
+            except Exception:
+                db.rollback()
+                self.failed_flushes += 1
+                logger.exception("Flush di %s fallito, %d chiavi rimesse in coda", self.thread_name, len(batch))
+                with self._lock:
+                    self._inflight = {}
+                    self._epoch += 1
+                    for key, value in batch.items():
+                        self._merge_locked(key, value)
+                return 0
+            finally:
+                db.close()
+
+            with self._lock:
+                self._inflight = {}
+                self._epoch += 1
+            self.flushes += 1
+            self.flushed_rows += len(batch)
+            return len(batch)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _spill_pending(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        self.spill.append(json.dumps(self.dump(key, value)) + "\n" for key, value in batch.items())
+        self.spilled += len(batch)
+        logger.error("Flush finale di %s fallito, %d chiavi salvate su %s", self.thread_name, len(batch), self.spill.path)
+
+    def restore_spilled(self) -> int:
+        """
+        Rimette in coda le voci salvate su file da uno shutdown precedente.
+        :return: Numero di chiavi rimesse in coda.
+        """
+        path = self.spill.claim()
+        if path is None:
+            return 0
+        with open(path, encoding="utf-8") as spill_file:
+            entries = [self.load(json.loads(line)) for line in spill_file if line.strip()]
+        with self._lock:
+            for key, value in entries:
+                self._merge_locked(key, value)
+        os.remove(path)
+        return len(entries)
+
+    def start(self):
+        """Avvia il writer in background, dopo aver rimesso in coda le voci salvate su file."""
+        if self._thread and self._thread.is_alive():
+            return
+        try:
+            self.restore_spilled()
+        except Exception:
+            logger.exception("Lettura di %s fallita", self.spill.path)
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Ferma il writer e scrive le voci rimaste. Se il database non risponde,
+        dopo FINAL_FLUSH_ATTEMPTS tentativi finiscono nel file di spill.
+        """
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        for attempt in range(self.FINAL_FLUSH_ATTEMPTS):
+            self.flush()
+            with self._lock:
+                if not self._pending:
+                    return
+            if attempt + 1 < self.FINAL_FLUSH_ATTEMPTS:
+                time.sleep(self.FINAL_FLUSH_BACKOFF_SECONDS * 2 ** attempt)
+        self._spill_pending()
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            self.pending_stat: pending,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_flushes": self.failed_flushes,
+            "spilled": self.spilled,
+        }
@@ -7,10 +7,129 @@ load_dotenv()
 # Database settings
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./talktome.db")
 
+# Modalità asincrona (opzionale): AsyncSession su asyncpg/aiosqlite
+ASYNC_DB_ENABLED = os.getenv("ASYNC_DB_ENABLED", "False").lower() == "true"
+# Se vuoto, viene derivato da DATABASE_URL sostituendo il driver
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "")
+
+# Connection pool settings (ignorati da SQLite, che non usa QueuePool)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # Secondi prima di riciclare una connessione
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))  # Secondi di attesa massima per una connessione
+# Politica di pre-ping: "always", "idle" (solo connessioni inattive) o "never"
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "idle").lower()
+DB_POOL_PRE_PING_IDLE_SECONDS = int(os.getenv("DB_POOL_PRE_PING_IDLE_SECONDS", 30))
+# Connessioni aperte all'avvio (0 per disabilitare il warm-up)
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", DB_POOL_SIZE))
+
+# Read replica settings: URL separati da virgola, vuoto per leggere solo dal primario
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+DB_REPLICA_RETRY_SECONDS = int(os.getenv("DB_REPLICA_RETRY_SECONDS", 30))  # Esclusione di una replica non raggiungibile
+DB_REPLICA_STICKY_SECONDS = int(os.getenv("DB_REPLICA_STICKY_SECONDS", 5))  # Letture sul primario dopo una scrittura
+
+# Bootstrap dello schema all'avvio: "migrate" (applica le migrazioni mancanti),
+# "check" (errore se lo schema non è aggiornato) o "skip"
+DB_BOOTSTRAP = os.getenv("DB_BOOTSTRAP", "migrate").lower()
+
+# Check-in write-behind: incrementi accumulati in memoria e scritti a blocchi
+CHECKIN_WRITE_BEHIND = os.getenv("CHECKIN_WRITE_BEHIND", "False").lower() == "true"
+CHECKIN_FLUSH_INTERVAL_MS = int(os.getenv("CHECKIN_FLUSH_INTERVAL_MS", 500))
+CHECKIN_FLUSH_MAX_ENTRIES = int(os.getenv("CHECKIN_FLUSH_MAX_ENTRIES", 1000))
+CHECKIN_SPILL_PATH = os.getenv("CHECKIN_SPILL_PATH", "checkin_spill.jsonl")  # Incrementi non scritti allo shutdown
+
+# Retention di ai_usage_logs: partizioni mensili su Postgres, DELETE a blocchi su SQLite.
+# I totali dei log rimossi restano nei rollup ai_usage_daily_summary / ai_usage_user_monthly.
+AI_USAGE_RETENTION_ENABLED = os.getenv("AI_USAGE_RETENTION_ENABLED", "False").lower() == "true"
+AI_USAGE_RETENTION_MONTHS = int(os.getenv("AI_USAGE_RETENTION_MONTHS", 12))
+AI_USAGE_PARTITION_MONTHS_AHEAD = int(os.getenv("AI_USAGE_PARTITION_MONTHS_AHEAD", 3))
+AI_USAGE_RETENTION_INTERVAL_SECONDS = int(os.getenv("AI_USAGE_RETENTION_INTERVAL_SECONDS", 3600))
+AI_USAGE_RETENTION_DETACH_ONLY = os.getenv("AI_USAGE_RETENTION_DETACH_ONLY", "False").lower() == "true"  # Stacca senza eliminare
+AI_USAGE_DELETE_CHUNK_SIZE = int(os.getenv("AI_USAGE_DELETE_CHUNK_SIZE", 5000))
+
+# Ingestione asincrona degli AIUsageLog: coda limitata, scrittura a blocchi
+# e file di spill (JSON lines) quando la coda è piena o il database non risponde
+USAGE_INGEST_ASYNC = os.getenv("USAGE_INGEST_ASYNC", "False").lower() == "true"
+USAGE_INGEST_QUEUE_SIZE = int(os.getenv("USAGE_INGEST_QUEUE_SIZE", 10000))
+USAGE_INGEST_BATCH_SIZE = int(os.getenv("USAGE_INGEST_BATCH_SIZE", 500))
+USAGE_INGEST_FLUSH_INTERVAL_MS = int(os.getenv("USAGE_INGEST_FLUSH_INTERVAL_MS", 200))
+USAGE_INGEST_SPILL_PATH = os.getenv("USAGE_INGEST_SPILL_PATH", "ai_usage_spill.jsonl")
+USAGE_INGEST_USE_COPY = os.getenv("USAGE_INGEST_USE_COPY", "True").lower() == "true"  # COPY su Postgres (psycopg2)
+
+# Cache in memoria dei cataloghi (preset, motori, stati emozionali, stanze)
+CATALOG_CACHE_ENABLED = os.getenv("CATALOG_CACHE_ENABLED", "True").lower() == "true"
+CATALOG_CACHE_TTL_SECONDS = int(os.getenv("CATALOG_CACHE_TTL_SECONDS", 300))
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", 256))
+CATALOG_VERSION_POLL_SECONDS = float(os.getenv("CATALOG_VERSION_POLL_SECONDS", 2))  # Invalidazioni dagli altri worker
+
+# Cache degli entitlement premium per utente (scadenza calcolata da end_date)
+ENTITLEMENT_CACHE_ENABLED = os.getenv("ENTITLEMENT_CACHE_ENABLED", "True").lower() == "true"
+ENTITLEMENT_CACHE_TTL_SECONDS = int(os.getenv("ENTITLEMENT_CACHE_TTL_SECONDS", 300))
+ENTITLEMENT_CACHE_MAX_ENTRIES = int(os.getenv("ENTITLEMENT_CACHE_MAX_ENTRIES", 50000))
+ENTITLEMENT_SYNC_POLL_SECONDS = float(os.getenv("ENTITLEMENT_SYNC_POLL_SECONDS", 2))  # Sottoscrizioni modificate dagli altri worker
+
+# Gateway verso i motori AI: client HTTP condiviso per motore, limiti e retry
+AI_GATEWAY_MAX_CONCURRENCY = int(os.getenv("AI_GATEWAY_MAX_CONCURRENCY", 32))  # Chiamate in corso per motore
+AI_GATEWAY_QUEUE_TIMEOUT = float(os.getenv("AI_GATEWAY_QUEUE_TIMEOUT", 5))  # Attesa massima di uno slot libero
+AI_GATEWAY_CONNECT_TIMEOUT = float(os.getenv("AI_GATEWAY_CONNECT_TIMEOUT", 2))
+AI_GATEWAY_READ_TIMEOUT = float(os.getenv("AI_GATEWAY_READ_TIMEOUT", 30))
+AI_GATEWAY_KEEPALIVE_SECONDS = float(os.getenv("AI_GATEWAY_KEEPALIVE_SECONDS", 30))
+AI_GATEWAY_MAX_RETRIES = int(os.getenv("AI_GATEWAY_MAX_RETRIES", 2))
+AI_GATEWAY_BACKOFF_BASE_MS = int(os.getenv("AI_GATEWAY_BACKOFF_BASE_MS", 100))  # Backoff esponenziale con jitter
+AI_GATEWAY_BACKOFF_MAX_MS = int(os.getenv("AI_GATEWAY_BACKOFF_MAX_MS", 2000))
+AI_GATEWAY_HTTP2 = os.getenv("AI_GATEWAY_HTTP2", "True").lower() == "true"
+# Motori e preset del gateway riletti comunque dopo questo intervallo, anche senza invalidazioni
+AI_GATEWAY_CATALOG_TTL_SECONDS = float(os.getenv("AI_GATEWAY_CATALOG_TTL_SECONDS", 60))
+
+# Scelta del motore in base alla latenza dal vivo, con circuit breaker per motore
+AI_ENGINE_EWMA_ALPHA = float(os.getenv("AI_ENGINE_EWMA_ALPHA", 0.2))
+AI_ENGINE_BREAKER_FAILURES = int(os.getenv("AI_ENGINE_BREAKER_FAILURES", 5))  # Errori consecutivi che aprono il circuito
+AI_ENGINE_BREAKER_ERROR_RATE = float(os.getenv("AI_ENGINE_BREAKER_ERROR_RATE", 0.5))
+AI_ENGINE_BREAKER_COOLDOWN_SECONDS = float(os.getenv("AI_ENGINE_BREAKER_COOLDOWN_SECONDS", 30))
+AI_ENGINE_EXPLORE_RATE = float(os.getenv("AI_ENGINE_EXPLORE_RATE", 0.05))  # Chiamate a un motore non in testa
+AI_ENGINE_LATENCY_WRITEBACK_ENABLED = os.getenv("AI_ENGINE_LATENCY_WRITEBACK_ENABLED", "True").lower() == "true"
+AI_ENGINE_LATENCY_WRITEBACK_SECONDS = float(os.getenv("AI_ENGINE_LATENCY_WRITEBACK_SECONDS", 60))  # Scrittura su latency_ms
+
+# Cache delle risposte AI identiche (motore, preset, stato emozionale, payload) con coalescing
+AI_RESPONSE_CACHE_ENABLED = os.getenv("AI_RESPONSE_CACHE_ENABLED", "True").lower() == "true"
+AI_RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("AI_RESPONSE_CACHE_TTL_SECONDS", 300))
+AI_RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("AI_RESPONSE_CACHE_MAX_ENTRIES", 5000))
+
+# Numero massimo di elementi accettati da un endpoint bulk
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", 1000))
+
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your_default_secret_key")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
+ALGORITHM = os.getenv("ALGORITHM", "HS256")  # HS256 (SECRET_KEY), RS256 o EdDSA (chiavi in JWT_KEYS_DIR)
+# Firma asimmetrica: un file PEM per chiave, <kid>.pem. Le chiavi solo pubbliche
+# servono a verificare i token firmati prima di una rotazione.
+JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR", "keys/jwt")
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID", "")  # Vuoto: l'ultima chiave privata in ordine di nome
+# Rilettura di JWT_KEYS_DIR: periodica (0 la disattiva) e, al più con questa frequenza, su un kid sconosciuto
+JWT_KEYS_RELOAD_SECONDS = float(os.getenv("JWT_KEYS_RELOAD_SECONDS", 300))
+JWT_UNKNOWN_KID_RELOAD_SECONDS = float(os.getenv("JWT_UNKNOWN_KID_RELOAD_SECONDS", 30))
+JWKS_MAX_AGE_SECONDS = int(os.getenv("JWKS_MAX_AGE_SECONDS", 300))
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+# Cache dei token già verificati (ogni voce vale fino all'exp del token)
+AUTH_TOKEN_CACHE_ENABLED = os.getenv("AUTH_TOKEN_CACHE_ENABLED", "True").lower() == "true"
+AUTH_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_TOKEN_CACHE_MAX_ENTRIES", 10000))
+
+# Refresh token: rinnovo dei token di accesso senza password, con rotazione a ogni uso
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 30))
+TOKEN_DENYLIST_SYNC_ENABLED = os.getenv("TOKEN_DENYLIST_SYNC_ENABLED", "True").lower() == "true"
+TOKEN_DENYLIST_POLL_SECONDS = float(os.getenv("TOKEN_DENYLIST_POLL_SECONDS", 5))  # Revoche fatte dagli altri worker
+
+# Write-behind di users.last_login (il login non attende la scrittura)
+LAST_LOGIN_WRITE_BEHIND = os.getenv("LAST_LOGIN_WRITE_BEHIND", "True").lower() == "true"
+LAST_LOGIN_FLUSH_INTERVAL_MS = int(os.getenv("LAST_LOGIN_FLUSH_INTERVAL_MS", 1000))
+LAST_LOGIN_FLUSH_MAX_ENTRIES = int(os.getenv("LAST_LOGIN_FLUSH_MAX_ENTRIES", 1000))
+LAST_LOGIN_SPILL_PATH = os.getenv("LAST_LOGIN_SPILL_PATH", "last_login_spill.jsonl")  # Login non scritti allo shutdown
+
+# Hashing delle password: costo bcrypt e pool di processi dedicato
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))  # Gli hash con un costo diverso vengono rigenerati al login
+PASSWORD_HASH_POOL_ENABLED = os.getenv("PASSWORD_HASH_POOL_ENABLED", "True").lower() == "true"
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 64))  # Oltre: 503 con Retry-After
 
 # App settings
 APP_NAME = os.getenv("APP_NAME", "TalkToMe")
@@ -0,0 +1,162 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from app.utils.jwt_utils import JWTUtils
+from app.settings import AUTH_TOKEN_CACHE_ENABLED, AUTH_TOKEN_CACHE_MAX_ENTRIES
+
+
+class VerifiedTokenCache:
+    """
+    LRU dei token JWT già verificati, indicizzati per hash (il token in chiaro
+    non viene conservato). Ogni voce vale fino all'exp del proprio token:
+    una richiesta con un token già visto costa un hash e una lookup, senza
+    verifica della firma.
+    """
+
+    def __init__(self, max_entries: int = 10000, enabled: bool = True):
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[bytes, Tuple[float, dict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        """Claims del token se già verificato e non ancora scaduto."""
+        if not self.enabled:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+        return None
+
+    def put(self, token: str, claims: dict):
+        # Senza exp il token non viene messo in cache: andrebbe riverificato comunque
+        exp = claims.get("exp")
+        if not self.enabled or not isinstance(exp, (int, float)):
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (float(exp), claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Cache condivisa dal worker
+verified_token_cache = VerifiedTokenCache(
+    max_entries=AUTH_TOKEN_CACHE_MAX_ENTRIES,
+    enabled=AUTH_TOKEN_CACHE_ENABLED,
+)
+
+
+class TokenDenylist:
+    """
+    Sessioni revocate (claim "sid" dei token di accesso), ciascuna fino a
+    quando può esistere un token di accesso emesso prima della revoca.
+    Controllata a ogni richiesta, anche per i token già in cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, float] = {}
+
+    def deny(self, session_id: str, until: float):
+        with self._lock:
+            now = time.time()
+            for expired in [sid for sid, deadline in self._entries.items() if deadline <= now]:
+                del self._entries[expired]
+            self._entries[session_id] = max(until, self._entries.get(session_id, 0.0))
+
+    def is_denied(self, session_id: str) -> bool:
+        deadline = self._entries.get(session_id)
+        return deadline is not None and deadline > time.time()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries)}
+
+
+# Denylist condivisa dal worker, alimentata dal servizio dei refresh token
+token_denylist = TokenDenylist()
+
+
+def verify_access_token(token: str) -> dict:
+    """
+    Verifica un token di accesso, usando la cache dei token già verificati.
+    :return: Claims del token (da non modificare: sono condivisi con la cache).
+    :raises ValueError: Se il token è scaduto, invalido o revocato.
+    """
+    claims = verified_token_cache.get(token)
+    if claims is None:
+        claims = JWTUtils.decode_access_token(token)
+        verified_token_cache.put(token, claims)
+    if "sid" in claims and token_denylist.is_denied(claims["sid"]):
+        raise ValueError("Il token è stato revocato.")
+    return claims
+
+
+_bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def get_token_claims(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer_scheme),
+) -> dict:
+    """
+    Dipendenza FastAPI: estrae il bearer token, lo verifica e mette i claims
+    su request.state.token_claims, senza query sul database.
+    :raises HTTPException: 401 se il token manca, è scaduto o è invalido.
+    """
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token di accesso mancante.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    try:
+        claims = verify_access_token(credentials.credentials)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    request.state.token_claims = claims
+    return claims
+
+
+def get_current_user_id(claims: dict = Depends(get_token_claims)) -> int:
+    """
+    Dipendenza FastAPI: ID dell'utente autenticato, letto dai claims del token.
+    """
+    if "user_id" not in claims:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Il token non identifica un utente.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return claims["user_id"]
@@ -0,0 +1,60 @@
+import hashlib
+from typing import Optional
+from fastapi import Response, status
+
+# Cataloghi: condivisibili, ma sempre da rivalidare con If-None-Match
+CATALOG_CACHE_CONTROL = "public, no-cache"
+# Dati del singolo utente: solo nella cache del client
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(body: bytes) -> str:
+    """
+    ETag forte calcolato sul contenuto del body.
+    :param body: Il body della risposta già serializzato.
+    :return: L'ETag tra virgolette, pronto per l'header.
+    """
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Verifica l'header If-None-Match contro l'ETag corrente.
+    Come da RFC 7232 il confronto è debole: W/"x" corrisponde a "x".
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    def opaque(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    return opaque(etag) in {opaque(tag) for tag in if_none_match.split(",")}
+
+
+def not_modified(etag: str, cache_control: str = CATALOG_CACHE_CONTROL) -> Response:
+    """Risposta 304 senza body."""
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
+
+
+def etag_response(
+    body: bytes,
+    etag: str,
+    if_none_match: Optional[str],
+    cache_control: str = CATALOG_CACHE_CONTROL,
+) -> Response:
+    """
+    Restituisce 304 se il client ha già questa versione, altrimenti il body JSON con l'ETag.
+    """
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, cache_control)
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
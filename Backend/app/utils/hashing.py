@@ -0,0 +1,43 @@
+import re
+from typing import Optional
+import bcrypt
+from app.settings import BCRYPT_ROUNDS
+
+# Prefisso di un hash bcrypt: $2b$<costo>$...
+_BCRYPT_COST = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+
+class Hash:
+    @staticmethod
+    def bcrypt(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+        """
+        Genera l'hash bcrypt di una password.
+        :param password: La password in chiaro.
+        :param rounds: Costo bcrypt (log2 delle iterazioni).
+        :return: L'hash, comprensivo di costo e salt.
+        """
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+    @staticmethod
+    def verify(password: str, hashed_password: str) -> bool:
+        """
+        Verifica una password contro il suo hash bcrypt.
+        :return: False anche se l'hash non è un hash bcrypt valido.
+        """
+        try:
+            return bcrypt.checkpw(password.encode(), hashed_password.encode())
+        except ValueError:
+            return False
+
+    @staticmethod
+    def cost(hashed_password: str) -> Optional[int]:
+        """Costo con cui è stato generato un hash bcrypt, None se non riconosciuto."""
+        match = _BCRYPT_COST.match(hashed_password or "")
+        return int(match.group(1)) if match else None
+
+    @staticmethod
+    def needs_rehash(hashed_password: str, rounds: int = BCRYPT_ROUNDS) -> bool:
+        """
+        Verifica se un hash va rigenerato perché creato con un costo diverso da quello configurato.
+        """
+        return Hash.cost(hashed_password) != rounds
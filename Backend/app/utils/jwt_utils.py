@@ -1,7 +1,177 @@
 import jwt
+import json
+import logging
+import os
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Optional
-from app.settings import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from typing import Any, Dict, NamedTuple, Optional
+from app.settings import (
+    SECRET_KEY,
+    ALGORITHM,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    JWT_KEYS_DIR,
+    JWT_ACTIVE_KID,
+    JWT_KEYS_RELOAD_SECONDS,
+    JWT_UNKNOWN_KID_RELOAD_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Algoritmi firmati con SECRET_KEY: verificabili solo da chi conosce il segreto
+SYMMETRIC_ALGORITHMS = {"HS256", "HS384", "HS512"}
+
+
+class SigningKey(NamedTuple):
+    """Chiave del keyring: la parte privata manca per le chiavi solo di verifica."""
+    kid: str
+    algorithm: str
+    private_key: Any
+    public_key: Any
+
+
+def _key_algorithm(public_key) -> str:
+    from cryptography.hazmat.primitives.asymmetric import ed448, ed25519, rsa
+
+    if isinstance(public_key, rsa.RSAPublicKey):
+        return "RS256"
+    if isinstance(public_key, (ed25519.Ed25519PublicKey, ed448.Ed448PublicKey)):
+        return "EdDSA"
+    raise ValueError(f"Tipo di chiave non supportato: {type(public_key).__name__}")
+
+
+def _load_key(kid: str, pem: bytes) -> SigningKey:
+    from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+
+    if b"PRIVATE KEY" in pem:
+        private_key = load_pem_private_key(pem, password=None)
+        public_key = private_key.public_key()
+    else:
+        private_key, public_key = None, load_pem_public_key(pem)
+    return SigningKey(kid, _key_algorithm(public_key), private_key, public_key)
+
+
+class JWTKeyring:
+    """
+    Chiavi asimmetriche per firmare e verificare i token, lette da `keys_dir`.
+    I token firmati portano il kid della chiave attiva nell'header; tutte le
+    chiavi del keyring sono pubblicate nel JWKS, così gli altri servizi
+    verificano i token localmente.
+
+    Rotazione: si aggiunge la nuova chiave e la si rende attiva, mentre la
+    vecchia resta (anche solo come chiave pubblica) finché i token firmati
+    con essa non sono scaduti. La cartella viene riletta ogni `reload_seconds`
+    e quando arriva un token con un kid sconosciuto (firmato da un worker che
+    ha già ruotato), al più una volta ogni `unknown_kid_reload_seconds`.
+    Se una rilettura fallisce restano in uso le chiavi precedenti.
+    """
+
+    def __init__(
+        self,
+        keys_dir: str,
+        active_kid: str = "",
+        algorithm: str = "RS256",
+        reload_seconds: float = 300,
+        unknown_kid_reload_seconds: float = 30,
+    ):
+        self.keys_dir = keys_dir
+        self.active_kid = active_kid
+        self.algorithm = algorithm
+        self.reload_seconds = reload_seconds
+        self.unknown_kid_reload_seconds = unknown_kid_reload_seconds
+        self._lock = threading.Lock()
+        self._keys: Optional[Dict[str, SigningKey]] = None
+        self._active: Optional[SigningKey] = None
+        self._jwks: Optional[bytes] = None
+        self._loaded_at = 0.0
+        self._stale = False
+
+    def _read_keys(self):
+        if not os.path.isdir(self.keys_dir):
+            raise RuntimeError(f"{self.algorithm} richiede le chiavi in JWT_KEYS_DIR ({self.keys_dir}).")
+        keys = {}
+        for filename in sorted(os.listdir(self.keys_dir)):
+            if filename.endswith(".pem"):
+                kid = filename[:-len(".pem")]
+                with open(os.path.join(self.keys_dir, filename), "rb") as key_file:
+                    keys[kid] = _load_key(kid, key_file.read())
+
+        signing = [key for key in keys.values() if key.private_key is not None]
+        active = keys.get(self.active_kid) if self.active_kid else (signing[-1] if signing else None)
+        if active is None or active.private_key is None:
+            raise RuntimeError(f"Nessuna chiave privata attiva in {self.keys_dir}.")
+        if active.algorithm != self.algorithm:
+            raise RuntimeError(f"La chiave {active.kid} è {active.algorithm}, ALGORITHM è {self.algorithm}.")
+        return active, keys
+
+    def _expired(self, now: float) -> bool:
+        return self._stale or (self.reload_seconds > 0 and now - self._loaded_at >= self.reload_seconds)
+
+    def _load(self) -> Dict[str, SigningKey]:
+        with self._lock:
+            now = time.monotonic()
+            if self._keys is not None and not self._expired(now):
+                return self._keys
+            try:
+                active, keys = self._read_keys()
+            except Exception:
+                if self._keys is None:
+                    raise
+                logger.exception("Rilettura del keyring JWT fallita: restano le chiavi precedenti")
+            else:
+                if self._keys is None or keys.keys() != self._keys.keys() or active.kid != self._active.kid:
+                    logger.info("Keyring JWT: %d chiavi, attiva %s", len(keys), active.kid)
+                    self._jwks = None
+                self._active, self._keys = active, keys
+            self._loaded_at, self._stale = now, False
+            return self._keys
+
+    @property
+    def active(self) -> SigningKey:
+        self._load()
+        return self._active
+
+    def get(self, kid: Optional[str]) -> Optional[SigningKey]:
+        if not kid:
+            return None
+        key = self._load().get(kid)
+        if key is None:
+            with self._lock:
+                # Kid sconosciuto: forse una chiave appena ruotata. Riletture limitate,
+                # perché il kid arriva da token non ancora verificati
+                retry = time.monotonic() - self._loaded_at >= self.unknown_kid_reload_seconds
+                self._stale = self._stale or retry
+            if retry:
+                key = self._load().get(kid)
+        return key
+
+    def jwks(self) -> bytes:
+        """JSON del JWKS con le chiavi pubbliche, serializzato a ogni cambio delle chiavi."""
+        signing_keys = self._load()
+        if self._jwks is None:
+            from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+            keys = []
+            for key in signing_keys.values():
+                encoder = RSAAlgorithm if key.algorithm == "RS256" else OKPAlgorithm
+                jwk = encoder.to_jwk(key.public_key, as_dict=True)
+                keys.append({**jwk, "kid": key.kid, "alg": key.algorithm, "use": "sig"})
+            self._jwks = json.dumps({"keys": keys}, separators=(",", ":")).encode()
+        return self._jwks
+
+    def reload(self):
+        """Rilegge le chiavi al prossimo uso (es. subito dopo una rotazione)."""
+        with self._lock:
+            self._stale = True
+
+
+# Keyring del worker, usato solo con ALGORITHM asimmetrico
+jwt_keyring = JWTKeyring(JWT_KEYS_DIR, JWT_ACTIVE_KID, ALGORITHM, JWT_KEYS_RELOAD_SECONDS, JWT_UNKNOWN_KID_RELOAD_SECONDS)
+
+
+def is_asymmetric() -> bool:
+    return ALGORITHM not in SYMMETRIC_ALGORITHMS
+
 
 class JWTUtils:
     @staticmethod
@@ -15,6 +185,9 @@ class JWTUtils:
         to_encode = data.copy()
         expire = datetime.utcnow() + (expires_delta if expires_delta else timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
         to_encode.update({"exp": expire})
+        if is_asymmetric():
+            key = jwt_keyring.active
+            return jwt.encode(to_encode, key.private_key, algorithm=key.algorithm, headers={"kid": key.kid})
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
 
@@ -22,12 +195,19 @@ class JWTUtils:
     def decode_access_token(token: str) -> dict:
         """
         Decodifica e verifica un token JWT.
+        Con firma asimmetrica la chiave è scelta dal kid nell'header e l'algoritmo
+        accettato è solo quello della chiave.
         :param token: Il token JWT da decodificare.
         :return: Payload decodificato del token.
         :raises jwt.ExpiredSignatureError: Se il token è scaduto.
         :raises jwt.InvalidTokenError: Se il token è invalido.
         """
         try:
+            if is_asymmetric():
+                key = jwt_keyring.get(jwt.get_unverified_header(token).get("kid"))
+                if key is None:
+                    raise jwt.InvalidTokenError("kid sconosciuto")
+                return jwt.decode(token, key.public_key, algorithms=[key.algorithm])
             payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
             return payload
         except jwt.ExpiredSignatureError:
@@ -47,3 +227,37 @@ class JWTUtils:
             return True
         except ValueError:
             return False
+
+
+# Scorciatoie usate dai servizi
+def generate_jwt_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    return JWTUtils.create_access_token(data, expires_delta)
+
+
+def decode_jwt_token(token: str) -> dict:
+    return JWTUtils.decode_access_token(token)
+
+
+def generate_signing_key(algorithm: str = "EdDSA") -> bytes:
+    """
+    Genera una chiave privata PEM per il keyring (RSA 2048 per RS256, Ed25519 per EdDSA).
+    Uso: python -m app.utils.jwt_utils EdDSA > keys/jwt/<kid>.pem
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+    if algorithm == "RS256":
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm == "EdDSA":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        raise ValueError(f"Algoritmo non supportato: {algorithm}")
+    return private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.stdout.write(generate_signing_key(sys.argv[1] if len(sys.argv) > 1 else "EdDSA").decode())
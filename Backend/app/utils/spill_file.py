@@ -0,0 +1,71 @@
+import glob
+import os
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo worker per host, nessun lock necessario
+    fcntl = None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class SpillFile:
+    """
+    File append-only (JSON lines) per i record che un writer in background non
+    è riuscito a scrivere sul database, condiviso dai worker dello stesso host.
+
+    Le scritture e la presa in carico avvengono sotto un lock di file (fcntl):
+    claim() sposta il contenuto in un file riservato al processo, così ogni riga
+    viene riprodotta da un solo worker. Il file di un processo terminato a metà
+    replay viene preso in carico dal primo worker che lo trova.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @contextmanager
+    def _locked(self):
+        with open(self.path + ".lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def append(self, lines: Iterable[str]):
+        """Aggiunge righe già terminate da newline."""
+        with self._locked():
+            with open(self.path, "a", encoding="utf-8") as spill:
+                spill.writelines(lines)
+
+    def claim(self) -> Optional[str]:
+        """
+        Prende in carico le righe in attesa.
+        :return: Il percorso del file riservato a questo processo, None se non c'è nulla da riprodurre.
+                 Il chiamante lo rimuove a replay completato.
+        """
+        claimed = f"{self.path}.{os.getpid()}.replay"
+        if os.path.exists(claimed):
+            return claimed
+        with self._locked():
+            for orphan in glob.glob(glob.escape(self.path) + ".*.replay"):
+                pid = orphan[len(self.path) + 1:-len(".replay")]
+                if pid.isdigit() and not _pid_alive(int(pid)):
+                    os.replace(orphan, claimed)
+                    return claimed
+            if not os.path.exists(self.path):
+                return None
+            os.replace(self.path, claimed)
+        return claimed
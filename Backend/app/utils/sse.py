@@ -0,0 +1,27 @@
+import json
+from typing import AsyncIterator, Tuple
+from fastapi.responses import StreamingResponse
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Niente buffering nei reverse proxy (nginx), altrimenti i frammenti arrivano tutti insieme
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(event: str, data: dict) -> bytes:
+    """Un evento Server-Sent Events con dati JSON su una sola riga."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n".encode()
+
+
+async def _encode(events: AsyncIterator[Tuple[str, dict]]) -> AsyncIterator[bytes]:
+    async for event, data in events:
+        yield sse_event(event, data)
+
+
+def sse_response(events: AsyncIterator[Tuple[str, dict]]) -> StreamingResponse:
+    """
+    Risposta text/event-stream: ogni evento viene inviato appena prodotto.
+    Se il client si disconnette Starlette cancella il generatore.
+    """
+    return StreamingResponse(_encode(events), media_type="text/event-stream", headers=SSE_HEADERS)
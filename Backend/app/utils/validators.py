@@ -1,5 +1,9 @@
 import re
+from typing import List, Tuple, Type
 from fastapi import HTTPException, status
+from pydantic import BaseModel, ValidationError
+from app.schemas.bulk_schema import BulkItemResult, BulkResponse
+from app.settings import BULK_MAX_ITEMS
 
 def validate_email(email: str) -> None:
     """
@@ -32,3 +36,39 @@ def validate_subscription_type(subscription_type: str) -> str:
         raise ValueError(f"Invalid subscription_type: {subscription_type}. Must be one of {valid_types}")
     return subscription_type
 
+
+def validate_bulk_items(schema: Type[BaseModel], items: List[dict]) -> Tuple[List[Tuple[int, BaseModel]], List[BulkItemResult]]:
+    """
+    Valida in un solo passaggio gli elementi di una richiesta bulk.
+    Gli elementi non validi vengono scartati singolarmente, senza invalidare l'intera richiesta.
+
+    Args:
+        schema (Type[BaseModel]): Lo schema Pydantic di ciascun elemento.
+        items (List[dict]): Gli elementi ricevuti.
+
+    Returns:
+        Tuple: Le coppie (indice, elemento validato) e gli esiti di errore.
+
+    Raises:
+        HTTPException: Se la richiesta supera BULK_MAX_ITEMS elementi.
+    """
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Massimo {BULK_MAX_ITEMS} elementi per richiesta."
+        )
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, schema.parse_obj(item)))
+        except ValidationError as e:
+            errors.append(BulkItemResult(index=index, status="error", error=str(e)))
+    return valid, errors
+
+def bulk_response(results: List[BulkItemResult]) -> BulkResponse:
+    """
+    Raccoglie gli esiti per elemento nell'ordine della richiesta.
+    """
+    results = sorted(results, key=lambda r: r.index)
+    failed = sum(1 for r in results if r.status == "error")
+    return BulkResponse(succeeded=len(results) - failed, failed=failed, results=results)
@@ -0,0 +1,69 @@
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import engine_from_config, pool
+from app.settings import DATABASE_URL
+
+config = context.config
+
+# Logging da alembic.ini solo quando eseguito da CLI (non dal bootstrap dell'app)
+if config.config_file_name is not None and not config.attributes.get("connection"):
+    fileConfig(config.config_file_name)
+
+config.set_main_option("sqlalchemy.url", DATABASE_URL.replace("%", "%%"))
+
+
+def get_target_metadata():
+    """
+    Metadata dei modelli, necessario solo per --autogenerate.
+    """
+    if not context.config.cmd_opts or not getattr(context.config.cmd_opts, "autogenerate", False):
+        return None
+    from app.db.base import Base
+    return Base.metadata
+
+
+def run_migrations_offline() -> None:
+    """Genera lo script SQL senza connettersi al database."""
+    context.configure(
+        url=config.get_main_option("sqlalchemy.url"),
+        target_metadata=get_target_metadata(),
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=get_target_metadata(),
+        # SQLite non supporta ALTER TABLE completo: le modifiche passano da batch
+        render_as_batch=connection.dialect.name == "sqlite",
+        # Una transazione per migrazione: consente blocchi autocommit (es. CREATE INDEX CONCURRENTLY)
+        transaction_per_migration=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Esegue le migrazioni; riusa la connessione fornita dal bootstrap se presente."""
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        do_run_migrations(connection)
+        return
+
+    connectable = engine_from_config(
+        config.get_section(config.config_ini_section, {}),
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+    with connectable.connect() as connection:
+        do_run_migrations(connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,226 @@
+"""Schema iniziale (equivalente a Base.metadata.create_all)
+
+Revision ID: 0001_initial_schema
+Revises:
+Create Date: 2026-10-18 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_initial_schema'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String(255), nullable=False),
+        sa.Column("password_hash", sa.String(255), nullable=False),
+        sa.Column("display_name", sa.String(100)),
+        sa.Column("avatar_url", sa.Text()),
+        sa.Column("last_login", sa.DateTime()),
+        sa.Column("language", sa.String(10)),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "ai_engines",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("api_endpoint", sa.Text(), nullable=False),
+        sa.Column("api_key", sa.String(255), nullable=False),
+        sa.Column("pricing_model", sa.JSON(), nullable=False),
+        sa.Column("max_tokens", sa.Integer()),
+        sa.Column("latency_ms", sa.Integer()),
+        sa.Column("created_at", sa.TIMESTAMP()),
+        sa.Column("updated_at", sa.TIMESTAMP()),
+    )
+    op.create_index("ix_ai_engines_id", "ai_engines", ["id"])
+
+    op.create_table(
+        "ai_presets",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("gender", sa.String(50)),
+        sa.Column("pitch", sa.Integer()),
+        sa.Column("speech_rate", sa.DECIMAL(3, 2)),
+        sa.Column("accent", sa.String(50)),
+        sa.Column("voice_quality", sa.String(50)),
+        sa.Column("tone", sa.String(50)),
+        sa.Column("formality_level", sa.String(50)),
+        sa.Column("empathy_level", sa.Integer()),
+        sa.Column("focus", sa.String(50)),
+        sa.Column("language", sa.String(10)),
+        sa.Column("proactive_level", sa.Integer()),
+        sa.Column("response_length", sa.String(50)),
+        sa.Column("personality", sa.String(50)),
+        sa.Column("color_theme", sa.String(7)),
+        sa.Column("dynamic_behavior", sa.Boolean()),
+        sa.Column("is_premium", sa.Boolean()),
+        sa.Column("created_at", sa.TIMESTAMP()),
+        sa.Column("updated_at", sa.TIMESTAMP()),
+    )
+    op.create_index("ix_ai_presets_id", "ai_presets", ["id"])
+
+    op.create_table(
+        "emotional_states",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(50), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("color_code", sa.String(7), nullable=False),
+        sa.Column("intensity_levels", sa.JSON()),
+        sa.Column("ai_match", sa.JSON(), nullable=False),
+    )
+    op.create_index("ix_emotional_states_id", "emotional_states", ["id"])
+
+    op.create_table(
+        "rooms",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("base_layer_url", sa.Text(), nullable=False),
+        sa.Column("overlay_layers", sa.JSON()),
+        sa.Column("is_premium", sa.Boolean()),
+        sa.Column("emotional_match", sa.JSON()),
+        sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_rooms_id", "rooms", ["id"])
+
+    op.create_table(
+        "subscriptions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("subscription_type", sa.String(50), nullable=False),
+        sa.Column("start_date", sa.DateTime(), nullable=False),
+        sa.Column("end_date", sa.DateTime()),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("payment_method", sa.String(50)),
+        sa.Column("auto_renew", sa.Boolean()),
+    )
+    op.create_index("ix_subscriptions_id", "subscriptions", ["id"])
+
+    op.create_table(
+        "user_ai_settings",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("ai_preset_id", sa.Integer(), sa.ForeignKey("ai_presets.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("custom_gender", sa.String(50)),
+        sa.Column("custom_pitch", sa.Integer()),
+        sa.Column("custom_speech_rate", sa.Integer()),
+        sa.Column("custom_accent", sa.String(50)),
+        sa.Column("custom_voice_quality", sa.String(50)),
+        sa.Column("custom_tone", sa.String(50)),
+        sa.Column("custom_formality_level", sa.String(50)),
+        sa.Column("custom_empathy_level", sa.Integer()),
+        sa.Column("custom_focus", sa.String(50)),
+        sa.Column("custom_language", sa.String(10)),
+        sa.Column("custom_proactive_level", sa.Integer()),
+        sa.Column("custom_response_length", sa.String(50)),
+        sa.Column("custom_personality", sa.String(50)),
+        sa.Column("custom_color_theme", sa.String(7)),
+        sa.Column("custom_dynamic_behavior", sa.Boolean()),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_user_ai_settings_id", "user_ai_settings", ["id"])
+
+    op.create_table(
+        "users_rooms",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("room_id", sa.Integer(), sa.ForeignKey("rooms.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("customization", sa.Text()),
+    )
+    op.create_index("ix_users_rooms_id", "users_rooms", ["id"])
+
+    op.create_table(
+        "user_settings",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("language", sa.String(10)),
+        sa.Column("notifications_enabled", sa.Boolean()),
+        sa.Column("show_emotion_checkins", sa.Boolean()),
+        sa.Column("dark_mode_enabled", sa.Boolean()),
+        sa.Column("preferred_ai_voice", sa.String(50)),
+        sa.Column("preferred_ai_tone", sa.String(50)),
+        sa.Column("sound_notifications_enabled", sa.Boolean()),
+        sa.Column("default_room_id", sa.Integer(), sa.ForeignKey("rooms.id", ondelete="SET NULL")),
+        sa.Column("receive_checkin_reminder", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_user_settings_id", "user_settings", ["id"])
+
+    op.create_table(
+        "rooms_checkin",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("room_id", sa.Integer(), sa.ForeignKey("rooms.id"), nullable=False),
+        sa.Column("checkin_count", sa.Integer()),
+        sa.Column("last_checkin", sa.TIMESTAMP()),
+        sa.Column("is_random", sa.Boolean()),
+        sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_rooms_checkin_id", "rooms_checkin", ["id"])
+
+    op.create_table(
+        "emotional_states_checkin",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("emotional_state_id", sa.Integer(), sa.ForeignKey("emotional_states.id"), nullable=False),
+        sa.Column("intensity_level", sa.Integer(), nullable=False),
+        sa.Column("notes", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_emotional_states_checkin_id", "emotional_states_checkin", ["id"])
+
+    op.create_table(
+        "ai_usage_logs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("engine_id", sa.Integer(), sa.ForeignKey("ai_engines.id"), nullable=False),
+        sa.Column("preset_id", sa.Integer(), sa.ForeignKey("ai_presets.id")),
+        sa.Column("emotional_state_id", sa.Integer(), sa.ForeignKey("emotional_states.id")),
+        sa.Column("request_payload", sa.JSON(), nullable=False),
+        sa.Column("response_payload", sa.JSON()),
+        sa.Column("cost", sa.DECIMAL(10, 4), nullable=False),
+        sa.Column("premium_discount", sa.DECIMAL(10, 4)),
+        sa.Column("latency_ms", sa.Integer()),
+        sa.Column("status", sa.String(50), nullable=False),
+        sa.Column("error_message", sa.Text()),
+        sa.Column("created_at", sa.TIMESTAMP()),
+    )
+    op.create_index("ix_ai_usage_logs_id", "ai_usage_logs", ["id"])
+
+
+def downgrade() -> None:
+    for table in (
+        "ai_usage_logs",
+        "emotional_states_checkin",
+        "rooms_checkin",
+        "user_settings",
+        "users_rooms",
+        "user_ai_settings",
+        "subscriptions",
+        "rooms",
+        "emotional_states",
+        "ai_presets",
+        "ai_engines",
+        "users",
+    ):
+        op.drop_table(table)
@@ -0,0 +1,55 @@
+"""Indici per le lookup più frequenti dei servizi
+
+Revision ID: 0002_hot_path_indexes
+Revises: 0001_initial_schema
+Create Date: 2026-10-18 10:00:00
+
+"""
+from contextlib import nullcontext
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_hot_path_indexes'
+down_revision = '0001_initial_schema'
+branch_labels = None
+depends_on = None
+
+# (nome, tabella, colonne, unique). I nomi idx_user_room* coincidono con quelli
+# dello schema SQL scritto a mano, così IF NOT EXISTS evita indici duplicati.
+INDEXES = [
+    ("ix_user_settings_user_id", "user_settings", ["user_id"], True),
+    ("ix_user_ai_settings_user_id", "user_ai_settings", ["user_id"], False),
+    ("ix_subscriptions_user_active_type", "subscriptions", ["user_id", "is_active", "subscription_type"], False),
+    ("ix_emotional_states_checkin_user_created", "emotional_states_checkin", ["user_id", "created_at"], False),
+    ("idx_user_room_checkin", "rooms_checkin", ["user_id", "room_id"], False),
+    ("idx_user_room", "users_rooms", ["user_id", "room_id"], False),
+]
+
+
+def _index_block():
+    """
+    Su Postgres gli indici sono creati CONCURRENTLY (fuori transazione)
+    per non bloccare le scritture su tabelle già popolate.
+    """
+    if op.get_bind().dialect.name == "postgresql":
+        return op.get_context().autocommit_block(), "CONCURRENTLY "
+    return nullcontext(), ""
+
+
+def upgrade() -> None:
+    block, concurrently = _index_block()
+    with block:
+        for name, table, columns, unique in INDEXES:
+            op.execute(
+                f"CREATE {'UNIQUE ' if unique else ''}INDEX {concurrently}IF NOT EXISTS "
+                f"{name} ON {table} ({', '.join(columns)})"
+            )
+
+
+def downgrade() -> None:
+    block, concurrently = _index_block()
+    with block:
+        for name, _table, _columns, _unique in reversed(INDEXES):
+            op.execute(f"DROP INDEX {concurrently}IF EXISTS {name}")
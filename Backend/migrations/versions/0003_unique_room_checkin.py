@@ -0,0 +1,49 @@
+"""Vincolo unique su rooms_checkin(user_id, room_id) per l'upsert atomico
+
+Revision ID: 0003_unique_room_checkin
+Revises: 0002_hot_path_indexes
+Create Date: 2026-10-18 11:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_unique_room_checkin'
+down_revision = '0002_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Accorpa i duplicati creati dai check-in concorrenti nella riga con id minore
+    op.execute(
+        """
+        UPDATE rooms_checkin SET
+            checkin_count = (
+                SELECT SUM(COALESCE(d.checkin_count, 0)) FROM rooms_checkin d
+                WHERE d.user_id = rooms_checkin.user_id AND d.room_id = rooms_checkin.room_id
+            ),
+            last_checkin = (
+                SELECT MAX(d.last_checkin) FROM rooms_checkin d
+                WHERE d.user_id = rooms_checkin.user_id AND d.room_id = rooms_checkin.room_id
+            )
+        WHERE id IN (
+            SELECT MIN(id) FROM rooms_checkin GROUP BY user_id, room_id HAVING COUNT(*) > 1
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM rooms_checkin
+        WHERE id NOT IN (SELECT MIN(id) FROM rooms_checkin GROUP BY user_id, room_id)
+        """
+    )
+    op.execute("DROP INDEX IF EXISTS idx_user_room_checkin")
+    op.create_index("uq_rooms_checkin_user_room", "rooms_checkin", ["user_id", "room_id"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("uq_rooms_checkin_user_room", table_name="rooms_checkin")
+    op.create_index("idx_user_room_checkin", "rooms_checkin", ["user_id", "room_id"])
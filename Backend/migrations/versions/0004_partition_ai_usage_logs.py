@@ -0,0 +1,164 @@
+"""Partizionamento mensile di ai_usage_logs e tabella di riepilogo per la retention
+
+Revision ID: 0004_partition_ai_usage_logs
+Revises: 0003_unique_room_checkin
+Create Date: 2026-10-18 12:00:00
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+from app.db.partitions import add_months, ensure_monthly_partitions, month_start
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_partition_ai_usage_logs'
+down_revision = '0003_unique_room_checkin'
+branch_labels = None
+depends_on = None
+
+# Mesi futuri creati subito; i successivi li crea il job di retention
+MONTHS_AHEAD = 3
+
+COLUMNS = """
+    id SERIAL,
+    user_id INTEGER NOT NULL,
+    engine_id INTEGER NOT NULL,
+    preset_id INTEGER,
+    emotional_state_id INTEGER,
+    request_payload JSON NOT NULL,
+    response_payload JSON,
+    cost DECIMAL(10, 4) NOT NULL DEFAULT 0.0,
+    premium_discount DECIMAL(10, 4) DEFAULT 0.0,
+    latency_ms INTEGER,
+    status VARCHAR(50) NOT NULL,
+    error_message TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+"""
+
+COLUMN_NAMES = (
+    "id, user_id, engine_id, preset_id, emotional_state_id, request_payload, response_payload, "
+    "cost, premium_discount, latency_ms, status, error_message"
+)
+
+FOREIGN_KEYS = [
+    ("user_id", "users"),
+    ("engine_id", "ai_engines"),
+    ("preset_id", "ai_presets"),
+    ("emotional_state_id", "emotional_states"),
+]
+
+INDEXES = [
+    ("ix_ai_usage_logs_user_created", ["user_id", "created_at"]),
+    ("ix_ai_usage_logs_engine_created", ["engine_id", "created_at"]),
+]
+
+
+def _rename_legacy_table():
+    # Libera i nomi di pkey e sequence per la nuova tabella
+    op.execute("ALTER TABLE ai_usage_logs RENAME TO ai_usage_logs_legacy")
+    op.execute("ALTER INDEX IF EXISTS ai_usage_logs_pkey RENAME TO ai_usage_logs_legacy_pkey")
+    op.execute("ALTER SEQUENCE IF EXISTS ai_usage_logs_id_seq RENAME TO ai_usage_logs_legacy_id_seq")
+
+
+def _copy_from_legacy():
+    op.execute(
+        f"INSERT INTO ai_usage_logs ({COLUMN_NAMES}, created_at) "
+        f"SELECT {COLUMN_NAMES}, COALESCE(created_at, CURRENT_TIMESTAMP) FROM ai_usage_logs_legacy"
+    )
+    op.execute(
+        "SELECT setval(pg_get_serial_sequence('ai_usage_logs', 'id'), COALESCE(MAX(id), 0) + 1, false) "
+        "FROM ai_usage_logs"
+    )
+    op.execute("DROP TABLE ai_usage_logs_legacy")
+
+
+def _add_constraints():
+    for column, target in FOREIGN_KEYS:
+        op.execute(f"ALTER TABLE ai_usage_logs ADD FOREIGN KEY ({column}) REFERENCES {target} (id)")
+    for name, columns in INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ai_usage_logs ({', '.join(columns)})")
+
+
+def _upgrade_postgresql():
+    bind = op.get_bind()
+    _rename_legacy_table()
+    op.execute(
+        f"CREATE TABLE ai_usage_logs ({COLUMNS}, PRIMARY KEY (id, created_at)) "
+        "PARTITION BY RANGE (created_at)"
+    )
+
+    # Una partizione per ogni mese dei dati esistenti, più i mesi futuri
+    oldest = bind.execute(sa.text("SELECT MIN(created_at) FROM ai_usage_logs_legacy")).scalar()
+    current = month_start(datetime.utcnow().date())
+    first = month_start(oldest.date()) if oldest else current
+    ensure_monthly_partitions(bind, "ai_usage_logs", first, add_months(current, MONTHS_AHEAD))
+    op.execute("CREATE TABLE IF NOT EXISTS ai_usage_logs_default PARTITION OF ai_usage_logs DEFAULT")
+
+    _copy_from_legacy()
+    _add_constraints()
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ai_usage_daily_summary",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("engine_id", sa.Integer(), nullable=False),
+        sa.Column("preset_id", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("calls", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("success_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("failure_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("total_cost", sa.DECIMAL(14, 4), nullable=False, server_default="0"),
+        sa.Column("total_premium_discount", sa.DECIMAL(14, 4), nullable=False, server_default="0"),
+        sa.Column("total_latency_ms", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.TIMESTAMP()),
+    )
+    op.create_index("ix_ai_usage_daily_summary_id", "ai_usage_daily_summary", ["id"])
+    op.create_index(
+        "uq_ai_usage_daily_summary_key",
+        "ai_usage_daily_summary",
+        ["day", "user_id", "engine_id", "preset_id"],
+        unique=True,
+    )
+
+    if op.get_bind().dialect.name == "postgresql":
+        _upgrade_postgresql()
+        return
+
+    # Senza partizionamento nativo la retention elimina a blocchi per created_at
+    op.execute("UPDATE ai_usage_logs SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    for name, columns in INDEXES:
+        op.create_index(name, "ai_usage_logs", columns)
+    op.create_index("ix_ai_usage_logs_created_at", "ai_usage_logs", ["created_at"])
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("ALTER TABLE ai_usage_logs RENAME TO ai_usage_logs_partitioned")
+        op.execute("ALTER INDEX IF EXISTS ai_usage_logs_pkey RENAME TO ai_usage_logs_partitioned_pkey")
+        for name, _columns in INDEXES:
+            op.execute(f"DROP INDEX IF EXISTS {name}")
+        op.execute("ALTER SEQUENCE IF EXISTS ai_usage_logs_id_seq RENAME TO ai_usage_logs_partitioned_id_seq")
+        op.execute(f"CREATE TABLE ai_usage_logs ({COLUMNS}, PRIMARY KEY (id))")
+        op.execute(
+            f"INSERT INTO ai_usage_logs ({COLUMN_NAMES}, created_at) "
+            f"SELECT {COLUMN_NAMES}, created_at FROM ai_usage_logs_partitioned"
+        )
+        op.execute(
+            "SELECT setval(pg_get_serial_sequence('ai_usage_logs', 'id'), COALESCE(MAX(id), 0) + 1, false) "
+            "FROM ai_usage_logs"
+        )
+        op.execute("DROP TABLE ai_usage_logs_partitioned")
+        for column, target in FOREIGN_KEYS:
+            op.execute(f"ALTER TABLE ai_usage_logs ADD FOREIGN KEY ({column}) REFERENCES {target} (id)")
+        op.create_index("ix_ai_usage_logs_id", "ai_usage_logs", ["id"])
+    else:
+        op.drop_index("ix_ai_usage_logs_created_at", table_name="ai_usage_logs")
+        for name, _columns in INDEXES:
+            op.drop_index(name, table_name="ai_usage_logs")
+
+    op.drop_index("uq_ai_usage_daily_summary_key", table_name="ai_usage_daily_summary")
+    op.drop_index("ix_ai_usage_daily_summary_id", table_name="ai_usage_daily_summary")
+    op.drop_table("ai_usage_daily_summary")
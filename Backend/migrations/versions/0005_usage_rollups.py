@@ -0,0 +1,82 @@
+"""Rollup di ai_usage_logs: giornaliero per utente/motore/preset e mensile per utente
+
+Revision ID: 0005_usage_rollups
+Revises: 0004_partition_ai_usage_logs
+Create Date: 2026-10-18 13:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_usage_rollups'
+down_revision = '0004_partition_ai_usage_logs'
+branch_labels = None
+depends_on = None
+
+TOTALS = "calls, success_count, failure_count, total_cost, total_premium_discount, total_latency_ms"
+
+ADD_TOTALS = ", ".join(
+    f"{column} = {{table}}.{column} + excluded.{column}" for column in TOTALS.split(", ")
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ai_usage_user_monthly",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("month", sa.Date(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("calls", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("success_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("failure_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("total_cost", sa.DECIMAL(14, 4), nullable=False, server_default="0"),
+        sa.Column("total_premium_discount", sa.DECIMAL(14, 4), nullable=False, server_default="0"),
+        sa.Column("total_latency_ms", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.TIMESTAMP()),
+    )
+    op.create_index("ix_ai_usage_user_monthly_id", "ai_usage_user_monthly", ["id"])
+    op.create_index("uq_ai_usage_user_monthly_key", "ai_usage_user_monthly", ["user_id", "month"], unique=True)
+
+    # Il riepilogo giornaliero contiene già i log rimossi dalla retention:
+    # si aggiungono quelli ancora presenti, da qui in poi mantenuti in scrittura
+    op.execute(
+        f"""
+        INSERT INTO ai_usage_daily_summary (day, user_id, engine_id, preset_id, {TOTALS}, updated_at)
+        SELECT date(created_at), user_id, engine_id, COALESCE(preset_id, 0),
+            COUNT(*),
+            SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END),
+            SUM(CASE WHEN status = 'success' THEN 0 ELSE 1 END),
+            COALESCE(SUM(cost), 0), COALESCE(SUM(premium_discount), 0), COALESCE(SUM(latency_ms), 0),
+            CURRENT_TIMESTAMP
+        FROM ai_usage_logs
+        WHERE 1 = 1
+        GROUP BY date(created_at), user_id, engine_id, COALESCE(preset_id, 0)
+        ON CONFLICT (day, user_id, engine_id, preset_id) DO UPDATE SET
+            {ADD_TOTALS.format(table="ai_usage_daily_summary")}, updated_at = excluded.updated_at
+        """
+    )
+
+    if op.get_bind().dialect.name == "postgresql":
+        month = "CAST(date_trunc('month', day) AS DATE)"
+    else:
+        month = "date(day, 'start of month')"
+    op.execute(
+        f"""
+        INSERT INTO ai_usage_user_monthly (month, user_id, {TOTALS}, updated_at)
+        SELECT {month}, user_id,
+            SUM(calls), SUM(success_count), SUM(failure_count),
+            SUM(total_cost), SUM(total_premium_discount), SUM(total_latency_ms),
+            CURRENT_TIMESTAMP
+        FROM ai_usage_daily_summary
+        GROUP BY {month}, user_id
+        """
+    )
+
+
+def downgrade() -> None:
+    # I totali aggiunti ad ai_usage_daily_summary restano: la tabella è rimossa da 0004
+    op.drop_index("uq_ai_usage_user_monthly_key", table_name="ai_usage_user_monthly")
+    op.drop_index("ix_ai_usage_user_monthly_id", table_name="ai_usage_user_monthly")
+    op.drop_table("ai_usage_user_monthly")
@@ -0,0 +1,29 @@
+"""Versioni dei cataloghi per l'invalidazione della cache tra worker
+
+Revision ID: 0006_catalog_versions
+Revises: 0005_usage_rollups
+Create Date: 2026-10-18 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_catalog_versions'
+down_revision = '0005_usage_rollups'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "catalog_versions",
+        sa.Column("name", sa.String(50), primary_key=True),
+        sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("catalog_versions")
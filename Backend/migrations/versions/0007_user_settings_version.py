@@ -0,0 +1,27 @@
+"""Versione di riga su user_settings per gli ETag delle GET condizionali
+
+Revision ID: 0007_user_settings_version
+Revises: 0006_catalog_versions
+Create Date: 2026-10-18 15:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_user_settings_version'
+down_revision = '0006_catalog_versions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "user_settings",
+        sa.Column("version", sa.Integer(), nullable=False, server_default="1"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("user_settings", "version")
@@ -0,0 +1,26 @@
+"""Micro-batching per motore: dimensione massima e finestra di attesa del batch
+
+Revision ID: 0009_engine_batching
+Revises: 0008_refresh_tokens
+Create Date: 2026-10-18 21:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_engine_batching'
+down_revision = '0008_refresh_tokens'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("ai_engines", sa.Column("batch_max_size", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("ai_engines", sa.Column("batch_window_ms", sa.Integer(), nullable=False, server_default="15"))
+
+
+def downgrade() -> None:
+    op.drop_column("ai_engines", "batch_window_ms")
+    op.drop_column("ai_engines", "batch_max_size")
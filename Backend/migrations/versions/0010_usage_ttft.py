@@ -0,0 +1,25 @@
+"""Tempo al primo frammento (TTFT) negli AIUsageLog delle risposte in streaming
+
+Revision ID: 0010_usage_ttft
+Revises: 0009_engine_batching
+Create Date: 2026-10-18 23:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010_usage_ttft'
+down_revision = '0009_engine_batching'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Su Postgres la colonna aggiunta alla tabella partizionata passa anche alle partizioni
+    op.add_column("ai_usage_logs", sa.Column("ttft_ms", sa.Integer()))
+
+
+def downgrade() -> None:
+    op.drop_column("ai_usage_logs", "ttft_ms")
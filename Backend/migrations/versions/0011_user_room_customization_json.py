@@ -0,0 +1,37 @@
+"""users_rooms.customization come JSON, allineato al modello e agli schemi SQL
+
+Revision ID: 0011_user_room_customization_json
+Revises: 0010_usage_ttft
+Create Date: 2026-10-18 23:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011_user_room_customization_json'
+down_revision = '0010_usage_ttft'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # SQLite non distingue TEXT e JSON: la colonna resta invariata
+    if op.get_bind().dialect.name == "sqlite":
+        return
+    op.alter_column(
+        "users_rooms", "customization",
+        type_=sa.JSON(), existing_type=sa.Text(),
+        postgresql_using="customization::json",
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        return
+    op.alter_column(
+        "users_rooms", "customization",
+        type_=sa.Text(), existing_type=sa.JSON(),
+        postgresql_using="customization::text",
+    )
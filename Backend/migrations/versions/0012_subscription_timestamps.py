@@ -0,0 +1,31 @@
+"""created_at/updated_at su subscriptions: modifiche recenti lette per invalidare gli entitlement
+
+Revision ID: 0012_subscription_timestamps
+Revises: 0011_user_room_customization_json
+Create Date: 2026-10-19 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012_subscription_timestamps'
+down_revision = '0011_user_room_customization_json'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Gli schemi SQL scritti a mano hanno già le due colonne
+    existing = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("subscriptions")}
+    for name in ("created_at", "updated_at"):
+        if name not in existing:
+            op.add_column("subscriptions", sa.Column(name, sa.DateTime(), server_default=sa.func.now()))
+    op.create_index("ix_subscriptions_updated_at", "subscriptions", ["updated_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_subscriptions_updated_at", table_name="subscriptions")
+    op.drop_column("subscriptions", "updated_at")
+    op.drop_column("subscriptions", "created_at")
@@ -0,0 +1,87 @@
+"""
+Benchmark di registrazione e login attraverso l'app (TestClient, richieste in
+sequenza) con il conteggio degli statement SQL per operazione, più la sola
+lookup del login: entità User completa contro le tre colonne lette dal login.
+
+Uso (database SQLite temporaneo, bcrypt a costo 4 perché domini il database):
+    python -m tests.bench_auth --users 300
+
+DATABASE_URL e BCRYPT_ROUNDS impostati nell'ambiente hanno la precedenza.
+"""
+import argparse
+import os
+import tempfile
+import time
+import uuid
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "talktome_bench.db"))
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.db.session import SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services.user_service import _login_query  # noqa: E402
+
+PASSWORD = "bench-password"
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def _timed(label: str, operations: int, counter: StatementCounter, run):
+    counter.count = 0
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {operations / elapsed:.0f}/s, {counter.count / operations:.1f} statements each")
+
+
+def _lookup_us(emails: list, query) -> float:
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        for email in emails:
+            query(db, email)
+        return (time.perf_counter() - start) / len(emails) * 1e6
+    finally:
+        db.close()
+
+
+def bench(users: int):
+    emails = [f"bench-{uuid.uuid4().hex}@example.com" for _ in range(users)]
+    counter = StatementCounter()
+    with TestClient(app) as client:
+        event.listen(engine, "before_cursor_execute", counter)
+
+        def register():
+            for email in emails:
+                response = client.post("/users/users/", json={"email": email, "password_hash": PASSWORD})
+                assert response.status_code == 201, response.text
+
+        def login():
+            for email in emails:
+                response = client.post("/users/login/", params={"email": email, "password": PASSWORD})
+                assert response.status_code == 200, response.text
+
+        _timed("registration", users, counter, register)
+        _timed("login", users, counter, login)
+        event.remove(engine, "before_cursor_execute", counter)
+
+        entity = _lookup_us(emails, lambda db, email: db.query(User).filter(User.email == email).first())
+        columns = _lookup_us(emails, lambda db, email: db.execute(_login_query(email)).first())
+        print(f"login lookup: {entity:.0f} us (ORM User) -> {columns:.0f} us (3 columns)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=300)
+    args = parser.parse_args()
+    bench(args.users)
@@ -0,0 +1,107 @@
+"""
+Benchmark del login sotto carico attraverso l'app: `--logins` login concorrenti
+mentre una sonda chiama in sequenza un endpoint economico (/health/db-pool,
+route sync servita dal threadpool) e ne misura la latenza.
+
+Confronta due percorsi di login:
+- blocking: la route sync di prima, che attende bcrypt con .result() tenendo
+  occupato un posto del threadpool per tutta la verifica;
+- awaiting: la route async /users/login/, che attende il pool di processi e usa
+  il threadpool solo per le query.
+
+Uso (database SQLite temporaneo):
+    python -m tests.bench_password_hasher --users 50 --logins 200
+
+DATABASE_URL, BCRYPT_ROUNDS e PASSWORD_HASH_WORKERS impostati nell'ambiente hanno la precedenza.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "talktome_bench.db"))
+os.environ.setdefault("BCRYPT_ROUNDS", "10")
+os.environ.setdefault("PASSWORD_HASH_MAX_PENDING", "100000")
+
+import httpx  # noqa: E402
+from fastapi import Depends, HTTPException  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.db.session import get_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services.user_service import UserService  # noqa: E402
+
+PASSWORD = "bench-password"
+PROBE_PATH = "/health/db-pool"
+
+
+def _blocking_login(email: str, password: str, db: Session = Depends(get_db)):
+    # Percorso precedente: route sync, bcrypt atteso con .result() in un thread del threadpool
+    try:
+        return UserService.login_user(db, email, password)
+    except ValueError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+
+app.add_api_route("/bench/login-blocking", _blocking_login, methods=["POST"])
+
+
+def _percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def _probe(client: httpx.AsyncClient, stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get(PROBE_PATH)
+        assert response.status_code == 200, response.text
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.005)
+
+
+async def _run(client: httpx.AsyncClient, path: str, emails: list, logins: int) -> dict:
+    async def login(email: str):
+        response = await client.post(path, params={"email": email, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+
+    latencies, stop = [], asyncio.Event()
+    probe = asyncio.create_task(_probe(client, stop, latencies))
+    start = time.perf_counter()
+    await asyncio.gather(*(login(emails[i % len(emails)]) for i in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+    return {
+        "logins_per_s": round(logins / elapsed, 1),
+        "probe_requests": len(latencies),
+        "probe_p50_ms": round(_percentile(latencies, 0.5), 1),
+        "probe_p99_ms": round(_percentile(latencies, 0.99), 1),
+        "probe_max_ms": round(max(latencies, default=0.0), 1),
+    }
+
+
+async def bench(users: int, logins: int):
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            emails = [f"bench-{uuid.uuid4().hex}@example.com" for _ in range(users)]
+            for email in emails:
+                response = await client.post("/users/users/", json={"email": email, "password_hash": PASSWORD})
+                assert response.status_code == 201, response.text
+
+            for mode, path in (("blocking", "/bench/login-blocking"), ("awaiting", "/users/login/")):
+                print(f"{mode}: {await _run(client, path, emails, logins)}")
+    finally:
+        await app.router.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(bench(args.users, args.logins))
@@ -0,0 +1,86 @@
+import os
+import socket
+import tempfile
+import uuid
+
+import pytest
+
+# Database dei test: TEST_DATABASE_URL se impostato, altrimenti un file SQLite temporaneo.
+# Va impostato prima di importare app, che legge DATABASE_URL all'import
+os.environ["DATABASE_URL"] = os.getenv(
+    "TEST_DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "talktome_test.db")
+)
+# File di spill dei buffer nella stessa cartella temporanea, non nella directory di lavoro
+_spill_dir = tempfile.mkdtemp()
+for _setting, _name in (
+    ("CHECKIN_SPILL_PATH", "checkin_spill.jsonl"),
+    ("USAGE_INGEST_SPILL_PATH", "ai_usage_spill.jsonl"),
+    ("LAST_LOGIN_SPILL_PATH", "last_login_spill.jsonl"),
+):
+    os.environ.setdefault(_setting, os.path.join(_spill_dir, _name))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.db.session import SessionLocal  # noqa: E402
+from app.models.ai import AIEngine  # noqa: E402
+from app.models.room import Room  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def stub_engine_url():
+    """Endpoint di tests/stub_engine.py servito da uvicorn su una porta libera."""
+    from tests import stub_engine
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = stub_engine._serve_in_background(port)
+    yield f"http://127.0.0.1:{port}/v1/generate"
+    server.should_exit = True
+
+
+@pytest.fixture(scope="session")
+def client():
+    # Il context manager esegue gli hook di startup (migrazioni comprese) e di shutdown
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def db(client):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(db):
+    user = User(email=f"user{uuid.uuid4().hex}@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def room(db):
+    room = Room(name="Test room", base_layer_url="https://example.com/base.png", emotional_match={"calm": 50})
+    db.add(room)
+    db.commit()
+    return room
+
+
+@pytest.fixture
+def ai_engine(db):
+    engine = AIEngine(
+        name=f"engine-{uuid.uuid4().hex[:8]}",
+        api_endpoint="http://127.0.0.1:9/v1/generate",
+        api_key="test",
+        pricing_model={"type": "per_call", "cost_per_call": 0.01},
+    )
+    db.add(engine)
+    db.commit()
+    return engine
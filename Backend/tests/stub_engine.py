@@ -0,0 +1,155 @@
+"""
+Motore AI locale per test e benchmark del gateway, senza rete.
+
+Avvio del solo stub:
+    python -m tests.stub_engine serve --port 9001
+    (api_endpoint del motore: http://127.0.0.1:9001/v1/generate)
+
+Benchmark del gateway contro lo stub (nessun database, usage log esclusi):
+    python -m tests.stub_engine bench --calls 2000 --concurrency 64
+
+Latenza ed errori simulati: STUB_ENGINE_LATENCY_MS, STUB_ENGINE_JITTER_MS,
+STUB_ENGINE_ERROR_RATE (0-1, risposte 503). Un body {"batch": [...]} riceve
+{"results": [...]}, con la latenza di una sola generazione più
+STUB_ENGINE_BATCH_ITEM_MS per elemento. Con "stream": true la risposta è un
+text/event-stream di frammenti {"delta": ...} (una parola dell'input, anche
+più volte, ogni STUB_ENGINE_TOKEN_MS) chiuso da [DONE].
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+LATENCY_MS = float(os.getenv("STUB_ENGINE_LATENCY_MS", 20))
+JITTER_MS = float(os.getenv("STUB_ENGINE_JITTER_MS", 5))
+ERROR_RATE = float(os.getenv("STUB_ENGINE_ERROR_RATE", 0))
+BATCH_ITEM_MS = float(os.getenv("STUB_ENGINE_BATCH_ITEM_MS", 1))
+TOKEN_MS = float(os.getenv("STUB_ENGINE_TOKEN_MS", 20))
+
+
+def _generate(payload: dict) -> dict:
+    prompt = str(payload.get("input", ""))
+    return {"output": prompt[::-1], "tokens": min(len(prompt), payload.get("max_tokens") or 256)}
+
+
+async def app(scope, receive, send):
+    """
+    App ASGI minima (niente FastAPI): il costo misurato dal benchmark è
+    quello del gateway, non quello dello stub. Ogni POST viene trattata come
+    una generazione.
+    """
+    if scope["type"] != "http":
+        return
+    body, more = b"", True
+    while more:
+        message = await receive()
+        body += message.get("body", b"")
+        more = message.get("more_body", False)
+    payload = json.loads(body or b"{}")
+    batch = payload.get("batch")
+
+    latency_ms = LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS) + BATCH_ITEM_MS * len(batch or ())
+    await asyncio.sleep(max(0.0, latency_ms) / 1000)
+    if random.random() < ERROR_RATE:
+        status, response = 503, {"error": "overloaded"}
+    elif payload.get("stream"):
+        await _stream(payload, receive, send)
+        return
+    elif batch is not None:
+        status, response = 200, {"results": [_generate(item) for item in batch]}
+    else:
+        status, response = 200, _generate(payload)
+
+    content = json.dumps(response).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(content)).encode())],
+    })
+    await send({"type": "http.response.body", "body": content})
+
+
+async def _stream(payload: dict, receive, send):
+    words = str(payload.get("input", "")).split() or ["..."]
+    tokens = [f"{words[i % len(words)]} " for i in range(payload.get("max_tokens") or 256)]
+    disconnected = asyncio.Event()
+
+    async def watch():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+
+    watcher = asyncio.ensure_future(watch())
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream")]})
+    sent = 0
+    try:
+        for token in tokens:
+            if disconnected.is_set():
+                print(f"stub: stream interrotto dal client dopo {sent}/{len(tokens)} frammenti", flush=True)
+                return
+            await send({"type": "http.response.body", "body": f"data: {json.dumps({'delta': token})}\n\n".encode(),
+                        "more_body": True})
+            sent += 1
+            await asyncio.sleep(TOKEN_MS / 1000)
+        await send({"type": "http.response.body", "body": b"data: [DONE]\n\n"})
+    finally:
+        watcher.cancel()
+
+
+def serve(port: int):
+    import uvicorn
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off")
+
+
+def _serve_in_background(port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def _bench(port: int, calls: int, concurrency: int):
+    from app.services.ai_gateway import ai_gateway, EngineSpec
+
+    engine = EngineSpec(0, "stub", f"http://127.0.0.1:{port}/v1/generate", "stub-key", 256, {"type": "free"}, 0)
+    latencies = []
+    pending = iter(range(calls))
+
+    async def worker():
+        for i in pending:
+            started = time.perf_counter()
+            await ai_gateway.request(engine, {"input": f"hello {i}"})
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    await ai_gateway.aclose()
+
+    latencies.sort()
+    print(f"{calls} calls, concurrency {concurrency}: {calls / elapsed:.0f} calls/s, "
+          f"p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms, "
+          f"stub latency {LATENCY_MS:.0f}±{JITTER_MS:.0f} ms")
+    print(ai_gateway.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["serve", "bench"])
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args.port)
+    else:
+        _serve_in_background(args.port)
+        asyncio.run(_bench(args.port, args.calls, args.concurrency))
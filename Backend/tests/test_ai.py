@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+from app.models.ai import AIEngine
+from app.models.catalog import CatalogVersion
+from app.services import ai_gateway
+from app.services.catalog_cache import catalog_cache
+from app.services.entitlement_cache import FREE_ENTITLEMENT, entitlement_cache, load_entitlement
+
+
+def test_load_entitlement_without_request_session(client):
+    # Utente senza sottoscrizioni: free, calcolato con una sessione breve e poi servito dalla cache
+    assert load_entitlement(987654) == FREE_ENTITLEMENT
+    hits = entitlement_cache.hits
+    assert load_entitlement(987654) == FREE_ENTITLEMENT
+    assert entitlement_cache.hits == hits + 1
+
+
+def _new_engine(db) -> int:
+    # Motore aggiunto da un altro worker: nessuna invalidazione in questo processo
+    engine = AIEngine(
+        name="other-worker", api_endpoint="http://127.0.0.1:9/v1/generate", api_key="test",
+        pricing_model={"type": "free"},
+    )
+    db.add(engine)
+    db.commit()
+    return engine.id
+
+
+def test_gateway_engines_expire_after_ttl(db, monkeypatch):
+    asyncio.run(ai_gateway.get_engines())
+    engine_id = _new_engine(db)
+    assert engine_id not in asyncio.run(ai_gateway.get_engines())
+
+    later = time.monotonic() + ai_gateway.AI_GATEWAY_CATALOG_TTL_SECONDS + 1
+    monkeypatch.setattr(ai_gateway.time, "monotonic", lambda: later)
+    assert engine_id in asyncio.run(ai_gateway.get_engines())
+
+
+def test_gateway_engines_follow_versions_with_cache_disabled(db, monkeypatch):
+    # La versione scritta da un altro worker arriva anche con CATALOG_CACHE_ENABLED=false
+    monkeypatch.setattr(catalog_cache, "enabled", False)
+    catalog_cache.poll_versions()
+    asyncio.run(ai_gateway.get_engines())
+    engine_id = _new_engine(db)
+
+    row = db.get(CatalogVersion, ai_gateway.ENGINES_CATALOG)
+    if row:
+        row.version += 1
+    else:
+        db.add(CatalogVersion(name=ai_gateway.ENGINES_CATALOG, version=1))
+    db.commit()
+    catalog_cache.poll_versions()
+    assert engine_id in asyncio.run(ai_gateway.get_engines())
@@ -0,0 +1,17 @@
+from sqlalchemy.orm import configure_mappers
+
+
+def test_models_configure():
+    # Relationship e back_populates di tutti i modelli si risolvono
+    configure_mappers()
+
+
+def test_startup_and_health(client):
+    response = client.get("/health/db-pool")
+    assert response.status_code == 200
+
+
+def test_ai_engines_listed(client):
+    response = client.get("/ai/engines")
+    assert response.status_code == 200
+    assert isinstance(response.json(), list)
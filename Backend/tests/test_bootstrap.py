@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from app.db.bootstrap import bootstrap_schema, get_current_revision, get_head_revision
+
+
+@pytest.fixture
+def empty_engine():
+    engine = create_engine("sqlite:///" + os.path.join(tempfile.mkdtemp(), "bootstrap.db"))
+    yield engine
+    engine.dispose()
+
+
+def _revision(engine):
+    with engine.connect() as connection:
+        return get_current_revision(connection)
+
+
+def test_check_refuses_unmigrated_database(empty_engine):
+    with pytest.raises(RuntimeError, match="non aggiornato"):
+        bootstrap_schema(empty_engine, "check")
+    # Nessuna DDL in modalità check
+    assert inspect(empty_engine).get_table_names() == []
+
+
+def test_migrate_then_check(empty_engine):
+    head = get_head_revision()
+    assert bootstrap_schema(empty_engine, "migrate") == head
+    assert _revision(empty_engine) == head
+    assert "users" in inspect(empty_engine).get_table_names()
+    # Con lo schema aggiornato anche la modalità check parte
+    assert bootstrap_schema(empty_engine, "check") == head
+
+
+def test_skip_does_not_touch_database(empty_engine):
+    assert bootstrap_schema(empty_engine, "skip") is None
+    assert _revision(empty_engine) is None
+
+
+def test_startup_refuses_unmigrated_database_in_check_mode(client, empty_engine, monkeypatch):
+    from app import main
+
+    monkeypatch.setattr(main, "engine", empty_engine)
+    monkeypatch.setattr(main, "DB_BOOTSTRAP", "check")
+    with pytest.raises(RuntimeError):
+        main.bootstrap_database()
@@ -0,0 +1,74 @@
+import uuid
+
+import pytest
+
+from app.models.catalog import CatalogVersion
+from app.services.catalog_cache import catalog_cache, invalidate_catalog
+
+
+class Loader:
+    """Loader finto di un catalogo: conta le letture dal database."""
+
+    def __init__(self):
+        self.loads = 0
+
+    def __call__(self) -> bytes:
+        self.loads += 1
+        return f'{{"load":{self.loads}}}'.encode()
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    # Catalogo con nome univoco: le invalidazioni degli altri test non lo toccano
+    monkeypatch.setattr(catalog_cache, "enabled", True)
+    return f"test_catalog_{uuid.uuid4().hex[:8]}"
+
+
+def _db_version(db, name: str):
+    db.expire_all()
+    row = db.get(CatalogVersion, name)
+    return row.version if row else None
+
+
+def test_invalidation_applies_after_commit(db, catalog):
+    loader = Loader()
+    first = catalog_cache.get(catalog, "all", loader)
+    assert catalog_cache.get(catalog, "all", loader) == first and loader.loads == 1
+
+    invalidate_catalog(db, catalog)
+    # Prima del commit la scrittura non è visibile: la voce in cache resta valida
+    assert catalog_cache.get(catalog, "all", loader) == first
+
+    db.commit()
+    reloaded = catalog_cache.get(catalog, "all", loader)
+    assert loader.loads == 2 and reloaded.etag != first.etag
+    assert _db_version(db, catalog) == 1
+
+
+def test_no_invalidation_after_rollback(db, catalog):
+    loader = Loader()
+    catalog_cache.get(catalog, "all", loader)
+    version = catalog_cache.version(catalog)
+
+    invalidate_catalog(db, catalog)
+    db.rollback()
+    assert catalog_cache.version(catalog) == version
+    assert _db_version(db, catalog) is None
+
+    # Il commit successivo non si porta dietro l'invalidazione annullata
+    db.commit()
+    catalog_cache.get(catalog, "all", loader)
+    assert loader.loads == 1 and catalog_cache.version(catalog) == version
+
+
+def test_body_loaded_during_invalidation_is_not_cached(catalog):
+    loader = Loader()
+
+    def racing_loader() -> bytes:
+        body = loader()
+        catalog_cache.invalidate(catalog)
+        return body
+
+    catalog_cache.get(catalog, "all", racing_loader)
+    catalog_cache.get(catalog, "all", loader)
+    assert loader.loads == 2
@@ -0,0 +1,112 @@
+from sqlalchemy.exc import OperationalError
+
+from app.db.session import SessionLocal
+from app.models.room import RoomCheckin
+from app.services import room_service
+from app.services.checkin_buffer import CheckinBuffer
+from app.services.room_service import buffer_room_checkin, create_room_checkin
+
+
+def _buffer(tmp_path, session_factory=SessionLocal):
+    buffer = CheckinBuffer(session_factory, flush_interval_ms=60000, spill_path=str(tmp_path / "checkin_spill.jsonl"))
+    buffer.FINAL_FLUSH_BACKOFF_SECONDS = 0
+    return buffer
+
+
+def _count(db, user, room):
+    db.expire_all()
+    row = db.query(RoomCheckin).filter(RoomCheckin.user_id == user.id, RoomCheckin.room_id == room.id).first()
+    return row.checkin_count if row else 0
+
+
+class _FailingSession:
+    # Sessione di un database irraggiungibile: ogni scrittura fallisce
+    def __init__(self):
+        self.session = SessionLocal()
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def execute(self, statement, *args, **kwargs):
+        raise OperationalError("INSERT INTO room_checkins", {}, Exception("database down"))
+
+
+def _failing_session():
+    return _FailingSession()
+
+
+def test_add_and_flush_single_upsert(tmp_path, db, user, room):
+    buffer = _buffer(tmp_path)
+    for _ in range(3):
+        buffer.add(user.id, room.id, is_random=False)
+
+    assert buffer.pending_for(user.id, room.id).count == 3
+    assert buffer.flush() == 1
+    assert buffer.pending_for(user.id, room.id) is None
+    assert _count(db, user, room) == 3
+
+
+def test_failed_flush_merges_back(tmp_path, db, user, room):
+    buffer = _buffer(tmp_path, _failing_session)
+    buffer.add(user.id, room.id, is_random=False)
+    assert buffer.flush() == 0
+    buffer.add(user.id, room.id, is_random=False)
+
+    # Gli incrementi del flush fallito si sommano a quelli arrivati nel frattempo
+    assert buffer.pending_for(user.id, room.id).count == 2
+    assert buffer.stats()["failed_flushes"] == 1
+    buffer.session_factory = SessionLocal
+    assert buffer.flush() == 1
+    assert _count(db, user, room) == 2
+
+
+def test_stop_spills_and_start_restores(tmp_path, db, user, room):
+    buffer = _buffer(tmp_path, _failing_session)
+    buffer.add(user.id, room.id, is_random=True)
+    buffer.add(user.id, room.id, is_random=True)
+    buffer.stop()
+
+    assert buffer.stats()["failed_flushes"] == CheckinBuffer.FINAL_FLUSH_ATTEMPTS
+    assert buffer.stats()["spilled"] == 1
+    assert (tmp_path / "checkin_spill.jsonl").exists()
+
+    # Il worker successivo rimette in coda gli incrementi salvati e li scrive
+    restarted = _buffer(tmp_path)
+    assert restarted.restore_spilled() == 1
+    assert list(tmp_path.glob("checkin_spill.jsonl*.replay")) == []
+    assert restarted.pending_for(user.id, room.id).count == 2
+    restarted.stop()
+    assert _count(db, user, room) == 2
+
+
+def test_buffered_checkin_response_counts_pending(tmp_path, monkeypatch, db, user, room):
+    buffer = _buffer(tmp_path)
+    monkeypatch.setattr(room_service, "checkin_buffer", buffer)
+    create_room_checkin(db, user.id, room.id, is_random=False)
+
+    responses = [buffer_room_checkin(db, user.id, room.id, is_random=False) for _ in range(3)]
+    assert [response.checkin_count for response in responses] == [2, 3, 4]
+    assert _count(db, user, room) == 1
+
+    buffer.flush()
+    assert buffer_room_checkin(db, user.id, room.id, is_random=False).checkin_count == 5
+    buffer.flush()
+    assert _count(db, user, room) == 5
+
+
+def test_read_with_pending_rereads_when_flush_overlaps(tmp_path, db, user, room):
+    buffer = _buffer(tmp_path)
+    create_room_checkin(db, user.id, room.id, is_random=False)
+    buffer.add(user.id, room.id, is_random=False)
+    reads = []
+
+    def read():
+        # Il primo read vede la riga prima del flush, che poi sposta l'incremento nel database
+        reads.append(_count(db, user, room))
+        if len(reads) == 1:
+            buffer.flush()
+        return reads[-1]
+
+    count, pending = buffer.read_with_pending((user.id, room.id), read)
+    assert reads == [1, 2]
+    assert (count, pending) == (2, None)
@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine, exc
+
+from app.db.pool import MeteredQueuePool, get_pool_stats, pool_metrics, warm_up_pool
+from app.db.session import engine
+
+
+@pytest.fixture
+def small_pool():
+    # Pool di 2 connessioni più 1 di overflow, con timeout breve per provocare l'esaurimento
+    url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "pool.db")
+    pool_engine = create_engine(url, poolclass=MeteredQueuePool, pool_size=2, max_overflow=1, pool_timeout=0.1)
+    pool_metrics.reset()
+    yield pool_engine
+    pool_engine.dispose()
+
+
+def test_pool_stats_track_checkouts_overflow_and_timeouts(small_pool):
+    assert warm_up_pool(small_pool, 2) == 2
+    stats = get_pool_stats(small_pool)
+    assert (stats["pool_class"], stats["size"], stats["checked_in"], stats["checked_out"], stats["overflow"]) == (
+        "MeteredQueuePool", 2, 2, 0, 0
+    )
+
+    connections = [small_pool.connect() for _ in range(3)]
+    try:
+        with pytest.raises(exc.TimeoutError):
+            small_pool.connect()
+        stats = get_pool_stats(small_pool)
+        assert (stats["checked_in"], stats["checked_out"], stats["overflow"]) == (0, 3, 1)
+        assert stats["timeouts"] == 1
+        assert stats["checkouts"] >= 5
+        # L'attesa del tentativo scaduto non entra nelle medie, quella dei checkout riusciti sì
+        assert 0 <= stats["avg_wait_ms"] <= stats["max_wait_ms"] < 100
+    finally:
+        for connection in connections:
+            connection.close()
+
+    assert get_pool_stats(small_pool)["checked_out"] == 0
+
+
+def test_pool_stats_endpoint(client):
+    response = client.get("/health/db-pool")
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["pool_class"] == type(engine.pool).__name__
+    assert {"checkouts", "timeouts", "avg_wait_ms", "max_wait_ms"} <= set(stats)
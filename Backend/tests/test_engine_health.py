@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+
+from app.services import ai_gateway, engine_health as engine_health_module
+from app.services.ai_gateway import EngineSpec
+from app.services.engine_health import CLOSED, HALF_OPEN, OPEN, MIN_SAMPLES_FOR_ERROR_RATE, EngineHealthRegistry
+
+COOLDOWN = 30.0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(engine_health_module.time, "monotonic", clock)
+    return clock
+
+
+def _registry(**options) -> EngineHealthRegistry:
+    return EngineHealthRegistry(None, **{"breaker_failures": 3, "cooldown_seconds": COOLDOWN, **options})
+
+
+def _state(registry: EngineHealthRegistry, engine_id: int) -> str:
+    return registry.stats()["engines"][engine_id]["state"]
+
+
+def _trip(registry: EngineHealthRegistry, engine_id: int):
+    for _ in range(registry.breaker_failures):
+        registry.record(engine_id, 5.0, ok=False)
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    registry = _registry()
+    registry.record(1, 100.0, ok=True)
+    registry.record(1, 5.0, ok=False)
+    registry.record(1, 5.0, ok=False)
+    assert _state(registry, 1) == CLOSED and registry.allow(1)
+
+    registry.record(1, 5.0, ok=False)
+    assert _state(registry, 1) == OPEN
+    assert not registry.allow(1) and not registry.is_available(1)
+    assert registry.stats()["engines"][1]["trips"] == 1
+
+
+def test_breaker_opens_on_error_rate(clock):
+    # Errori alternati: mai 3 consecutivi, ma il tasso di errore supera la soglia
+    registry = _registry(alpha=0.2, breaker_error_rate=0.4)
+    for call in range(MIN_SAMPLES_FOR_ERROR_RATE * 2):
+        registry.record(1, 50.0, ok=call % 3 == 0)
+        if _state(registry, 1) == OPEN:
+            break
+    assert _state(registry, 1) == OPEN
+    assert call + 1 >= MIN_SAMPLES_FOR_ERROR_RATE
+
+
+def test_half_open_lets_one_probe_through_then_closes(clock):
+    registry = _registry()
+    _trip(registry, 1)
+    clock.now += COOLDOWN - 1
+    assert not registry.allow(1)
+
+    clock.now += 1
+    assert registry.is_available(1)
+    assert registry.allow(1)
+    assert _state(registry, 1) == HALF_OPEN
+    # Una sola chiamata di prova per periodo di cooldown
+    assert not registry.allow(1) and not registry.is_available(1)
+
+    registry.record(1, 80.0, ok=True)
+    assert _state(registry, 1) == CLOSED
+    assert registry.allow(1) and registry.allow(1)
+
+
+def test_failed_probe_reopens(clock):
+    registry = _registry()
+    _trip(registry, 1)
+    clock.now += COOLDOWN
+    assert registry.allow(1)
+
+    registry.record(1, 5.0, ok=False)
+    assert _state(registry, 1) == OPEN
+    assert registry.stats()["engines"][1]["trips"] == 2
+    assert not registry.allow(1)
+    clock.now += COOLDOWN
+    assert registry.allow(1)
+
+
+def test_score_uses_ewma_p95_and_error_rate():
+    registry = _registry(alpha=0.5)
+    assert registry.score(1) is None
+    for latency in (100.0, 100.0, 100.0, 300.0):
+        registry.record(1, latency, ok=True)
+    # EWMA: 100, 100, 100, 200; p95 sugli ultimi campioni: 300
+    assert registry.score(1) == pytest.approx(0.7 * 200 + 0.3 * 300)
+
+    registry.record(1, 5.0, ok=False)
+    # Un errore non cambia la latenza ma penalizza il punteggio (tasso errori 0.5)
+    assert registry.score(1) == pytest.approx((0.7 * 200 + 0.3 * 300) * 3)
+
+
+def _engine(engine_id: int, latency_ms: int = 0) -> EngineSpec:
+    return EngineSpec(engine_id, f"engine-{engine_id}", "http://127.0.0.1:9", "key", None, {"type": "free"}, latency_ms)
+
+
+def test_rank_engines_orders_by_observed_latency(monkeypatch, clock):
+    registry = _registry()
+    engines = {engine.id: engine for engine in (_engine(1), _engine(2), _engine(3), _engine(4, 40), _engine(5, 10))}
+
+    async def get_engines():
+        return engines
+
+    monkeypatch.setattr(ai_gateway, "engine_health", registry)
+    monkeypatch.setattr(ai_gateway, "get_engines", get_engines)
+    monkeypatch.setattr(ai_gateway, "AI_ENGINE_EXPLORE_RATE", 0.0)
+    for _ in range(5):
+        registry.record(1, 300.0, ok=True)
+        registry.record(2, 100.0, ok=True)
+        registry.record(3, 50.0, ok=True)
+    registry.record(3, 5.0, ok=False)
+    registry.record(3, 5.0, ok=False)
+
+    # Prima i motori senza campioni (per latency_ms salvata), poi per punteggio;
+    # il motore 3 è il più veloce ma gli errori lo portano dopo il motore 2
+    ranked = asyncio.run(ai_gateway.rank_engines(is_premium=False))
+    assert [engine.id for engine in ranked] == [5, 4, 2, 3, 1]
+
+    _trip(registry, 2)
+    ranked = asyncio.run(ai_gateway.rank_engines(is_premium=False))
+    assert [engine.id for engine in ranked] == [5, 4, 3, 1]
@@ -0,0 +1,59 @@
+import uuid
+
+from app.db import session as db_session
+from app.schemas.room_schema import RoomUpdate
+from app.services.room_service import update_room
+
+
+def _settings_url(user) -> str:
+    return f"/users/users/{user.id}/settings/"
+
+
+def test_user_settings_not_modified(client, user):
+    assert client.post(_settings_url(user), json={"language": "it"}).status_code == 200
+    response = client.get(_settings_url(user))
+    etag = response.headers["ETag"]
+    assert response.json()["language"] == "it"
+
+    cached = client.get(_settings_url(user), headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    assert cached.content == b""
+
+
+def test_user_settings_etag_changes_after_write(client, user):
+    client.post(_settings_url(user), json={"language": "it"})
+    etag = client.get(_settings_url(user)).headers["ETag"]
+    assert client.put(_settings_url(user), json={"dark_mode_enabled": True}).status_code == 200
+
+    response = client.get(_settings_url(user), headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["dark_mode_enabled"] is True
+
+
+def test_conditional_get_reads_primary(client, user, monkeypatch):
+    client.post(_settings_url(user), json={})
+    etag = client.get(_settings_url(user)).headers["ETag"]
+
+    # Le richieste condizionali non passano dal router delle repliche
+    def replica_connect(key=None):
+        raise AssertionError("If-None-Match letto da una replica")
+
+    monkeypatch.setattr(db_session.read_router, "connect", replica_connect)
+    assert client.get(_settings_url(user), headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_catalog_etag_changes_after_write(client, db, room):
+    etag = client.get("/rooms/").headers["ETag"]
+    assert client.get("/rooms/", headers={"If-None-Match": etag}).status_code == 304
+
+    # La scrittura invalida il catalogo: il vecchio ETag non produce più un 304
+    name = f"room-{uuid.uuid4().hex[:8]}"
+    update_room(db, room.id, RoomUpdate(name=name))
+
+    response = client.get("/rooms/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert name in [item["name"] for item in response.json()]
+    assert client.get("/rooms/", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from app.services import ai_gateway as ai_gateway_module
+from app.services.ai_gateway import AIGateway, EngineCallError, EngineSpec
+from app.services.engine_health import EngineHealthRegistry
+from app.services.micro_batcher import MicroBatcher
+
+
+def _engine(api_endpoint: str = "http://127.0.0.1:9/v1/generate", batch_max_size: int = 4,
+            batch_window_ms: int = 20) -> EngineSpec:
+    return EngineSpec(9001, "batch", api_endpoint, "test", None, {"type": "free"}, 0, batch_max_size, batch_window_ms)
+
+
+class FakeGateway:
+    """Gateway finto: registra i body inviati e risponde con `respond(body)`."""
+
+    def __init__(self, respond=None):
+        self.bodies = []
+        self.respond = respond or (lambda body: {"results": [{"echo": item} for item in body["batch"]]})
+
+    async def request(self, engine, body: dict):
+        self.bodies.append(body)
+        await asyncio.sleep(0.001)
+        return self.respond(body), 1
+
+
+def _submit_all(batcher: MicroBatcher, engine: EngineSpec, bodies: list, timeout: float = 5):
+    async def run():
+        tasks = [batcher.submit(engine, body) for body in bodies]
+        return await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout)
+
+    return asyncio.run(run())
+
+
+def test_batch_flushes_after_window():
+    gateway = FakeGateway()
+    batcher = MicroBatcher(gateway)
+    results = _submit_all(batcher, _engine(), [{"input": "a"}, {"input": "b"}])
+
+    assert gateway.bodies == [{"batch": [{"input": "a"}, {"input": "b"}]}]
+    assert [result.response for result in results] == [{"echo": {"input": "a"}}, {"echo": {"input": "b"}}]
+    assert {result.batch_size for result in results} == {2}
+    stats = batcher.stats()["engines"][9001]
+    assert (stats["batches"], stats["items"], stats["full_batches"]) == (1, 2, 0)
+
+
+def test_full_batch_flushes_without_waiting_for_window():
+    gateway = FakeGateway()
+    batcher = MicroBatcher(gateway)
+    # Con una finestra di un minuto solo il riempimento del batch può farlo partire
+    results = _submit_all(batcher, _engine(batch_max_size=3, batch_window_ms=60_000),
+                          [{"input": str(i)} for i in range(3)], timeout=2)
+
+    assert len(gateway.bodies) == 1 and len(gateway.bodies[0]["batch"]) == 3
+    assert [result.response["echo"]["input"] for result in results] == ["0", "1", "2"]
+    assert batcher.stats()["engines"][9001]["full_batches"] == 1
+
+
+def test_single_request_is_sent_without_batch_wrapper():
+    gateway = FakeGateway(respond=lambda body: {"output": body["input"]})
+    result, = _submit_all(MicroBatcher(gateway), _engine(), [{"input": "solo"}])
+
+    assert gateway.bodies == [{"input": "solo"}]
+    assert (result.response, result.batch_size) == ({"output": "solo"}, 1)
+
+
+def test_item_error_fails_only_its_caller():
+    gateway = FakeGateway(respond=lambda body: {"results": [{"output": "ok"}, {"error": "input troppo lungo"}]})
+    ok, failed = _submit_all(MicroBatcher(gateway), _engine(), [{"input": "a"}, {"input": "b" * 10_000}])
+
+    assert ok.response == {"output": "ok"}
+    assert isinstance(failed, EngineCallError)
+    assert failed.status_code == 502 and "input troppo lungo" in str(failed)
+
+
+def test_results_length_mismatch_fails_whole_batch():
+    gateway = FakeGateway(respond=lambda body: {"results": [{"output": "solo uno"}]})
+    batcher = MicroBatcher(gateway)
+    results = _submit_all(batcher, _engine(), [{"input": "a"}, {"input": "b"}])
+
+    assert all(isinstance(result, EngineCallError) for result in results)
+    assert batcher.stats()["engines"][9001]["errors"] == 1
+
+
+def test_batch_against_stub_engine(stub_engine_url, monkeypatch):
+    monkeypatch.setattr(ai_gateway_module, "engine_health", EngineHealthRegistry(session_factory=None))
+    gateway = AIGateway(max_retries=0)
+    batcher = MicroBatcher(gateway)
+    engine = _engine(api_endpoint=stub_engine_url, batch_max_size=8, batch_window_ms=50)
+    inputs = ["ciao", "come stai", "bene grazie"]
+
+    async def run():
+        try:
+            return await asyncio.gather(*(batcher.submit(engine, {"input": text}) for text in inputs))
+        finally:
+            await gateway.aclose()
+
+    results = asyncio.run(run())
+    # Una sola chiamata HTTP allo stub, che inverte ogni input nell'ordine di invio
+    assert gateway.stats_for(engine.id).calls == 1
+    assert [result.response["output"] for result in results] == [text[::-1] for text in inputs]
+    assert {result.batch_size for result in results} == {len(inputs)}
+
+
+@pytest.mark.parametrize("response", [{"results": "non una lista"}, ["results"]])
+def test_invalid_batch_response_fails_all_callers(response):
+    gateway = FakeGateway(respond=lambda body: response)
+    results = _submit_all(MicroBatcher(gateway), _engine(), [{"input": "a"}, {"input": "b"}])
+    assert all(isinstance(result, EngineCallError) for result in results)
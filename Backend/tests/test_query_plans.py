@@ -0,0 +1,75 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import inspect, select
+from sqlalchemy.exc import IntegrityError
+
+from app.db.session import engine
+from app.models.emotional_state import EmotionalStateCheckin
+from app.models.room import RoomCheckin
+from app.models.user import UserAISettings, UserRooms, UserSettings
+from app.services.entitlement_cache import _subscriptions_query
+
+# I piani dipendono dal planner: verificati solo su Postgres (TEST_DATABASE_URL)
+postgres_only = pytest.mark.skipif(engine.dialect.name != "postgresql", reason="EXPLAIN plans are checked on Postgres only")
+
+# Lookup frequenti dei servizi e indice che devono usare
+HOT_QUERIES = [
+    (select(UserSettings).where(UserSettings.user_id == 1), "ix_user_settings_user_id"),
+    (select(UserAISettings).where(UserAISettings.user_id == 1), "ix_user_ai_settings_user_id"),
+    (_subscriptions_query(1, datetime(2026, 1, 1)), "ix_subscriptions_user_active_type"),
+    (
+        select(EmotionalStateCheckin).where(EmotionalStateCheckin.user_id == 1)
+        .order_by(EmotionalStateCheckin.created_at.desc()).limit(20),
+        "ix_emotional_states_checkin_user_created",
+    ),
+    (select(RoomCheckin).where(RoomCheckin.user_id == 1, RoomCheckin.room_id == 1), "uq_rooms_checkin_user_room"),
+    (select(UserRooms).where(UserRooms.user_id == 1, UserRooms.room_id == 1), "idx_user_room"),
+]
+
+
+def explain(stmt) -> str:
+    compiled = stmt.compile(dialect=engine.dialect)
+    with engine.begin() as conn:
+        # Tabelle di test quasi vuote: senza questo il planner sceglie sempre il seq scan
+        conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        rows = conn.exec_driver_sql(f"EXPLAIN {compiled}", compiled.params).all()
+    return "\n".join(row[0] for row in rows)
+
+
+@postgres_only
+@pytest.mark.parametrize("stmt, index_name", HOT_QUERIES, ids=[name for _, name in HOT_QUERIES])
+def test_hot_query_uses_index(client, stmt, index_name):
+    plan = explain(stmt)
+    assert index_name in plan, plan
+
+
+# Indici creati dalle migrazioni (tabella, nome, colonne, unique): verificati su ogni database
+HOT_INDEXES = [
+    ("user_settings", "ix_user_settings_user_id", ["user_id"], True),
+    ("user_ai_settings", "ix_user_ai_settings_user_id", ["user_id"], False),
+    ("subscriptions", "ix_subscriptions_user_active_type", ["user_id", "is_active", "subscription_type"], False),
+    ("subscriptions", "ix_subscriptions_updated_at", ["updated_at"], False),
+    ("emotional_states_checkin", "ix_emotional_states_checkin_user_created", ["user_id", "created_at"], False),
+    ("rooms_checkin", "uq_rooms_checkin_user_room", ["user_id", "room_id"], True),
+    ("users_rooms", "idx_user_room", ["user_id", "room_id"], False),
+]
+
+
+@pytest.mark.parametrize("table, index_name, columns, unique", HOT_INDEXES, ids=[item[1] for item in HOT_INDEXES])
+def test_migrations_create_index(client, table, index_name, columns, unique):
+    # Lo startup del client ha applicato `alembic upgrade head`
+    indexes = {index["name"]: index for index in inspect(engine).get_indexes(table)}
+    assert index_name in indexes, sorted(indexes)
+    assert indexes[index_name]["column_names"] == columns
+    assert bool(indexes[index_name]["unique"]) == unique
+
+
+def test_room_checkin_unique_constraint_rejects_duplicates(client, db, user, room):
+    # Il vincolo unique è ciò su cui conta l'upsert ON CONFLICT (user_id, room_id)
+    db.add(RoomCheckin(user_id=user.id, room_id=room.id, checkin_count=1))
+    db.commit()
+    db.add(RoomCheckin(user_id=user.id, room_id=room.id, checkin_count=1))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import time
+
+import pytest
+from sqlalchemy import create_engine, event
+
+from app.db import routing
+from app.db.routing import ReplicaRouter
+from app.db.session import DATABASE_URL, read_router
+
+
+def _counting_engine(url: str):
+    # Conta i checkout per sapere su quale motore è finita una lettura
+    engine = create_engine(url)
+    engine.checkouts = 0
+
+    @event.listens_for(engine, "checkout")
+    def _count(dbapi_connection, connection_record, connection_proxy):
+        engine.checkouts += 1
+
+    return engine
+
+
+@pytest.fixture
+def engines():
+    directory = tempfile.mkdtemp()
+    primary = _counting_engine("sqlite:///" + os.path.join(directory, "primary.db"))
+    replica = _counting_engine("sqlite:///" + os.path.join(directory, "replica.db"))
+    yield primary, replica
+    primary.dispose()
+    replica.dispose()
+
+
+def test_reads_go_to_replica_until_a_write_sticks_them_to_primary(engines, monkeypatch):
+    primary, replica = engines
+    router = ReplicaRouter(primary, [replica], sticky_seconds=5)
+
+    with router.connect(42) as connection:
+        assert connection.engine is replica
+
+    router.stick_to_primary(42)
+    with router.connect(42) as connection:
+        assert connection.engine is primary
+    # Le altre chiavi continuano a leggere dalla replica
+    with router.connect(43) as connection:
+        assert connection.engine is replica
+
+    later = time.monotonic() + 6
+    monkeypatch.setattr(routing.time, "monotonic", lambda: later)
+    with router.connect(42) as connection:
+        assert connection.engine is replica
+
+
+def test_unreachable_replica_falls_back_to_primary(engines):
+    primary, _ = engines
+    broken = create_engine("sqlite:///" + os.path.join(tempfile.mkdtemp(), "missing", "replica.db"))
+    router = ReplicaRouter(primary, [broken], retry_seconds=30)
+
+    with router.connect() as connection:
+        assert connection.engine is primary
+    assert router.status()[0]["healthy"] is False
+
+
+def test_user_read_routed_to_replica_and_sticky_after_write(client, user, monkeypatch):
+    # Replica che punta allo stesso database dei test: serve solo a contare le letture
+    replica = _counting_engine(DATABASE_URL)
+    monkeypatch.setattr(read_router, "replicas", [replica])
+    try:
+        assert client.get(f"/users/users/{user.id}").status_code == 200
+        assert replica.checkouts == 1
+
+        assert client.post(f"/users/users/{user.id}/settings/", json={"language": "it"}).status_code == 200
+        assert client.get(f"/users/users/{user.id}").status_code == 200
+        assert replica.checkouts == 1
+    finally:
+        replica.dispose()
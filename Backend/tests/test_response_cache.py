@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from app.services.response_cache import HIT, MISS, SHARED, ResponseCache, response_cache_key
+
+CONCURRENT_CALLS = 20
+
+
+class Upstream:
+    """Motore finto: conta le chiamate e risponde dopo `delay` secondi."""
+
+    def __init__(self, delay: float = 0.05, error: Exception = None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self) -> dict:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {"text": "ciao", "call": self.calls}
+
+
+def test_identical_concurrent_calls_share_one_upstream_call():
+    cache, upstream = ResponseCache(), Upstream()
+
+    async def run():
+        results = await asyncio.gather(*(cache.fetch("key", upstream) for _ in range(CONCURRENT_CALLS)))
+        return results, await cache.fetch("key", upstream)
+
+    results, (cached, source) = asyncio.run(run())
+    assert upstream.calls == 1
+    sources = [source for _, source in results]
+    assert sources.count(MISS) == 1 and sources.count(SHARED) == CONCURRENT_CALLS - 1
+    assert all(response == {"text": "ciao", "call": 1} for response, _ in results)
+    assert (cached, source) == ({"text": "ciao", "call": 1}, HIT)
+    assert cache.stats()["coalesced"] == CONCURRENT_CALLS - 1
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_failed_call_is_raised_to_all_waiters_and_not_cached():
+    cache, upstream = ResponseCache(), Upstream(error=RuntimeError("engine down"))
+
+    async def run():
+        return await asyncio.gather(
+            *(cache.fetch("key", upstream) for _ in range(CONCURRENT_CALLS)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert upstream.calls == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.get("key") is None
+
+    # La richiesta successiva riprova il motore
+    upstream.error = None
+    assert asyncio.run(cache.fetch("key", upstream)) == ({"text": "ciao", "call": 2}, MISS)
+
+
+def test_cancelled_initiator_does_not_cancel_shared_call():
+    cache, upstream = ResponseCache(), Upstream()
+
+    async def run():
+        initiator = asyncio.create_task(cache.fetch("key", upstream))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.fetch("key", upstream))
+        await asyncio.sleep(0)
+        initiator.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await initiator
+        return await follower
+
+    assert asyncio.run(run()) == ({"text": "ciao", "call": 1}, SHARED)
+    assert cache.get("key") == {"text": "ciao", "call": 1}
+
+
+def test_entries_expire_and_respect_lru_limit(monkeypatch):
+    cache = ResponseCache(ttl_seconds=10, max_entries=2)
+    now = [100.0]
+    monkeypatch.setattr("app.services.response_cache.time.monotonic", lambda: now[0])
+    for key in ("a", "b", "c"):
+        cache.put(key, {"key": key})
+    assert cache.get("a") is None and cache.stats()["evictions"] == 1
+
+    now[0] += 10
+    assert cache.get("b") is None
+
+
+def test_cache_key_ignores_key_order():
+    first = response_cache_key(1, {"temperature": 0.5, "tone": "calm"}, 2, {"prompt": "ciao", "n": 1})
+    second = response_cache_key(1, {"tone": "calm", "temperature": 0.5}, 2, {"n": 1, "prompt": "ciao"})
+    assert first == second
+    assert first != response_cache_key(1, {"tone": "calm", "temperature": 0.5}, 3, {"n": 1, "prompt": "ciao"})
@@ -0,0 +1,96 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.exc import OperationalError
+
+from app.db.session import SessionLocal, engine
+from app.models.room import RoomCheckin
+from app.models.user import UserRooms
+from app.services import room_service
+from app.services.checkin_buffer import CheckinBuffer
+from app.services.room_service import buffer_room_checkin, create_room_checkin, create_user_rooms_bulk
+
+# Su Postgres (TEST_DATABASE_URL) i check-in concorrenti sono di più e i thread
+# si contendono davvero la riga; SQLite serializza le scritture
+PARALLEL_CHECKINS = int(os.getenv("TEST_PARALLEL_CHECKINS", 2000 if engine.dialect.name == "postgresql" else 500))
+CHECKIN_THREADS = 32
+
+
+def _checkin(user_id: int, room_id: int, checkin=create_room_checkin):
+    db = SessionLocal()
+    try:
+        return checkin(db, user_id, room_id, is_random=False)
+    finally:
+        db.close()
+
+
+def _checkin_count(db, user, room) -> int:
+    rows = db.query(RoomCheckin).filter(RoomCheckin.user_id == user.id, RoomCheckin.room_id == room.id).all()
+    assert len(rows) == 1
+    return rows[0].checkin_count
+
+
+def test_parallel_checkins_single_row(db, user, room):
+    # Check-in concorrenti sulla stessa coppia (utente, stanza): una sola riga, nessun incremento perso
+    with ThreadPoolExecutor(max_workers=CHECKIN_THREADS) as pool:
+        responses = list(pool.map(lambda _: _checkin(user.id, room.id), range(PARALLEL_CHECKINS)))
+
+    assert _checkin_count(db, user, room) == PARALLEL_CHECKINS
+    assert sorted(response.checkin_count for response in responses) == list(range(1, PARALLEL_CHECKINS + 1))
+
+
+def test_parallel_buffered_checkins_exact_count(tmp_path, monkeypatch, db, user, room):
+    # Write-behind con flush frequenti durante il carico: nessun incremento perso o contato due volte
+    buffer = CheckinBuffer(SessionLocal, flush_interval_ms=5, spill_path=str(tmp_path / "checkin_spill.jsonl"))
+    monkeypatch.setattr(room_service, "checkin_buffer", buffer)
+    create_room_checkin(db, user.id, room.id, is_random=False)
+    buffer.start()
+    try:
+        with ThreadPoolExecutor(max_workers=CHECKIN_THREADS) as pool:
+            responses = list(pool.map(
+                lambda _: _checkin(user.id, room.id, buffer_room_checkin), range(PARALLEL_CHECKINS)
+            ))
+    finally:
+        buffer.stop()
+
+    assert buffer.stats()["flushes"] > 1
+    assert _checkin_count(db, user, room) == PARALLEL_CHECKINS + 1
+    # Ogni risposta vede almeno il proprio incremento e nessuna supera il totale
+    counts = [response.checkin_count for response in responses]
+    assert 2 <= min(counts) and max(counts) <= PARALLEL_CHECKINS + 1
+
+
+def test_user_rooms_bulk_creates_valid_items(client, db, user, room):
+    items = [
+        {"room_id": room.id, "customization": {"wallpaper": "sunset", "volume": 3}},
+        {"room_id": room.id, "customization": {}},
+        {"room_id": 999999, "customization": {}},
+        {"customization": {}},
+    ]
+    response = client.post(f"/rooms/users/{user.id}/user-room/bulk", json=items)
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["succeeded"], body["failed"]) == (2, 2)
+    assert [result["status"] for result in body["results"]] == ["created", "created", "error", "error"]
+
+    rows = db.query(UserRooms).filter(UserRooms.user_id == user.id).order_by(UserRooms.id).all()
+    assert [row.customization for row in rows] == [{"wallpaper": "sunset", "volume": 3}, {}]
+
+
+def test_user_rooms_bulk_reports_failed_rows_per_item(db, user, room, monkeypatch):
+    # Se l'INSERT multi-riga fallisce, ogni elemento viene riprovato da solo
+    calls = {"commits": 0}
+    commit = db.commit
+
+    def failing_first_commit():
+        calls["commits"] += 1
+        if calls["commits"] == 1:
+            raise OperationalError("INSERT INTO users_rooms", {}, Exception("simulated failure"))
+        commit()
+
+    monkeypatch.setattr(db, "commit", failing_first_commit)
+    items = [{"room_id": room.id, "customization": {"n": n}} for n in range(3)]
+    result = create_user_rooms_bulk(db, user.id, items)
+
+    assert (result.succeeded, result.failed) == (3, 0)
+    assert db.query(UserRooms).filter(UserRooms.user_id == user.id).count() == 3
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import uuid
+from decimal import Decimal
+
+import pytest
+
+from app.models.ai import AIEngine, AIUsageLog
+from app.services import ai_gateway as ai_gateway_module
+from app.services.ai_gateway import ENGINES_CATALOG, ai_gateway, stream_engine
+from app.services.catalog_cache import invalidate_catalog
+from app.services.engine_health import EngineHealthRegistry
+
+PASSWORD = "password123"
+
+
+@pytest.fixture
+def stub_engine(db, stub_engine_url, monkeypatch):
+    # Registro della salute dei motori separato: gli errori di questo test non aprono circuiti altrui
+    monkeypatch.setattr(ai_gateway_module, "engine_health", EngineHealthRegistry(session_factory=None))
+    engine = AIEngine(
+        name=f"stub-{uuid.uuid4().hex[:8]}", api_endpoint=stub_engine_url, api_key="test",
+        pricing_model={"type": "per_call", "cost_per_call": 0.01},
+    )
+    db.add(engine)
+    invalidate_catalog(db, ENGINES_CATALOG)
+    db.commit()
+    return engine
+
+
+def _usage_row(db, engine_id: int) -> AIUsageLog:
+    db.expire_all()
+    return db.query(AIUsageLog).filter(AIUsageLog.engine_id == engine_id).one()
+
+
+def _parse_sse(text: str) -> list:
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def _auth_headers(client) -> dict:
+    email = f"stream{uuid.uuid4().hex}@example.com"
+    assert client.post("/users/users/", json={"email": email, "password_hash": PASSWORD}).status_code == 201
+    tokens = client.post("/users/login/", params={"email": email, "password": PASSWORD}).json()
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+def test_stream_sends_ordered_tokens_then_done(client, db, stub_engine):
+    response = client.post(
+        f"/ai/engines/{stub_engine.id}/stream", json={"input": "uno due", "max_tokens": 5},
+        headers=_auth_headers(client),
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = _parse_sse(response.text)
+    assert [name for name, _ in events] == ["token"] * 5 + ["done"]
+    assert [data["delta"] for _, data in events[:-1]] == ["uno ", "due ", "uno ", "due ", "uno "]
+    done = events[-1][1]
+    assert done["engine_id"] == stub_engine.id and done["cost"] == "0.01"
+    assert 0 < done["ttft_ms"] <= done["latency_ms"]
+
+    row = _usage_row(db, stub_engine.id)
+    assert row.status == "success"
+    assert row.ttft_ms == done["ttft_ms"]
+    assert row.response_payload == {"output": "uno due uno due uno "}
+
+
+def test_disconnect_records_cancelled_usage_with_ttft(db, user, stub_engine):
+    async def run():
+        events = await stream_engine(stub_engine.id, user.id, {"input": "uno due", "max_tokens": 100})
+        received, two_tokens = [], asyncio.Event()
+
+        async def consume():
+            async for name, data in events:
+                received.append(data["delta"])
+                if len(received) == 2:
+                    two_tokens.set()
+
+        # Come Starlette alla disconnessione: il task della risposta viene cancellato a stream in corso
+        task = asyncio.create_task(consume())
+        await two_tokens.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await ai_gateway.aclose()
+        return received
+
+    received = asyncio.run(run())
+    row = _usage_row(db, stub_engine.id)
+    assert row.status == "cancelled"
+    assert row.ttft_ms is not None and row.ttft_ms <= row.latency_ms
+    # Il motore aveva iniziato a generare: la chiamata è addebitata
+    assert row.cost == Decimal("0.01")
+    assert row.response_payload["output"].startswith("".join(received))
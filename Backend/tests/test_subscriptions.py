@@ -0,0 +1,72 @@
+import time
+from datetime import datetime, timedelta
+
+from app.db.session import SessionLocal
+from app.models.subscription import Subscription
+from app.services.entitlement_cache import FREE_ENTITLEMENT, EntitlementCache, entitlement_cache, get_entitlement
+
+
+def _premium(user_id: int, **values) -> dict:
+    return {"user_id": user_id, "subscription_type": "premium", **values}
+
+
+def test_subscription_write_invalidates_only_its_user(client, db, user):
+    other_id = user.id + 100000
+    assert not get_entitlement(db, user.id).is_premium
+    get_entitlement(db, other_id)
+
+    response = client.post("/subscriptions/", json=_premium(user.id))
+    assert response.status_code == 201, response.text
+    # Voce dell'utente scartata al commit, quella degli altri utenti resta in cache
+    assert entitlement_cache.lookup(user.id, datetime.utcnow())[0] is None
+    assert entitlement_cache.lookup(other_id, datetime.utcnow())[0] is not None
+    assert get_entitlement(db, user.id).is_premium
+
+    response = client.post(f"/subscriptions/{response.json()['id']}/deactivate")
+    assert response.status_code == 200
+    assert not get_entitlement(db, user.id).is_premium
+
+
+def test_store_after_invalidation_is_discarded():
+    cache = EntitlementCache()
+    entitlement, sequence = cache.lookup(1, datetime.utcnow())
+    assert entitlement is None
+    # Sottoscrizione modificata mentre l'entitlement veniva caricato
+    cache.invalidate_user(1)
+    cache.store(1, sequence, FREE_ENTITLEMENT, None)
+    assert cache.lookup(1, datetime.utcnow())[0] is None
+
+    _, sequence = cache.lookup(1, datetime.utcnow())
+    cache.store(1, sequence, FREE_ENTITLEMENT, None)
+    assert cache.lookup(1, datetime.utcnow())[0] is not None
+
+
+def test_poll_invalidates_users_changed_by_other_workers(client, db, user):
+    # Cache di un altro worker: vede la modifica solo tramite subscriptions.updated_at
+    worker = EntitlementCache()
+    worker.poll_changes()
+    _, sequence = worker.lookup(user.id, datetime.utcnow())
+    worker.store(user.id, sequence, FREE_ENTITLEMENT, None)
+
+    with SessionLocal() as other:
+        other.add(Subscription(**_premium(user.id, start_date=datetime.utcnow() - timedelta(minutes=1))))
+        other.commit()
+
+    worker.poll_changes()
+    assert worker.lookup(user.id, datetime.utcnow())[0] is None
+    invalidations = worker.invalidations
+    worker.poll_changes()
+    assert worker.invalidations == invalidations
+
+
+def test_premium_ids_expire_after_ttl(monkeypatch):
+    cache = EntitlementCache(ttl_seconds=60)
+    ids, version = cache.premium_ids("rooms")
+    assert ids is None
+    cache.store_premium_ids("rooms", version, frozenset({1}))
+    assert cache.premium_ids("rooms")[0] == frozenset({1})
+
+    # Senza invalidazioni locali (es. stanza resa premium in un altro worker) la voce scade comunque
+    now = time.monotonic() + 61
+    monkeypatch.setattr("app.services.entitlement_cache.time.monotonic", lambda: now)
+    assert cache.premium_ids("rooms")[0] is None
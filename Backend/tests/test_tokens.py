@@ -0,0 +1,127 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy import update
+
+from app.db.session import SessionLocal
+from app.models.user import RefreshToken
+from app.services.token_service import REUSED_REFRESH_TOKEN, TokenDenylistSync
+from app.utils import auth
+from app.utils.auth import VerifiedTokenCache, verified_token_cache, verify_access_token
+
+PASSWORD = "password123"
+
+
+def _login(client) -> dict:
+    email = f"token{uuid.uuid4().hex}@example.com"
+    assert client.post("/users/users/", json={"email": email, "password_hash": PASSWORD}).status_code == 201
+    response = client.post("/users/login/", params={"email": email, "password": PASSWORD})
+    assert response.status_code == 200
+    return response.json()
+
+
+def _refresh(client, refresh_token: str):
+    return client.post("/users/token/refresh", json={"refresh_token": refresh_token})
+
+
+def _family_rows(sid: str):
+    with SessionLocal() as db:
+        return db.query(RefreshToken).filter(RefreshToken.family_id == sid).all()
+
+
+def test_refresh_rotates_token(client):
+    tokens = _login(client)
+    response = _refresh(client, tokens["refresh_token"])
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+
+    claims = verify_access_token(rotated["access_token"])
+    assert claims["sid"] == verify_access_token(tokens["access_token"])["sid"]
+    rows = _family_rows(claims["sid"])
+    assert len(rows) == 2
+    assert [row.rotated_at is not None for row in sorted(rows, key=lambda row: row.id)] == [True, False]
+
+
+def test_replayed_refresh_token_revokes_session(client):
+    tokens = _login(client)
+    sid = verify_access_token(tokens["access_token"])["sid"]
+    # Il token di accesso è ora nella cache dei token verificati
+    assert verified_token_cache.get(tokens["access_token"]) is not None
+    rotated = _refresh(client, tokens["refresh_token"]).json()
+
+    replay = _refresh(client, tokens["refresh_token"])
+    assert replay.status_code == 401
+    assert replay.json()["detail"] == REUSED_REFRESH_TOKEN
+    assert all(row.revoked_at is not None for row in _family_rows(sid))
+
+    # Sessione revocata: anche il token ruotato e i token di accesso in cache vengono rifiutati
+    assert _refresh(client, rotated["refresh_token"]).status_code == 401
+    for access_token in (tokens["access_token"], rotated["access_token"]):
+        with pytest.raises(ValueError):
+            verify_access_token(access_token)
+
+
+def test_logout_rejects_cached_access_token(client):
+    tokens = _login(client)
+    verify_access_token(tokens["access_token"])
+    assert client.post("/users/token/revoke", json={"refresh_token": tokens["refresh_token"]}).status_code == 204
+
+    with pytest.raises(ValueError):
+        verify_access_token(tokens["access_token"])
+    assert _refresh(client, tokens["refresh_token"]).status_code == 401
+
+
+def test_denylist_sync_picks_up_revocations_from_other_workers(client):
+    tokens = _login(client)
+    sid = verify_access_token(tokens["access_token"])["sid"]
+
+    # Revoca scritta da un altro worker: qui arriva solo con il poll
+    with SessionLocal() as db:
+        db.execute(update(RefreshToken).where(RefreshToken.family_id == sid).values(revoked_at=datetime.utcnow()))
+        db.commit()
+    assert verify_access_token(tokens["access_token"])["sid"] == sid
+
+    TokenDenylistSync(enabled=False).poll()
+    with pytest.raises(ValueError):
+        verify_access_token(tokens["access_token"])
+
+
+def test_verified_token_cache_hit_and_expiry(monkeypatch):
+    cache = VerifiedTokenCache(max_entries=2)
+    now = [1_000.0]
+    monkeypatch.setattr(auth.time, "time", lambda: now[0])
+
+    cache.put("token-a", {"sub": "1", "exp": 1_060})
+    assert cache.get("token-a") == {"sub": "1", "exp": 1_060}
+    # Senza exp il token non entra in cache
+    cache.put("token-b", {"sub": "2"})
+    assert cache.get("token-b") is None
+
+    now[0] = 1_060.0
+    assert cache.get("token-a") is None
+    assert cache.stats() == {"entries": 0, "hits": 1, "misses": 2}
+
+
+def test_verified_token_cache_evicts_least_recently_used():
+    cache = VerifiedTokenCache(max_entries=2)
+    exp = 2 ** 31
+    cache.put("token-a", {"exp": exp})
+    cache.put("token-b", {"exp": exp})
+    cache.get("token-a")
+    cache.put("token-c", {"exp": exp})
+    assert cache.get("token-b") is None
+    assert cache.get("token-a") is not None and cache.get("token-c") is not None
+
+
+def test_cached_token_skips_signature_check(client, monkeypatch):
+    tokens = _login(client)
+    decode = auth.JWTUtils.decode_access_token
+    calls = []
+    monkeypatch.setattr(auth.JWTUtils, "decode_access_token", lambda token: calls.append(token) or decode(token))
+    verified_token_cache.clear()
+
+    first = verify_access_token(tokens["access_token"])
+    assert verify_access_token(tokens["access_token"]) == first
+    assert calls == [tokens["access_token"]]
@@ -0,0 +1,75 @@
+import json
+from datetime import datetime
+
+from sqlalchemy.exc import OperationalError
+
+from app.db.session import SessionLocal
+from app.models.ai import AIUsageLog
+from app.services.usage_ingestion import UsageIngestionQueue
+
+
+def _queue(tmp_path, batch_size=10):
+    return UsageIngestionQueue(
+        SessionLocal, batch_size=batch_size, spill_path=str(tmp_path / "ai_usage_spill.jsonl"), use_copy=False
+    )
+
+
+def _record(user, engine, **overrides):
+    record = {
+        "user_id": user.id,
+        "engine_id": engine.id,
+        "request_payload": {"prompt": "ciao"},
+        "cost": 0.01,
+        "status": "success",
+        "created_at": datetime.utcnow(),
+    }
+    record.update(overrides)
+    return record
+
+
+def _logged(db, user):
+    db.expire_all()
+    return db.query(AIUsageLog).filter(AIUsageLog.user_id == user.id).count()
+
+
+def test_replay_dead_letters_rejected_rows(tmp_path, db, user, ai_engine):
+    queue = _queue(tmp_path)
+    queue._spill([_record(user, ai_engine), _record(user, ai_engine, status=None), _record(user, ai_engine)])
+    with open(queue.spill_path, "a", encoding="utf-8") as spill:
+        spill.write("{non è json\n")
+
+    # Il blocco fallisce per un solo record: gli altri vengono scritti, gli scarti finiscono nel dead-letter
+    assert queue.replay() == 2
+    assert _logged(db, user) == 2
+    assert queue.stats()["dead_lettered"] == 2
+    assert len((tmp_path / "ai_usage_spill.jsonl.dead").read_text(encoding="utf-8").splitlines()) == 2
+    assert not (tmp_path / "ai_usage_spill.jsonl").exists()
+    assert list(tmp_path.glob("*.replay")) == []
+
+
+def test_replay_keeps_rows_when_database_is_down(tmp_path, monkeypatch, db, user, ai_engine):
+    queue = _queue(tmp_path, batch_size=2)
+    queue._spill([_record(user, ai_engine) for _ in range(5)])
+
+    def database_down(rows):
+        raise OperationalError("INSERT INTO ai_usage_logs", {}, Exception("database down"))
+
+    monkeypatch.setattr(queue, "_write", database_down)
+    assert queue.replay() == 0
+    assert len((tmp_path / "ai_usage_spill.jsonl").read_text(encoding="utf-8").splitlines()) == 5
+    assert not (tmp_path / "ai_usage_spill.jsonl.dead").exists()
+
+    monkeypatch.undo()
+    assert queue.replay() == 5
+    assert _logged(db, user) == 5
+
+
+def test_replay_takes_over_orphaned_file(tmp_path, db, user, ai_engine):
+    # File preso in carico da un worker terminato a metà replay (pid inesistente)
+    orphan = tmp_path / "ai_usage_spill.jsonl.999999999.replay"
+    row = _record(user, ai_engine)
+    orphan.write_text(json.dumps({**row, "created_at": row["created_at"].isoformat()}) + "\n", encoding="utf-8")
+
+    assert _queue(tmp_path).replay() == 1
+    assert not orphan.exists()
+    assert _logged(db, user) == 1
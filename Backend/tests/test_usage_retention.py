@@ -0,0 +1,44 @@
+from datetime import date, datetime
+
+import pytest
+
+from app.db.session import SessionLocal, engine
+from app.models.ai import AIUsageLog
+from app.services.usage_retention import UsageRetentionJob
+
+# Su Postgres la retention stacca le partizioni: il DELETE a blocchi è il percorso SQLite
+sqlite_only = pytest.mark.skipif(engine.dialect.name != "sqlite", reason="chunked DELETE retention runs on SQLite only")
+
+# Data fittizia nel passato: solo le righe di questo test cadono fuori retention
+TODAY = date(2001, 5, 17)
+
+
+def test_cutoff_is_start_of_month_minus_retention():
+    job = UsageRetentionJob(SessionLocal, retention_months=12)
+    assert job.cutoff(TODAY) == date(2000, 5, 1)
+    assert job.cutoff(date(2001, 1, 1)) == date(2000, 1, 1)
+    assert UsageRetentionJob(SessionLocal, retention_months=3).cutoff(date(2001, 2, 28)) == date(2000, 11, 1)
+
+
+@sqlite_only
+def test_delete_in_chunks_removes_only_logs_before_cutoff(db, user, ai_engine):
+    created = [
+        datetime(1999, 12, 31, 23, 59),
+        datetime(2000, 4, 1),
+        datetime(2000, 4, 30, 23, 59, 59),
+        # Dal cutoff (2000-05-01 00:00) in poi le righe restano
+        datetime(2000, 5, 1),
+        datetime(2001, 5, 1),
+    ]
+    for created_at in created:
+        db.add(AIUsageLog(
+            user_id=user.id, engine_id=ai_engine.id, request_payload={}, status="success", created_at=created_at,
+        ))
+    db.commit()
+
+    job = UsageRetentionJob(SessionLocal, retention_months=12, chunk_size=2)
+    assert job._delete_in_chunks(db, TODAY) == {"rows_deleted": 3}
+
+    db.expire_all()
+    remaining = db.query(AIUsageLog.created_at).filter(AIUsageLog.engine_id == ai_engine.id).order_by(AIUsageLog.created_at)
+    assert [row.created_at for row in remaining] == created[3:]
@@ -0,0 +1,48 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from app.services.usage_rollups import apply_usage_rollups, get_month_to_date_usage, get_user_daily_usage
+
+
+def _log(user_id: int, engine_id: int, created_at: datetime, status: str = "success", cost: str = "0.0100",
+         discount: str = "0", latency_ms: int = 100) -> dict:
+    return dict(user_id=user_id, engine_id=engine_id, created_at=created_at, status=status, cost=Decimal(cost),
+                premium_discount=Decimal(discount), latency_ms=latency_ms)
+
+
+def test_rollups_accumulate_across_blocks(db, user, ai_engine):
+    may_3, may_4 = datetime(2026, 5, 3, 10), datetime(2026, 5, 4, 18)
+    # Due blocchi separati: il secondo si somma alle righe di rollup già esistenti
+    apply_usage_rollups(db, [
+        _log(user.id, ai_engine.id, may_3),
+        _log(user.id, ai_engine.id, may_3, status="error", cost="0", latency_ms=30),
+        _log(user.id, ai_engine.id, datetime(2026, 4, 30, 23, 59), cost="1.0000"),
+    ])
+    db.commit()
+    apply_usage_rollups(db, [
+        _log(user.id, ai_engine.id, may_4, cost="0.0200", discount="0.0050", latency_ms=250),
+        _log(user.id, ai_engine.id, may_4, status="cached", cost="0", latency_ms=2),
+    ])
+    db.commit()
+
+    usage = get_month_to_date_usage(db, user.id, today=date(2026, 5, 20))
+    assert usage["month"] == date(2026, 5, 1)
+    assert (usage["calls"], usage["success_count"], usage["failure_count"]) == (4, 3, 1)
+    assert usage["total_cost"] == Decimal("0.0300")
+    assert usage["total_premium_discount"] == Decimal("0.0050")
+    assert usage["total_latency_ms"] == 382
+
+    # Aprile resta nel suo mese
+    april = get_month_to_date_usage(db, user.id, today=date(2026, 4, 1))
+    assert (april["calls"], april["total_cost"]) == (1, Decimal("1.0000"))
+
+    daily = get_user_daily_usage(db, user.id, date(2026, 5, 1), date(2026, 5, 31))
+    assert [(row["day"], row["engine_id"], row["calls"], row["failure_count"]) for row in daily] == [
+        (date(2026, 5, 3), ai_engine.id, 2, 1),
+        (date(2026, 5, 4), ai_engine.id, 2, 0),
+    ]
+
+
+def test_month_to_date_without_usage_is_zero(db, user):
+    usage = get_month_to_date_usage(db, user.id, today=date(2026, 5, 20))
+    assert (usage["calls"], usage["total_cost"], usage["total_latency_ms"]) == (0, Decimal(0), 0)
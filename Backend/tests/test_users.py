@@ -0,0 +1,121 @@
+import uuid
+from datetime import datetime, timedelta
+
+import jwt
+
+from app.db.session import SessionLocal
+from app.models.user import User
+from app.services import user_service
+from app.services.last_login_buffer import LastLoginBuffer
+from app.services.password_hasher import password_hasher
+from app.utils.hashing import Hash
+from app.utils.jwt_utils import JWTKeyring, generate_signing_key
+
+
+def _write_key(keys_dir, kid: str) -> str:
+    (keys_dir / f"{kid}.pem").write_bytes(generate_signing_key("EdDSA"))
+    return kid
+
+
+def _sign(keyring: JWTKeyring) -> str:
+    key = keyring.active
+    payload = {"user_id": 1, "exp": datetime.utcnow() + timedelta(minutes=5)}
+    return jwt.encode(payload, key.private_key, algorithm=key.algorithm, headers={"kid": key.kid})
+
+
+def _verify(keyring: JWTKeyring, token: str) -> dict:
+    key = keyring.get(jwt.get_unverified_header(token)["kid"])
+    assert key is not None
+    return jwt.decode(token, key.public_key, algorithms=[key.algorithm])
+
+
+def test_keyring_verifies_tokens_signed_after_rotation(tmp_path):
+    _write_key(tmp_path, "2026-01")
+    # Due worker con lo stesso JWT_KEYS_DIR: solo il primo si accorge subito della rotazione
+    signer = JWTKeyring(str(tmp_path), algorithm="EdDSA", reload_seconds=0, unknown_kid_reload_seconds=0)
+    verifier = JWTKeyring(str(tmp_path), algorithm="EdDSA", reload_seconds=0, unknown_kid_reload_seconds=0)
+    old_token = _sign(signer)
+    assert _verify(verifier, old_token)["user_id"] == 1
+
+    new_kid = _write_key(tmp_path, "2026-02")
+    signer.reload()
+    new_token = _sign(signer)
+    assert jwt.get_unverified_header(new_token)["kid"] == new_kid
+
+    # Kid sconosciuto: il verifier rilegge le chiavi invece di rifiutare il token
+    assert _verify(verifier, new_token)["user_id"] == 1
+    assert _verify(verifier, old_token)["user_id"] == 1
+    assert new_kid in verifier.jwks().decode()
+
+
+def test_keyring_reloads_periodically(tmp_path, monkeypatch):
+    _write_key(tmp_path, "2026-01")
+    keyring = JWTKeyring(str(tmp_path), algorithm="EdDSA", reload_seconds=60, unknown_kid_reload_seconds=3600)
+    assert keyring.active.kid == "2026-01"
+
+    _write_key(tmp_path, "2026-02")
+    assert keyring.active.kid == "2026-01"
+    now = keyring._loaded_at + 61
+    monkeypatch.setattr("app.utils.jwt_utils.time.monotonic", lambda: now)
+    assert keyring.active.kid == "2026-02"
+
+
+def test_keyring_limits_unknown_kid_reloads(tmp_path):
+    _write_key(tmp_path, "2026-01")
+    keyring = JWTKeyring(str(tmp_path), algorithm="EdDSA", reload_seconds=0, unknown_kid_reload_seconds=3600)
+    keyring.active
+    _write_key(tmp_path, "2026-02")
+    # Appena caricato: un kid sconosciuto non forza una nuova lettura
+    assert keyring.get("2026-02") is None
+
+
+def test_login_buffers_last_login(client, tmp_path, monkeypatch):
+    buffer = LastLoginBuffer(SessionLocal, flush_interval_ms=60000, spill_path=str(tmp_path / "last_login_spill.jsonl"))
+    monkeypatch.setattr(user_service, "LAST_LOGIN_WRITE_BEHIND", True)
+    monkeypatch.setattr(user_service, "last_login_buffer", buffer)
+    email = f"login{uuid.uuid4().hex}@example.com"
+    user_id = client.post("/users/users/", json={"email": email, "password_hash": "password123"}).json()["id"]
+
+    # Il login accoda solo l'istante: la riga viene aggiornata dal flush
+    assert client.post("/users/login/", params={"email": email, "password": "password123"}).status_code == 200
+    logged_in = buffer.pending(user_id)
+    assert logged_in is not None
+    with SessionLocal() as db:
+        assert db.get(User, user_id).last_login is None
+
+    assert buffer.flush() == 1
+    assert buffer.pending(user_id) is None
+    with SessionLocal() as db:
+        assert db.get(User, user_id).last_login == logged_in
+
+
+def _user_with_hash(rounds: int, password: str) -> tuple:
+    with SessionLocal() as db:
+        user = User(email=f"hash{uuid.uuid4().hex}@example.com", password_hash=Hash.bcrypt(password, rounds))
+        db.add(user)
+        db.commit()
+        return user.id, user.email
+
+
+def test_login_rehashes_with_configured_rounds(client, monkeypatch):
+    monkeypatch.setattr(password_hasher, "rounds", 5)
+    user_id, email = _user_with_hash(4, "password123")
+
+    assert client.post("/users/login/", params={"email": email, "password": "password123"}).status_code == 200
+    with SessionLocal() as db:
+        new_hash = db.get(User, user_id).password_hash
+    assert Hash.cost(new_hash) == 5
+    assert Hash.verify("password123", new_hash)
+
+
+def test_login_rejected_when_hasher_is_saturated(client, monkeypatch):
+    user_id, email = _user_with_hash(4, "password123")
+    monkeypatch.setattr(password_hasher, "enabled", True)
+    monkeypatch.setattr(password_hasher, "max_pending", 0)
+    rejected = password_hasher.rejected
+
+    # Pool pieno: 503 con Retry-After invece di accodare altra latenza
+    response = client.post("/users/login/", params={"email": email, "password": "password123"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert password_hasher.rejected == rejected + 1
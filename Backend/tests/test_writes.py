@@ -0,0 +1,45 @@
+import pytest
+
+from app.db import writes
+from app.db.writes import insert_returning, update_returning
+from app.models.room import Room
+
+
+@pytest.fixture(params=["dialect", "fallback"])
+def returning_db(request, db, monkeypatch):
+    # "fallback" forza INSERT/UPDATE + SELECT anche su Postgres; su SQLite i due casi coincidono
+    if request.param == "fallback":
+        monkeypatch.setattr(writes, "supports_returning", lambda db: False)
+    return db
+
+
+def _room_values(name: str = "Returning room") -> dict:
+    return {"name": name, "base_layer_url": "https://example.com/base.png", "emotional_match": {"calm": 50}}
+
+
+def test_insert_returning_loads_generated_columns(returning_db):
+    room = insert_returning(returning_db, Room, _room_values())
+    returning_db.commit()
+
+    assert room.id is not None
+    assert room.created_at is not None
+    assert returning_db.get(Room, room.id) is room
+
+
+def test_update_returning_refreshes_loaded_instance(returning_db, room):
+    updated = update_returning(returning_db, Room, [Room.id == room.id], {"name": "Renamed"})
+    returning_db.commit()
+
+    # L'istanza già nella sessione viene ripopolata, non resta con i valori precedenti
+    assert updated is room
+    assert room.name == "Renamed"
+    returning_db.expire_all()
+    assert returning_db.get(Room, room.id).name == "Renamed"
+
+
+def test_update_returning_without_match_returns_none(returning_db):
+    assert update_returning(returning_db, Room, [Room.id == -1], {"name": "Nobody"}) is None
+
+
+def test_update_returning_without_values_reads_row(returning_db, room):
+    assert update_returning(returning_db, Room, [Room.id == room.id], {}) is room